@@ -12,6 +12,9 @@ HOME_PATH = os.environ["HOME"]
 PACKAGE_PATH = os.path.dirname(os.path.abspath(__file__))
 PYSEALER_PATH = join(HOME_PATH, ".pysealer")
 PYSEALER_RES_PATH = join(PYSEALER_PATH, "res")
+PYSEALER_ENV_PATH = join(PYSEALER_PATH, "envs")
+PYSEALER_RELEASE_PATH = join(PYSEALER_PATH, "releases")
+PYSEALER_STORE_PATH = join(PYSEALER_PATH, "store")
 
 # create necessary structures for pysealer package
 
@@ -24,3 +27,18 @@ if not os.path.isdir(PYSEALER_RES_PATH):
     os.makedirs(PYSEALER_RES_PATH)
     print ("[MESSAGE] PySealer resource directory is created at %s"
            % (PYSEALER_RES_PATH))
+
+if not os.path.isdir(PYSEALER_ENV_PATH):
+    os.makedirs(PYSEALER_ENV_PATH)
+    print ("[MESSAGE] PySealer environment cache is created at %s"
+           % (PYSEALER_ENV_PATH))
+
+if not os.path.isdir(PYSEALER_RELEASE_PATH):
+    os.makedirs(PYSEALER_RELEASE_PATH)
+    print ("[MESSAGE] PySealer release manifests are stored at %s"
+           % (PYSEALER_RELEASE_PATH))
+
+if not os.path.isdir(PYSEALER_STORE_PATH):
+    os.makedirs(PYSEALER_STORE_PATH)
+    print ("[MESSAGE] PySealer artifact store is created at %s"
+           % (PYSEALER_STORE_PATH))
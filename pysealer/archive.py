@@ -0,0 +1,286 @@
+"""Single-file module archive of a sealed app.
+
+All compiled modules of the app are packed into one file with an index of
+module names to offsets. At target the archive is memory-mapped and a
+meta path importer loads the code objects directly, so an import doesn't
+stat the many small files in the source tree.
+
+This module only depends on the standard library so that it can be
+shipped with a sealed app and executed by the target interpreter:
+
+    python archive.py <archive> <script.pyc> [args...]
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+from __future__ import print_function
+import os
+from os.path import isdir, join
+import sys
+import mmap
+import struct
+import marshal
+
+ARCHIVE_MAGIC = b"PYSA"
+ARCHIVE_VERSION = 2
+# the marshal format that all supported interpreters read
+INDEX_MARSHAL_VERSION = 2
+# magic, version, bytecode magic, index offset, index length
+HEADER_FORMAT = "<4sI4sQQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+
+def pyc_header_size():
+    """The size of the .pyc header of the running interpreter."""
+    if sys.version_info >= (3, 7):
+        return 16
+    elif sys.version_info >= (3, 3):
+        return 12
+    return 8
+
+
+def bytecode_magic():
+    """The bytecode magic number of the running interpreter."""
+    try:
+        from importlib.util import MAGIC_NUMBER
+        return MAGIC_NUMBER
+    except ImportError:
+        import imp
+        return imp.get_magic()
+
+
+def module_name(rel_path):
+    """Get the module name of a compiled file.
+
+    Returns
+    -------
+    name : string
+        the full module name.
+    is_package : bool
+        if the file is the __init__ of a package.
+    """
+    parts = os.path.splitext(rel_path)[0].split(os.sep)
+    if parts[-1] == "__init__":
+        return ".".join(parts[:-1]), True
+    return ".".join(parts), False
+
+
+def pack(src_path, archive_path, keep=()):
+    """Pack the compiled modules of a source tree into an archive.
+
+    The packed files are removed from the tree, together with the package
+    folders that become empty. The folders of implicit namespace packages
+    are kept, the path finder imports them from the tree and the modules
+    inside from the archive.
+
+    Parameters
+    ----------
+    src_path : string
+        the compiled source tree.
+    archive_path : string
+        the destination archive.
+    keep : set
+        relative paths of compiled files that stay in the tree, e.g., the
+        scripts that are executed directly.
+
+    Returns
+    -------
+    The number of packed modules.
+    """
+    pyc_list = []
+    for root, dirs, files in os.walk(src_path):
+        dirs.sort()
+        for file_name in sorted(files):
+            rel_path = os.path.relpath(join(root, file_name), src_path)
+            if file_name.endswith(".pyc") and rel_path not in keep:
+                pyc_list.append(rel_path)
+
+    index = {}
+    code_magic = b"\x00"*4
+    with open(archive_path, mode="wb") as f:
+        f.write(b"\x00"*HEADER_SIZE)
+        for rel_path in pyc_list:
+            name, is_package = module_name(rel_path)
+            if not name or name in index:
+                continue
+            with open(join(src_path, rel_path), mode="rb") as pyc_file:
+                pyc_data = pyc_file.read()
+            code_magic = pyc_data[:4]
+            index[name] = [f.tell(), len(pyc_data), is_package,
+                           rel_path.replace(os.sep, "/")]
+            f.write(pyc_data)
+
+        # marshal is a builtin module, an import of json costs more than
+        # the loading of the index
+        index_data = marshal.dumps(index, INDEX_MARSHAL_VERSION)
+        index_offset = f.tell()
+        f.write(index_data)
+        f.seek(0)
+        f.write(struct.pack(HEADER_FORMAT, ARCHIVE_MAGIC, ARCHIVE_VERSION,
+                            code_magic, index_offset, len(index_data)))
+
+    packages = set(os.path.dirname(rel_path) for rel_path in pyc_list
+                   if os.path.basename(rel_path) == "__init__.pyc")
+    for rel_path in pyc_list:
+        os.remove(join(src_path, rel_path))
+    for root, dirs, files in os.walk(src_path, topdown=False):
+        if os.path.relpath(root, src_path) in packages and \
+                not os.listdir(root):
+            os.rmdir(root)
+
+    return len(index)
+
+
+class ArchiveImporter(object):
+    """Meta path importer of the modules in an archive."""
+
+    def __init__(self, archive_path, src_path, prefixes=()):
+        """Map the archive and read its index.
+
+        Parameters
+        ----------
+        archive_path : string
+            the archive from pack().
+        src_path : string
+            the source tree that the archive is packed from, used for the
+            __file__ and __path__ of the modules.
+        prefixes : tuple
+            packages that are also on sys.path, e.g., "app." makes
+            app.module importable as module.
+        """
+        self.src_path = src_path
+        self.prefixes = ("",)+tuple(prefixes)
+        with open(archive_path, mode="rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, code_magic, index_offset, index_length = \
+            struct.unpack(HEADER_FORMAT, self.data[:HEADER_SIZE])
+        if magic != ARCHIVE_MAGIC or version != ARCHIVE_VERSION:
+            raise ImportError("%s is not a valid module archive."
+                              % (archive_path))
+        if code_magic != bytecode_magic():
+            raise ImportError("The modules in %s are compiled by another "
+                              "python version." % (archive_path))
+
+        self.index = marshal.loads(self.data[
+            index_offset:index_offset+index_length])
+        self.header_size = pyc_header_size()
+
+    def lookup(self, fullname):
+        """Get the index entry of a module, None if it's not archived."""
+        for prefix in self.prefixes:
+            entry = self.index.get(prefix+fullname)
+            if entry is not None:
+                return entry
+        return None
+
+    def get_filename(self, fullname):
+        """The path of the module as if it's in the source tree."""
+        return join(self.src_path, *self.lookup(fullname)[3].split("/"))
+
+    def is_package(self, fullname):
+        """Check if the module is a package."""
+        return self.lookup(fullname)[2]
+
+    def get_code(self, fullname):
+        """Load the code object of the module."""
+        offset, length = self.lookup(fullname)[:2]
+        return marshal.loads(
+            self.data[offset+self.header_size:offset+length])
+
+    def get_source(self, fullname):
+        """Sealed apps have no source."""
+        return None
+
+    def init_module(self, module):
+        """Set the attributes of a module before executing it."""
+        module.__file__ = self.get_filename(module.__name__)
+        module.__loader__ = self
+        if self.is_package(module.__name__):
+            module.__path__ = [os.path.dirname(module.__file__)]
+            module.__package__ = module.__name__
+        else:
+            module.__package__ = module.__name__.rpartition(".")[0]
+
+    # importer protocol of Python 3.4+
+
+    def find_spec(self, fullname, path=None, target=None):
+        """Find the spec of a module in the archive."""
+        if self.lookup(fullname) is None:
+            return None
+        from importlib.machinery import ModuleSpec
+        spec = ModuleSpec(fullname, self,
+                          origin=self.get_filename(fullname),
+                          is_package=self.is_package(fullname))
+        spec.has_location = True
+        if self.is_package(fullname):
+            spec.submodule_search_locations = [
+                os.path.dirname(self.get_filename(fullname))]
+        return spec
+
+    def create_module(self, spec):
+        """Use the default module creation."""
+        return None
+
+    def exec_module(self, module):
+        """Execute the module code."""
+        exec(self.get_code(module.__name__), module.__dict__)
+
+    # importer protocol of Python 2
+
+    def find_module(self, fullname, path=None):
+        """Find a module in the archive."""
+        return self if self.lookup(fullname) is not None else None
+
+    def load_module(self, fullname):
+        """Load a module from the archive."""
+        if fullname in sys.modules:
+            return sys.modules[fullname]
+        module = type(sys)(fullname)
+        self.init_module(module)
+        sys.modules[fullname] = module
+        try:
+            exec(self.get_code(fullname), module.__dict__)
+        except BaseException:
+            del sys.modules[fullname]
+            raise
+        return sys.modules[fullname]
+
+
+def script_prefixes(src_path, script_path):
+    """Get the importer prefixes of a script in the source tree.
+
+    The folder of a script is on sys.path, so its package is a prefix.
+    """
+    script_package = os.path.relpath(os.path.dirname(script_path), src_path)
+    if script_package.startswith(os.pardir) or script_package == os.curdir:
+        return ()
+    return (script_package.replace(os.sep, ".")+".",)
+
+
+def install(archive_path, src_path, prefixes=()):
+    """Install the importer of an archive in front of sys.meta_path."""
+    importer = ArchiveImporter(archive_path, src_path, prefixes)
+    sys.meta_path.insert(0, importer)
+    return importer
+
+
+def main():
+    """Run a compiled script with the modules in an archive."""
+    import runpy
+
+    archive_path = os.path.abspath(sys.argv[1])
+    script_path = os.path.abspath(sys.argv[2])
+    src_path = os.path.join(os.path.dirname(archive_path), "src")
+    if not isdir(src_path):
+        src_path = os.path.dirname(script_path)
+
+    install(archive_path, src_path, script_prefixes(src_path, script_path))
+    sys.argv = sys.argv[2:]
+    sys.path[0] = os.path.dirname(script_path)
+    runpy.run_path(script_path, run_name="__main__")
+
+
+if __name__ == "__main__":
+    main()
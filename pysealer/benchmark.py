@@ -0,0 +1,461 @@
+"""Stage benchmark of the sealing pipeline.
+
+Synthetic apps of different file counts, module sizes and data sizes are
+sealed against a local stub of the miniconda installer, conda, pip and
+makeself, so no network is needed. The build interpreter of the stub
+environment is the running python.
+
+For every stage the wall time, the CPU time of the process and its
+children, the peak RSS of the process, the largest RSS of its children
+so far and the bytes written to the app folder are recorded, and
+compared against a stored baseline:
+
+    python -m pysealer.benchmark --output results.json \
+        --baseline baseline.json
+
+The baseline depends on the machine, it's stored by a run with
+--save-baseline, a missing baseline fails before the benchmark runs.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+from __future__ import print_function
+import os
+from os.path import isdir, isfile, join
+import sys
+import json
+import time
+import random
+import shutil
+import tarfile
+import argparse
+import tempfile
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from pysealer import sealer
+
+# the app is named apart from its package, so seal_app renames the output
+APP_NAME = "benchapp_sealed"
+
+STAGES = ["init_build", "config_environment", "compile_app",
+          "prepare_app", "seal_app", "makeself"]
+
+# synthetic apps: number of modules, bytes per module, bytes per data file
+SCENARIOS = {
+    "small": {"num_files": 50, "module_size": 2 << 10,
+              "num_assets": 4, "asset_size": 64 << 10},
+    "many_files": {"num_files": 2000, "module_size": 2 << 10,
+                   "num_assets": 0, "asset_size": 0},
+    "large_modules": {"num_files": 100, "module_size": 256 << 10,
+                      "num_assets": 0, "asset_size": 0},
+    "large_assets": {"num_files": 50, "module_size": 2 << 10,
+                     "num_assets": 8, "asset_size": 16 << 20},
+}
+
+# metric: (relative tolerance, absolute tolerance) of a regression
+TOLERANCES = {"wall_time": (0.25, 0.25),
+              "cpu_time": (0.25, 0.25),
+              "peak_rss": (0.25, 8 << 20),
+              "children_max_rss": (0.25, 8 << 20),
+              "bytes_written": (0.10, 1 << 20)}
+
+STUB_CONDA_TEMPLATE = """#!/bin/sh
+# Stub of the miniconda installer: installer -b -p <prefix>
+while [ $# -gt 0 ]; do
+    case "$1" in
+        -p) PREFIX="$2"; shift ;;
+    esac
+    shift
+done
+mkdir -p "${PREFIX}/bin" "${PREFIX}/conda-meta" "${PREFIX}/pkgs"
+ln -s %(python)s "${PREFIX}/bin/python"
+cat > "${PREFIX}/bin/conda" << "EOF"
+#!/bin/sh
+# Stub of conda, only "list --explicit" has an output
+[ "$1" = "list" ] && [ "$2" = "--explicit" ] && echo "@EXPLICIT"
+exit 0
+EOF
+cat > "${PREFIX}/bin/pip" << "EOF"
+#!/bin/sh
+# Stub of pip
+[ "$1" = "--version" ] && echo "pip 0.0 (stub)"
+exit 0
+EOF
+chmod +x "${PREFIX}/bin/conda" "${PREFIX}/bin/pip"
+"""
+
+STUB_MAKESELF = """#!/bin/sh
+# Stub of makeself: makeself --notemp <folder> <installer> <label> <startup>
+[ "$1" = "--notemp" ] && shift
+tar -czf "$2" -C "$1" .
+"""
+
+
+def make_stubs(stub_path):
+    """Write the stub miniconda installer and makeself.
+
+    Returns
+    -------
+    conda_path : string
+        the stub miniconda installer.
+    makeself_path : string
+        the stub makeself.
+    """
+    if not isdir(stub_path):
+        os.makedirs(stub_path)
+    conda_path = join(stub_path, "miniconda-stub.sh")
+    with open(conda_path, mode="w") as f:
+        f.write(STUB_CONDA_TEMPLATE
+                % {"python": os.path.realpath(sys.executable)})
+    makeself_path = join(stub_path, "makeself-stub.sh")
+    with open(makeself_path, mode="w") as f:
+        f.write(STUB_MAKESELF)
+    os.chmod(conda_path, 0o755)
+    os.chmod(makeself_path, 0o755)
+
+    return conda_path, makeself_path
+
+
+def make_module(rng, index, module_size):
+    """Generate the source of a synthetic module of about module_size."""
+    lines = ['"""Synthetic module %d."""' % (index), "",
+             "import os", "import json"]
+    # modules import an earlier module of their package
+    if index % 100 > 0:
+        lines.append("from . import module_%04d"
+                     % (rng.randrange(index-index % 100, index)))
+    lines.append("")
+    size = sum(len(line)+1 for line in lines)
+    func_idx = 0
+    while size < module_size:
+        func = ["",
+                "def func_%d(x, y=%d):" % (func_idx, rng.randrange(1000)),
+                '    """Return a value."""',
+                "    values = [x*%d+y for _ in range(%d)]"
+                % (rng.randrange(100), rng.randrange(1, 10)),
+                "    return json.dumps({%r: values, %r: os.sep})"
+                % ("v%d" % (rng.randrange(1000)),
+                   "s%d" % (rng.randrange(1000)))]
+        lines += func
+        size += sum(len(line)+1 for line in func)
+        func_idx += 1
+
+    return "\n".join(lines)+"\n"
+
+
+def make_app(app_path, num_files, module_size, num_assets, asset_size,
+             seed=0):
+    """Generate a synthetic app with a configuration.
+
+    Parameters
+    ----------
+    app_path : string
+        the app root, must not exist.
+    num_files : int
+        the number of python modules, in packages of 100 modules.
+    module_size : int
+        the approximate size of a module in bytes.
+    num_assets : int
+        the number of data files.
+    asset_size : int
+        the size of a data file in bytes.
+    seed : int
+        the seed of the generated modules, data files are random.
+    """
+    rng = random.Random(seed)
+    app_pkg = join(app_path, "benchapp")
+    os.makedirs(app_pkg)
+    with open(join(app_pkg, "__init__.py"), mode="w") as f:
+        f.write('"""Synthetic app."""\n')
+
+    for index in range(num_files):
+        pkg_path = join(app_pkg, "pkg_%03d" % (index//100))
+        if not isdir(pkg_path):
+            os.makedirs(pkg_path)
+            with open(join(pkg_path, "__init__.py"), mode="w") as f:
+                f.write("")
+        with open(join(pkg_path, "module_%04d.py" % (index)),
+                  mode="w") as f:
+            f.write(make_module(rng, index, module_size))
+
+    with open(join(app_pkg, "main.py"), mode="w") as f:
+        f.write('"""Entry of the synthetic app."""\n\n'
+                "from benchapp.pkg_000 import module_0000\n\n"
+                "print(module_0000.func_0(1))\n")
+
+    if num_assets > 0:
+        data_path = join(app_pkg, "data")
+        os.makedirs(data_path)
+        for index in range(num_assets):
+            with open(join(data_path, "asset_%03d.bin" % (index)),
+                      mode="wb") as f:
+                for offset in range(0, asset_size, 1 << 20):
+                    f.write(os.urandom(min(1 << 20, asset_size-offset)))
+
+    with open(join(app_path, ".pysealer_config.yml"), mode="w") as f:
+        f.write("app_name:\n  - %s\n"
+                "app_version:\n  - v0.1.0\n"
+                "app_author:\n  - bench\n"
+                "conda_install: []\n"
+                "pip_install: []\n"
+                "app_list:\n  benchapp:\n    - main\n" % (APP_NAME))
+
+
+def disk_usage(path):
+    """The allocated bytes of the files in a folder.
+
+    Hard linked files are only counted once.
+    """
+    inodes = set()
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            file_stat = os.lstat(join(root, name))
+            if (file_stat.st_dev, file_stat.st_ino) in inodes:
+                continue
+            inodes.add((file_stat.st_dev, file_stat.st_ino))
+            total += getattr(file_stat, "st_blocks", 0)*512 or \
+                file_stat.st_size
+    return total
+
+
+def reset_peak_rss():
+    """Reset the peak RSS of the process where the kernel supports it."""
+    try:
+        with open("/proc/self/clear_refs", mode="w") as f:
+            f.write("5")
+    except (IOError, OSError):
+        pass
+
+
+def peak_rss():
+    """The peak RSS of the process in bytes since reset_peak_rss().
+
+    Where the peak can't be reset, it's the peak since the process
+    started.
+    """
+    try:
+        with open("/proc/self/status", mode="r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])*1024
+    except (IOError, OSError):
+        pass
+
+    if resource is None:
+        return 0
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    unit = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*unit
+
+
+def children_max_rss():
+    """The largest RSS of the finished children in bytes.
+
+    It's a running maximum over all children since the process started,
+    the kernel can't reset it per stage.
+    """
+    if resource is None:
+        return 0
+    unit = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss*unit
+
+
+def cpu_time():
+    """The user and system time of the process and its children."""
+    times = os.times()
+    return times[0]+times[1]+times[2]+times[3]
+
+
+def check_installer(installer_path):
+    """Check that the stub installer packs a sealed app.
+
+    Raises
+    ------
+    RuntimeError
+        if the installer has no build.sh at its root.
+    """
+    with tarfile.open(installer_path, mode="r:gz") as tar:
+        names = set(os.path.normpath(name) for name in tar.getnames())
+    if "build.sh" not in names:
+        raise RuntimeError("The installer %s doesn't pack a sealed app."
+                           % (installer_path))
+
+
+def run_scenario(work_path, scenario, stages=None, seed=0):
+    """Seal a synthetic app and measure every stage.
+
+    Parameters
+    ----------
+    work_path : string
+        a folder for the app and the stubs.
+    scenario : dict
+        the arguments of make_app().
+    stages : list
+        the stages to measure, STAGES if None.
+    seed : int
+        the seed of the generated content.
+
+    Returns
+    -------
+    A dictionary of stage name to its metrics.
+
+    Raises
+    ------
+    RuntimeError
+        if the makeself stage doesn't pack the sealed app.
+    """
+    if stages is None:
+        stages = STAGES
+    conda_path, makeself_path = make_stubs(join(work_path, "stubs"))
+    app_path = join(work_path, "app")
+    make_app(app_path, seed=seed, **scenario)
+
+    platform = "osx" if sys.platform == "darwin" else "linux"
+    app_sealer = sealer.Sealer(app_path, host_platform=platform,
+                               target_platform=platform,
+                               pyver=sys.version_info[0])
+    app_sealer._host_conda = conda_path
+    app_sealer._target_conda = conda_path
+
+    stage_calls = {"init_build": app_sealer.init_build,
+                   "config_environment": app_sealer.config_environment,
+                   "compile_app": app_sealer.compile_app,
+                   "prepare_app": app_sealer.prepare_app,
+                   "seal_app": lambda: app_sealer.seal_app(wheelhouse=False),
+                   "makeself": lambda: app_sealer.makeself(makeself_path)}
+
+    results = {}
+    for stage in stages:
+        reset_peak_rss()
+        disk_before = disk_usage(work_path)
+        cpu_before = cpu_time()
+        start_time = time.time()
+        stage_calls[stage]()
+        results[stage] = {"wall_time": time.time()-start_time,
+                          "cpu_time": cpu_time()-cpu_before,
+                          "peak_rss": peak_rss(),
+                          "children_max_rss": children_max_rss(),
+                          "bytes_written": max(
+                              disk_usage(work_path)-disk_before, 0)}
+        if stage == "makeself":
+            check_installer(join(app_path, APP_NAME+".run"))
+    return results
+
+
+def compare(results, baseline, tolerances=None):
+    """Compare benchmark results against a baseline.
+
+    Parameters
+    ----------
+    results : dict
+        scenario to stage to metrics.
+    baseline : dict
+        the results of a previous run.
+    tolerances : dict
+        metric to (relative, absolute) tolerance, TOLERANCES if None.
+
+    Returns
+    -------
+    A list of regressions as dictionaries of the scenario, stage, metric,
+    baseline and current value. A regression exceeds both tolerances.
+    """
+    if tolerances is None:
+        tolerances = TOLERANCES
+
+    regressions = []
+    for scenario in sorted(results):
+        for stage in sorted(results[scenario]):
+            base_metrics = baseline.get(scenario, {}).get(stage)
+            if base_metrics is None:
+                continue
+            for metric in sorted(tolerances):
+                if metric not in base_metrics:
+                    continue
+                relative, absolute = tolerances[metric]
+                value = results[scenario][stage][metric]
+                base_value = base_metrics[metric]
+                if value > base_value*(1+relative) and \
+                        value-base_value > absolute:
+                    regressions.append({"scenario": scenario,
+                                        "stage": stage,
+                                        "metric": metric,
+                                        "baseline": base_value,
+                                        "value": value})
+    return regressions
+
+
+def main():
+    """Run the benchmark from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Stage benchmark of the sealing pipeline.")
+    parser.add_argument("--scenario", action="append",
+                        choices=sorted(SCENARIOS),
+                        help="the scenarios to run, all if not given.")
+    parser.add_argument("--output", default="benchmark.json",
+                        help="the JSON file of the results.")
+    parser.add_argument("--baseline",
+                        help="the JSON file of the baseline results.")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store the results as the baseline.")
+    parser.add_argument("--work-path",
+                        help="keep the sealed apps in this folder.")
+    args = parser.parse_args()
+    # a missing baseline is an error, not a run without comparison
+    if args.baseline is not None and not args.save_baseline and \
+            not isfile(args.baseline):
+        parser.error("The baseline %s doesn't exist, store one on this "
+                     "machine with --save-baseline first."
+                     % (args.baseline))
+
+    results = {}
+    for scenario in args.scenario or sorted(SCENARIOS):
+        work_path = tempfile.mkdtemp() if args.work_path is None \
+            else join(args.work_path, scenario)
+        if isdir(work_path) and args.work_path is not None:
+            shutil.rmtree(work_path)
+        try:
+            print ("[MESSAGE] Benchmark scenario %s" % (scenario))
+            results[scenario] = run_scenario(work_path,
+                                             SCENARIOS[scenario])
+        finally:
+            if args.work_path is None:
+                shutil.rmtree(work_path)
+
+    with open(args.output, mode="w") as f:
+        json.dump(results, f, indent=1, sort_keys=True)
+    for scenario in sorted(results):
+        for stage in STAGES:
+            metrics = results[scenario][stage]
+            print ("[MESSAGE] %s %s: %.2fs wall, %.2fs CPU, %d MB peak RSS, "
+                   "%d MB children RSS (running max), %d KB written"
+                   % (scenario, stage, metrics["wall_time"],
+                      metrics["cpu_time"], metrics["peak_rss"] >> 20,
+                      metrics["children_max_rss"] >> 20,
+                      metrics["bytes_written"] >> 10))
+    print ("[MESSAGE] The benchmark results are stored at %s"
+           % (args.output))
+
+    if args.baseline is not None and args.save_baseline:
+        with open(args.baseline, mode="w") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+        print ("[MESSAGE] The baseline is stored at %s" % (args.baseline))
+    elif args.baseline is not None:
+        with open(args.baseline, mode="r") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline)
+        for regression in regressions:
+            print ("[MESSAGE] Regression of %(scenario)s %(stage)s "
+                   "%(metric)s: %(baseline).6g -> %(value).6g" % regression)
+        if regressions:
+            sys.exit(1)
+        print ("[MESSAGE] No regression against %s" % (args.baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""Shared cache of sealed artifacts keyed by the hash of the build inputs.
+
+A build cache is a local folder or an HTTP server that serves GET and
+PUT, so that CI agents pull the installer of an unchanged app instead of
+sealing it again:
+
+    <cache>/<key>/<artifact>           the artifacts of a build
+    <cache>/<key>/pysealer_cache.json  their checksums, written last
+
+A stand-in server for a local folder:
+
+    python -m pysealer.buildcache serve <folder> [--port 8765]
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+from __future__ import print_function
+import os
+from os.path import isdir, isfile, join
+import sys
+import io
+import json
+import shutil
+import argparse
+
+try:
+    from urllib.request import Request, urlopen
+    from urllib.error import HTTPError
+except ImportError:
+    from urllib2 import Request, urlopen, HTTPError
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+from pysealer import manifest
+
+INDEX_NAME = "pysealer_cache.json"
+
+
+def artifact_index(paths):
+    """Map the names of artifacts to their SHA-256 checksums."""
+    return dict((os.path.basename(path),
+                 manifest.file_hash(path, algorithm="sha256"))
+                for path in paths)
+
+
+def verify_artifacts(index, dst_path):
+    """Check fetched artifacts against the index, remove them if not."""
+    for name, sha in index.items():
+        if manifest.file_hash(join(dst_path, name),
+                              algorithm="sha256") != sha:
+            for artifact in index:
+                if isfile(join(dst_path, artifact)):
+                    os.remove(join(dst_path, artifact))
+            return False
+    return True
+
+
+class DirectoryCache(object):
+    """A build cache in a local or mounted folder."""
+
+    def __init__(self, cache_path):
+        """Init the cache, the folder is created if it's missing."""
+        self.cache_path = cache_path
+        if not isdir(self.cache_path):
+            os.makedirs(self.cache_path)
+
+    def get(self, key, dst_path):
+        """Copy the artifacts of a key to a folder.
+
+        Returns
+        -------
+        The names of the artifacts, None if the key is not cached or the
+        artifacts are corrupted.
+        """
+        index_path = join(self.cache_path, key, INDEX_NAME)
+        if not isfile(index_path):
+            return None
+        with open(index_path, mode="r") as f:
+            index = json.load(f)
+        for name in index:
+            shutil.copy2(join(self.cache_path, key, name), dst_path)
+        return sorted(index) if verify_artifacts(index, dst_path) else None
+
+    def put(self, key, paths):
+        """Store artifacts under a key, an existing entry is kept."""
+        key_path = join(self.cache_path, key)
+        if isfile(join(key_path, INDEX_NAME)):
+            return
+        tmp_path = key_path+".%d.tmp" % (os.getpid())
+        os.makedirs(tmp_path)
+        for path in paths:
+            shutil.copy2(path, tmp_path)
+        with open(join(tmp_path, INDEX_NAME), mode="w") as f:
+            json.dump(artifact_index(paths), f, indent=1, sort_keys=True)
+        try:
+            os.rename(tmp_path, key_path)
+        except OSError:
+            # another build stored the key first
+            shutil.rmtree(tmp_path)
+
+
+class HTTPCache(object):
+    """A build cache on an HTTP server with GET and PUT."""
+
+    def __init__(self, url, block_size=1 << 16):
+        """Init the cache by the base url."""
+        self.url = url.rstrip("/")
+        self.block_size = block_size
+
+    def fetch(self, url, file_path):
+        """Download a url to a file, False if it doesn't exist."""
+        try:
+            response = urlopen(url)
+        except HTTPError as e:
+            if e.code == 404:
+                return False
+            raise
+        try:
+            with open(file_path, mode="wb") as f:
+                while True:
+                    block = response.read(self.block_size)
+                    if not block:
+                        break
+                    f.write(block)
+        finally:
+            response.close()
+        return True
+
+    def upload(self, url, file_obj, size):
+        """PUT the content of a file object to a url, it's streamed."""
+        request = Request(url, data=file_obj)
+        request.add_header("Content-Type", "application/octet-stream")
+        request.add_header("Content-Length", str(size))
+        request.get_method = lambda: "PUT"
+        urlopen(request).close()
+
+    def get(self, key, dst_path):
+        """Download the artifacts of a key to a folder.
+
+        Returns
+        -------
+        The names of the artifacts, None if the key is not cached or the
+        artifacts are corrupted.
+        """
+        index_path = join(dst_path, INDEX_NAME)
+        if not self.fetch("%s/%s/%s" % (self.url, key, INDEX_NAME),
+                          index_path):
+            return None
+        with open(index_path, mode="r") as f:
+            index = json.load(f)
+        os.remove(index_path)
+        for name in index:
+            if not self.fetch("%s/%s/%s" % (self.url, key, name),
+                              join(dst_path, name)):
+                return None
+        return sorted(index) if verify_artifacts(index, dst_path) else None
+
+    def put(self, key, paths):
+        """Upload artifacts under a key, the index is uploaded last."""
+        for path in paths:
+            with open(path, mode="rb") as f:
+                self.upload("%s/%s/%s" % (self.url, key,
+                                          os.path.basename(path)),
+                            f, os.path.getsize(path))
+        index = json.dumps(artifact_index(paths), indent=1,
+                           sort_keys=True).encode("utf-8")
+        self.upload("%s/%s/%s" % (self.url, key, INDEX_NAME),
+                    io.BytesIO(index), len(index))
+
+
+def open_cache(location):
+    """Open a build cache by an http(s) url or a folder path."""
+    if location.startswith(("http://", "https://")):
+        return HTTPCache(location)
+    return DirectoryCache(location)
+
+
+class CacheRequestHandler(BaseHTTPRequestHandler):
+    """Serve GET and PUT of the files in the cache folder."""
+
+    cache_path = None
+
+    def file_path(self):
+        """The file of the request path, None if it's outside the cache."""
+        parts = [part for part in self.path.split("?")[0].split("/")
+                 if part]
+        if len(parts) != 2 or any(part.startswith(".") for part in parts):
+            return None
+        return join(self.cache_path, *parts)
+
+    def do_GET(self):
+        """Send a cached file."""
+        file_path = self.file_path()
+        if file_path is None or not isfile(file_path):
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(os.path.getsize(file_path)))
+        self.end_headers()
+        with open(file_path, mode="rb") as f:
+            shutil.copyfileobj(f, self.wfile)
+
+    def do_PUT(self):
+        """Store a file atomically."""
+        file_path = self.file_path()
+        if file_path is None:
+            self.send_error(400)
+            return
+        if not isdir(os.path.dirname(file_path)):
+            os.makedirs(os.path.dirname(file_path))
+        remaining = int(self.headers.get("Content-Length", 0))
+        with open(file_path+".part", mode="wb") as f:
+            while remaining > 0:
+                block = self.rfile.read(min(remaining, 1 << 16))
+                if not block:
+                    break
+                f.write(block)
+                remaining -= len(block)
+        os.rename(file_path+".part", file_path)
+        self.send_response(201)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+def serve(cache_path, port=8765, host="127.0.0.1"):
+    """Serve a cache folder over HTTP until interrupted."""
+    if not isdir(cache_path):
+        os.makedirs(cache_path)
+    handler = type("Handler", (CacheRequestHandler,),
+                   {"cache_path": os.path.abspath(cache_path)})
+    server = HTTPServer((host, port), handler)
+    print ("[MESSAGE] The build cache %s is served at http://%s:%d"
+           % (cache_path, host, server.server_port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    """Serve a build cache from the command line."""
+    parser = argparse.ArgumentParser(
+        description="The PySealer build cache.")
+    parser.add_argument("command", choices=["serve"])
+    parser.add_argument("cache_path", help="the cache folder.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--host", default="127.0.0.1")
+    args = parser.parse_args()
+
+    serve(args.cache_path, port=args.port, host=args.host)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+"""Parallel bytecode compiler.
+
+This module only depends on the standard library so that it can be
+executed by the build interpreter, which writes the bytecode in its own
+format:
+
+    python [-O|-OO] compiler.py <workers> < compile_job.json
+
+The optimization level of the interpreter applies to the compiled files,
+-O removes the asserts and -OO the docstrings as well. The line tables of
+modules that don't need to be debugged can be dropped, tracebacks then
+show no line numbers.
+
+In reproducible mode the compiled files don't depend on the time or the
+location of the build: the source path recorded in the code objects is
+relative to the app root, the interpreters since python 3.7 write
+hash-validated files and the older ones write SOURCE_DATE_EPOCH (or 0)
+as the source time stamp.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+from __future__ import print_function
+import os
+import sys
+import json
+import types
+import struct
+import marshal
+import multiprocessing
+import py_compile
+
+try:
+    import subprocess32 as sp
+except ImportError:
+    import subprocess as sp
+
+
+def source_date_epoch():
+    """The time stamp of reproducible builds."""
+    return int(os.environ.get("SOURCE_DATE_EPOCH", 0))
+
+
+def pyc_header_size():
+    """The size of the .pyc header of the running interpreter."""
+    if sys.version_info >= (3, 7):
+        return 16
+    elif sys.version_info >= (3, 3):
+        return 12
+    return 8
+
+
+def empty_line_table(code):
+    """A line table that maps all instructions of a code object to no line.
+
+    Python 3.11 and later read the column positions from the table as
+    well, an empty table breaks the traceback module.
+    """
+    if sys.version_info >= (3, 11):
+        # entries of up to 8 code units without a location
+        units = len(code.co_code)//2
+        table = bytearray()
+        while units > 0:
+            table.append(0xf8 | (min(units, 8)-1))
+            units -= 8
+        return bytes(table)
+    # pairs of bytecode offset and line deltas, -128 is no line
+    size = len(code.co_code)
+    table = bytearray()
+    while size > 0:
+        table += bytearray([min(size, 254), 0x80])
+        size -= 254
+    return bytes(table)
+
+
+def strip_code(code):
+    """Drop the line tables of a code object and its nested code objects."""
+    consts = tuple(strip_code(const) if isinstance(const, types.CodeType)
+                   else const for const in code.co_consts)
+    if sys.version_info >= (3, 10):
+        return code.replace(co_consts=consts,
+                            co_linetable=empty_line_table(code))
+    elif hasattr(code, "replace"):
+        return code.replace(co_consts=consts, co_lnotab=b"")
+
+    args = [code.co_argcount]
+    if sys.version_info[0] >= 3:
+        args.append(code.co_kwonlyargcount)
+    args += [code.co_nlocals, code.co_stacksize, code.co_flags,
+             code.co_code, consts, code.co_names, code.co_varnames,
+             code.co_filename, code.co_name, code.co_firstlineno, b"",
+             code.co_freevars, code.co_cellvars]
+    return types.CodeType(*args)
+
+
+def strip_file(cfile):
+    """Drop the line tables of a compiled file, the header is kept."""
+    with open(cfile, mode="rb") as f:
+        data = f.read()
+    header = data[:pyc_header_size()]
+    code = strip_code(marshal.loads(data[pyc_header_size():]))
+    with open(cfile+".tmp", mode="wb") as f:
+        f.write(header+marshal.dumps(code))
+    os.rename(cfile+".tmp", cfile)
+
+
+def compile_file(job):
+    """Compile a single source file.
+
+    Parameters
+    ----------
+    job : tuple
+        the python source file, the compiled file, None for next to the
+        source, the app root for the reproducible mode, None for the
+        default mode, and if the line tables are dropped. In one tuple
+        for Pool.map.
+
+    Returns
+    -------
+    A tuple of the file path and the error message, the message is None
+    if the file is compiled.
+    """
+    file_path, cfile, root, strip = job
+    if cfile is None:
+        cfile = file_path+"c"
+    try:
+        # python 2 rewrites the compiled file in place, which would modify
+        # the hard links of it in the build folders
+        if os.path.lexists(cfile):
+            os.remove(cfile)
+        if root is None:
+            py_compile.compile(file_path, cfile=cfile, doraise=True)
+        elif hasattr(py_compile, "PycInvalidationMode"):
+            py_compile.compile(
+                file_path, cfile=cfile,
+                dfile=os.path.relpath(file_path, root), doraise=True,
+                invalidation_mode=py_compile.PycInvalidationMode.CHECKED_HASH)
+        else:
+            py_compile.compile(file_path, cfile=cfile,
+                               dfile=os.path.relpath(file_path, root),
+                               doraise=True)
+            # the time stamp follows the 4 bytes of magic number
+            with open(cfile, mode="r+b") as f:
+                f.seek(4)
+                f.write(struct.pack("<I", source_date_epoch()))
+        if strip:
+            strip_file(cfile)
+    except py_compile.PyCompileError as e:
+        return file_path, e.msg
+    except (IOError, OSError) as e:
+        return file_path, str(e)
+    return file_path, None
+
+
+def run_workers(file_list, workers, root=None, cfile_list=None,
+                strip_list=()):
+    """Compile a list of files with a pool of processes.
+
+    Returns
+    -------
+    A dictionary that maps failed files to their error messages.
+    """
+    if cfile_list is None:
+        cfile_list = [None]*len(file_list)
+    strip_list = set(strip_list)
+    jobs = [(file_path, cfile, root, file_path in strip_list)
+            for file_path, cfile in zip(file_list, cfile_list)]
+    if workers > 1 and len(jobs) > 1:
+        pool = multiprocessing.Pool(min(workers, len(jobs)))
+        try:
+            results = pool.map(compile_file, jobs,
+                               max(1, len(jobs)//(workers*4)))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [compile_file(job) for job in jobs]
+
+    return dict((file_path, msg) for file_path, msg in results
+                if msg is not None)
+
+
+def compile_files(python_bin, file_list, workers=None, root=None,
+                  optimize=0, cfile_list=None, strip_list=(),
+                  tracer=None):
+    """Compile files by the given interpreter.
+
+    Parameters
+    ----------
+    python_bin : string
+        the interpreter that defines the bytecode format.
+    file_list : list
+        the python source files.
+    workers : int
+        the number of compiling processes, use all CPU cores if None.
+    root : string
+        the app root, compile in reproducible mode if given.
+    optimize : int
+        the optimization level, 0, 1 (-O) or 2 (-OO).
+    cfile_list : list
+        the compiled files in the order of file_list, next to the sources
+        if None.
+    strip_list : list
+        the source files whose line tables are dropped.
+    tracer : instrument.Tracer
+        runs the interpreter, so that Tracer.cancel() stops it.
+
+    Returns
+    -------
+    A dictionary that maps failed files to their error messages.
+    """
+    if not file_list:
+        return {}
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if optimize not in [0, 1, 2]:
+        raise ValueError("The optimization level %s is not supported."
+                         % (optimize))
+
+    script_path = os.path.splitext(os.path.abspath(__file__))[0]+".py"
+    cmd = [python_bin]+(["-"+"O"*optimize] if optimize else []) + \
+        [script_path, str(workers)]
+    request = json.dumps(
+        {"files": file_list, "root": root, "cfiles": cfile_list,
+         "strip": list(strip_list)}).encode("utf-8")
+    if tracer is not None:
+        return json.loads(tracer.call(cmd, merge_stderr=False, echo=False,
+                                      input=request))
+
+    proc = sp.Popen(cmd, stdin=sp.PIPE, stdout=sp.PIPE)
+    out, _ = proc.communicate(request)
+    if proc.returncode != 0:
+        raise sp.CalledProcessError(proc.returncode, python_bin)
+
+    return json.loads(out.decode("utf-8"))
+
+
+def main():
+    """Entry of the compiler process."""
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    compile_job = json.loads(sys.stdin.read())
+    errors = run_workers(compile_job["files"], workers,
+                         root=compile_job["root"],
+                         cfile_list=compile_job["cfiles"],
+                         strip_list=compile_job["strip"])
+    sys.stdout.write(json.dumps(errors))
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
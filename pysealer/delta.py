@@ -0,0 +1,261 @@
+"""Delta update packages between sealed app versions.
+
+Every sealed app carries a release manifest of the hashes of its files.
+A delta package against the manifest of an earlier version contains only
+the added and changed files and the list of removed files. It's a
+self-extracting installer that is run in the installed app folder:
+
+    cd <installed app> && <delta.run>
+
+The package is extracted to pysealer_delta/, then the installed files are
+verified against the earlier version and the new files against the
+delta, before any file is replaced.
+
+This module only depends on the standard library so that it can be
+shipped with a delta package and executed by the target interpreter:
+
+    python delta.py <app_path> <delta_path>
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+from __future__ import print_function
+import os
+from os.path import isdir, isfile, join
+import sys
+import json
+import shutil
+import hashlib
+
+RELEASE_NAME = "pysealer_release.json"
+DELTA_NAME = "pysealer_delta.json"
+DELTA_FOLDER = "pysealer_delta"
+
+# files that the build script installs the environment from or compiles, a
+# change of them needs the full installer
+ENV_FILES = ["build.sh", "requirements.txt", "pip_requirements.txt",
+             "conda_explicit.txt", "miniconda.sh", "relocate.py",
+             "pysealer_archive.py", "pysealer_launcher.py",
+             "pysealer_zygote.py"]
+ENV_FOLDERS = ["miniconda", "pkgs", "wheelhouse"]
+
+APPLY_SCRIPT = """#!/bin/sh
+# Apply a PySealer delta from %(from_version)s to %(to_version)s
+DELTA_PATH=$(pwd)
+APP_PATH=$(dirname "${DELTA_PATH}")
+"${APP_PATH}/miniconda/bin/python" "${DELTA_PATH}/pysealer_delta.py" \\
+    "${APP_PATH}" "${DELTA_PATH}" || exit 1
+cd "${APP_PATH}" && rm -rf "${DELTA_PATH}"
+"""
+
+
+def content_hash(file_path, block_size=1 << 20):
+    """The SHA-256 checksum of a file.
+
+    Comment lines of shell scripts are skipped, so the time stamps of the
+    generated scripts don't make them differ between versions.
+    """
+    sha = hashlib.sha256()
+    if file_path.endswith(".sh") and not os.path.islink(file_path):
+        with open(file_path, mode="rb") as f:
+            for line in f:
+                if not line.startswith(b"# "):
+                    sha.update(line)
+        return sha.hexdigest()
+
+    with open(file_path, mode="rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def scan_release(app_path):
+    """Hash the files of a sealed app.
+
+    Returns
+    -------
+    A dictionary of relative path to the size and checksum of a file.
+    """
+    files = {}
+    for root, dirs, file_names in os.walk(app_path):
+        dirs.sort()
+        for file_name in sorted(file_names):
+            file_path = join(root, file_name)
+            rel_path = os.path.relpath(file_path, app_path).replace(
+                os.sep, "/")
+            if rel_path in (RELEASE_NAME, DELTA_NAME) or \
+                    os.path.islink(file_path):
+                continue
+            files[rel_path] = {"size": os.path.getsize(file_path),
+                               "sha256": content_hash(file_path)}
+    return files
+
+
+def write_release(app_path, app_name, app_version):
+    """Write the release manifest of a sealed app into the app.
+
+    Returns
+    -------
+    The release manifest as a dictionary.
+    """
+    release = {"app_name": app_name,
+               "app_version": app_version,
+               "files": scan_release(app_path)}
+    with open(join(app_path, RELEASE_NAME), mode="w") as f:
+        json.dump(release, f, indent=1, sort_keys=True)
+    return release
+
+
+def load_release(release_path):
+    """Load a release manifest."""
+    with open(release_path, mode="r") as f:
+        return json.load(f)
+
+
+def is_env_file(rel_path):
+    """Check if a file belongs to the environment of the app."""
+    return rel_path in ENV_FILES or rel_path.split("/")[0] in ENV_FOLDERS
+
+
+def diff_release(old_release, new_release):
+    """Compare two release manifests.
+
+    Returns
+    -------
+    added : list
+        files that only exist in the new release.
+    changed : list
+        files with a different checksum.
+    removed : list
+        files that only exist in the old release.
+    """
+    old_files = old_release["files"]
+    new_files = new_release["files"]
+    added = sorted(set(new_files)-set(old_files))
+    removed = sorted(set(old_files)-set(new_files))
+    changed = sorted(rel_path for rel_path in new_files
+                     if rel_path in old_files and
+                     new_files[rel_path]["sha256"] !=
+                     old_files[rel_path]["sha256"])
+    return added, changed, removed
+
+
+def build_delta(old_release, new_path, delta_path):
+    """Collect a delta package from an earlier release to a sealed app.
+
+    Parameters
+    ----------
+    old_release : dict
+        the release manifest of the earlier version.
+    new_path : string
+        the sealed app of the new version, with its release manifest.
+    delta_path : string
+        the folder of the delta package, must not exist.
+
+    Returns
+    -------
+    The delta manifest as a dictionary.
+    """
+    new_release = load_release(join(new_path, RELEASE_NAME))
+    if old_release["app_name"] != new_release["app_name"]:
+        raise ValueError("The release %s is not a release of %s."
+                         % (old_release["app_name"],
+                            new_release["app_name"]))
+
+    added, changed, removed = diff_release(old_release, new_release)
+    env_changes = [rel_path for rel_path in added+changed+removed
+                   if is_env_file(rel_path)]
+    if env_changes:
+        raise ValueError("The environment of the app is changed (%s), "
+                         "ship the full installer."
+                         % (", ".join(env_changes[:5])))
+
+    os.makedirs(join(delta_path, "files"))
+    for rel_path in added+changed:
+        dst_path = join(delta_path, "files", *rel_path.split("/"))
+        if not isdir(os.path.dirname(dst_path)):
+            os.makedirs(os.path.dirname(dst_path))
+        shutil.copy2(join(new_path, *rel_path.split("/")), dst_path)
+
+    delta = {"app_name": new_release["app_name"],
+             "from_version": old_release["app_version"],
+             "to_version": new_release["app_version"],
+             "added": added,
+             "changed": changed,
+             "removed": removed,
+             "base": dict((rel_path, old_release["files"][rel_path])
+                          for rel_path in changed+removed),
+             "release": new_release}
+    with open(join(delta_path, DELTA_NAME), mode="w") as f:
+        json.dump(delta, f, indent=1, sort_keys=True)
+    shutil.copy2(os.path.splitext(os.path.abspath(__file__))[0]+".py",
+                 join(delta_path, "pysealer_delta.py"))
+    with open(join(delta_path, "apply.sh"), mode="w") as f:
+        f.write(APPLY_SCRIPT % delta)
+    os.chmod(join(delta_path, "apply.sh"), 0o755)
+
+    return delta
+
+
+def apply_delta(app_path, delta_path):
+    """Apply a delta package to an installed app.
+
+    All files are verified before the first file is replaced, the release
+    manifest is updated last.
+    """
+    delta = load_release(join(delta_path, DELTA_NAME))
+    release_path = join(app_path, RELEASE_NAME)
+    if not isfile(release_path):
+        raise IOError("%s has no release manifest." % (app_path))
+    release = load_release(release_path)
+    if release["app_name"] != delta["app_name"] or \
+            release["app_version"] != delta["from_version"]:
+        raise ValueError("The delta updates %s %s, the installed app is "
+                         "%s %s." % (delta["app_name"],
+                                     delta["from_version"],
+                                     release["app_name"],
+                                     release["app_version"]))
+
+    for rel_path in delta["changed"]+delta["removed"]:
+        file_path = join(app_path, *rel_path.split("/"))
+        if not isfile(file_path) or content_hash(file_path) != \
+                delta["base"][rel_path]["sha256"]:
+            raise IOError("The installed file %s is modified." % (rel_path))
+    new_files = delta["release"]["files"]
+    for rel_path in delta["added"]+delta["changed"]:
+        if content_hash(join(delta_path, "files", *rel_path.split("/"))) \
+                != new_files[rel_path]["sha256"]:
+            raise IOError("The delta file %s is corrupted." % (rel_path))
+
+    for rel_path in delta["added"]+delta["changed"]:
+        dst_path = join(app_path, *rel_path.split("/"))
+        if not isdir(os.path.dirname(dst_path)):
+            os.makedirs(os.path.dirname(dst_path))
+        shutil.copy2(join(delta_path, "files", *rel_path.split("/")),
+                     dst_path+".delta")
+        os.rename(dst_path+".delta", dst_path)
+    for rel_path in delta["removed"]:
+        os.remove(join(app_path, *rel_path.split("/")))
+
+    with open(release_path+".delta", mode="w") as f:
+        json.dump(delta["release"], f, indent=1, sort_keys=True)
+    os.rename(release_path+".delta", release_path)
+
+    print ("[MESSAGE] %s is updated from %s to %s: %d files added, "
+           "%d files changed, %d files removed."
+           % (delta["app_name"], delta["from_version"], delta["to_version"],
+              len(delta["added"]), len(delta["changed"]),
+              len(delta["removed"])))
+
+
+def main():
+    """Apply a delta package by the target interpreter."""
+    apply_delta(os.path.abspath(sys.argv[1]), os.path.abspath(sys.argv[2]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+"""Static import graph of a compiled app.
+
+The compiled modules are scanned for import instructions without
+executing them. The modules reachable from the app scripts are resolved
+against the app itself, the standard library and the installed
+distributions of the build environment.
+
+This module only depends on the standard library so that it can be
+executed by the build interpreter, which reads its own bytecode:
+
+    python depgraph.py < request.json
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+from __future__ import print_function
+import os
+from os.path import isdir, isfile, join
+import sys
+import dis
+import json
+import types
+import marshal
+
+try:
+    from importlib.util import find_spec
+except ImportError:
+    find_spec = None
+    import imp
+
+try:
+    import subprocess32 as sp
+except ImportError:
+    import subprocess as sp
+
+
+def pyc_header_size():
+    """The size of the .pyc header of the running interpreter."""
+    if sys.version_info >= (3, 7):
+        return 16
+    elif sys.version_info >= (3, 3):
+        return 12
+    return 8
+
+
+def load_code(pyc_path):
+    """Load the code object of a compiled file."""
+    with open(pyc_path, mode="rb") as f:
+        data = f.read()
+    return marshal.loads(data[pyc_header_size():])
+
+
+def iter_instructions(code):
+    """Get (opname, argument) pairs of a code object."""
+    if hasattr(dis, "get_instructions"):
+        for instr in dis.get_instructions(code):
+            yield instr.opname, instr.argval
+        return
+
+    # Python 2 bytecode
+    co_code = code.co_code
+    idx = 0
+    extended_arg = 0
+    while idx < len(co_code):
+        op = ord(co_code[idx])
+        idx += 1
+        arg = None
+        if op >= dis.HAVE_ARGUMENT:
+            arg = ord(co_code[idx])+ord(co_code[idx+1])*256+extended_arg
+            extended_arg = 0
+            idx += 2
+            if op == dis.EXTENDED_ARG:
+                extended_arg = arg*65536
+                continue
+        opname = dis.opname[op]
+        if op in dis.hasconst:
+            arg = code.co_consts[arg]
+        elif op in dis.hasname:
+            arg = code.co_names[arg]
+        yield opname, arg
+
+
+def scan_imports(code):
+    """Find the imports of a code object and its nested code objects.
+
+    Returns
+    -------
+    A list of (name, fromlist, level) tuples.
+    """
+    imports = []
+    consts = []
+    for opname, arg in iter_instructions(code):
+        if opname == "IMPORT_NAME":
+            fromlist = consts[-1] if consts else None
+            level = consts[-2] if len(consts) > 1 else 0
+            # Python 2 modules without absolute_import use level -1
+            imports.append((arg, tuple(fromlist or ()),
+                            level if isinstance(level, int) else 0))
+        if opname in ("LOAD_CONST", "LOAD_SMALL_INT"):
+            consts.append(arg)
+        else:
+            consts = []
+
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            imports += scan_imports(const)
+
+    return imports
+
+
+def module_name(rel_path):
+    """Get the module name and package flag of a compiled file."""
+    parts = os.path.splitext(rel_path)[0].split(os.sep)
+    if parts[-1] == "__init__":
+        return ".".join(parts[:-1]), True
+    return ".".join(parts), False
+
+
+def resolve_relative(module, is_package, name, level):
+    """Resolve a relative import to an absolute module name."""
+    base = module.split(".")
+    if not is_package:
+        base = base[:-1]
+    if level > 1:
+        base = base[:-(level-1)]
+    return ".".join(base+([name] if name else []))
+
+
+def find_external(top_name, src_path=None):
+    """Locate a top-level module outside of the app.
+
+    Returns
+    -------
+    "builtin", "stdlib", "site", "app" if it's in the source tree or None
+    if it's not found.
+    """
+    if top_name in sys.builtin_module_names:
+        return "builtin"
+    try:
+        if find_spec is not None:
+            spec = find_spec(top_name)
+            if spec is None:
+                return None
+            origin = spec.origin
+            if origin in (None, "namespace") and \
+                    spec.submodule_search_locations:
+                origin = list(spec.submodule_search_locations)[0]
+        else:
+            origin = imp.find_module(top_name)[1]
+    except (ImportError, ValueError):
+        return None
+
+    if origin in (None, "", "built-in", "frozen"):
+        return "builtin"
+    if src_path is not None and os.path.abspath(origin).startswith(
+            os.path.join(os.path.abspath(src_path), "")):
+        return "app"
+    if "site-packages" in origin or "dist-packages" in origin:
+        return "site"
+    return "stdlib"
+
+
+def distribution_map(prefix):
+    """Map top-level modules to the distributions of an environment.
+
+    Returns
+    -------
+    A dictionary of top-level module to (installer, distribution name).
+    """
+    dist_map = {}
+
+    # pip distributions
+    for site_path in sys.path:
+        if not isdir(site_path) or "site-packages" not in site_path:
+            continue
+        for entry in os.listdir(site_path):
+            if not entry.endswith((".dist-info", ".egg-info")):
+                continue
+            dist_path = join(site_path, entry)
+            dist_name = entry.split("-")[0]
+            installer = "pip"
+            top_names = set()
+            if isfile(join(dist_path, "INSTALLER")):
+                with open(join(dist_path, "INSTALLER"), mode="r") as f:
+                    installer = f.read().strip() or "pip"
+            if isfile(join(dist_path, "top_level.txt")):
+                with open(join(dist_path, "top_level.txt"), mode="r") as f:
+                    top_names = set(line.strip() for line in f
+                                    if line.strip())
+            elif isfile(join(dist_path, "RECORD")):
+                with open(join(dist_path, "RECORD"), mode="r") as f:
+                    for line in f:
+                        top = line.split(",")[0].split("/")[0]
+                        if top and not top.endswith(
+                                (".dist-info", ".egg-info", ".data")) \
+                                and top not in ("..", "__pycache__"):
+                            top_names.add(top.rsplit(".py", 1)[0])
+            for top in top_names:
+                dist_map[top] = (installer, dist_name)
+
+    # conda packages override the pip records they ship
+    conda_meta = join(prefix, "conda-meta")
+    if isdir(conda_meta):
+        for entry in os.listdir(conda_meta):
+            if not entry.endswith(".json"):
+                continue
+            with open(join(conda_meta, entry), mode="r") as f:
+                pkg_meta = json.load(f)
+            for file_path in pkg_meta.get("files", []):
+                parts = file_path.split("/")
+                if "site-packages" in parts:
+                    idx = parts.index("site-packages")
+                    if len(parts) > idx+2 or (
+                            len(parts) == idx+2 and
+                            parts[-1].endswith((".py", ".so", ".pyd"))):
+                        top = parts[idx+1].split(".")[0]
+                        if top and top != "__pycache__" and \
+                                not parts[idx+1].endswith(
+                                    (".dist-info", ".egg-info")):
+                            dist_map[top] = ("conda", pkg_meta["name"])
+
+    return dist_map
+
+
+def analyze(src_path, entries, prefix):
+    """Build the import graph of a compiled app.
+
+    Parameters
+    ----------
+    src_path : string
+        the compiled source tree.
+    entries : list
+        relative paths of the compiled app scripts.
+    prefix : string
+        the build environment.
+
+    Returns
+    -------
+    A dictionary of the graph, the reachable and unreachable modules and
+    the distributions that the app uses.
+    """
+    modules = {}
+    for root, dirs, files in os.walk(src_path):
+        for file_name in files:
+            if file_name.endswith(".pyc"):
+                rel_path = os.path.relpath(join(root, file_name), src_path)
+                name, is_package = module_name(rel_path)
+                modules[name] = (rel_path, is_package)
+
+    # the folders of the app scripts are on sys.path as well
+    roots = [""]
+    for entry in entries:
+        entry_package = os.path.dirname(entry).replace(os.sep, ".")
+        if entry_package and entry_package+"." not in roots:
+            roots.append(entry_package+".")
+
+    def resolve(name):
+        for root in roots:
+            if root+name in modules:
+                return root+name
+        return None
+
+    graph = {}
+    external = set()
+    queue = [module_name(entry)[0] for entry in entries
+             if module_name(entry)[0] in modules]
+    reachable = set(queue)
+    while queue:
+        module = queue.pop()
+        rel_path, is_package = modules[module]
+        targets = set()
+        for name, fromlist, level in scan_imports(
+                load_code(join(src_path, rel_path))):
+            if level > 0:
+                name = resolve_relative(module, is_package, name, level)
+            elif level < 0 and resolve(resolve_relative(
+                    module, is_package, name, 1)) is not None:
+                # implicit relative import of Python 2
+                name = resolve_relative(module, is_package, name, 1)
+            candidates = [name]+[name+"."+item for item in fromlist
+                                 if item != "*"]
+            # importing a.b.c imports the packages a and a.b as well
+            parts = name.split(".")
+            candidates += [".".join(parts[:idx])
+                           for idx in range(1, len(parts))]
+            for candidate in candidates:
+                app_module = resolve(candidate) if candidate else None
+                if app_module is not None and app_module != module:
+                    targets.add(app_module)
+                elif app_module is None and candidate == name and name:
+                    external.add(name.split(".")[0])
+        graph[module] = sorted(targets)
+        for target in targets:
+            if target not in reachable:
+                reachable.add(target)
+                queue.append(target)
+
+    dist_map = distribution_map(prefix)
+    distributions = {}
+    missing = []
+    for top_name in sorted(external):
+        location = find_external(top_name, src_path)
+        if top_name in dist_map:
+            installer, dist_name = dist_map[top_name]
+            distributions.setdefault(dist_name, {"installer": installer,
+                                                 "modules": []})
+            distributions[dist_name]["modules"].append(top_name)
+        elif location is None:
+            missing.append(top_name)
+
+    return {"graph": graph,
+            "reachable": sorted(reachable),
+            "unreachable": sorted(set(modules)-reachable),
+            "distributions": distributions,
+            "missing": missing}
+
+
+def run_analysis(python_bin, src_path, entries, prefix, tracer=None):
+    """Analyze a compiled app by the given interpreter.
+
+    Parameters
+    ----------
+    python_bin : string
+        the build interpreter that compiled the app.
+    src_path : string
+        the compiled source tree.
+    entries : list
+        relative paths of the compiled app scripts.
+    prefix : string
+        the build environment.
+    tracer : instrument.Tracer
+        runs the interpreter, so that Tracer.cancel() stops it.
+
+    Returns
+    -------
+    The result of analyze().
+    """
+    script_path = os.path.splitext(os.path.abspath(__file__))[0]+".py"
+    request = json.dumps(
+        {"src_path": src_path, "entries": entries,
+         "prefix": prefix}).encode("utf-8")
+    if tracer is not None:
+        return json.loads(tracer.call([python_bin, script_path],
+                                      merge_stderr=False, echo=False,
+                                      input=request))
+
+    proc = sp.Popen([python_bin, script_path], stdin=sp.PIPE,
+                    stdout=sp.PIPE)
+    out, _ = proc.communicate(request)
+    if proc.returncode != 0:
+        raise sp.CalledProcessError(proc.returncode, python_bin)
+
+    return json.loads(out.decode("utf-8"))
+
+
+def main():
+    """Entry of the analysis in the build interpreter."""
+    request = json.loads(sys.stdin.read())
+    # the folder of this script would shadow the app modules of the same
+    # name, e.g., utils, the source tree is searched first instead
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path[:] = [request["src_path"]] + \
+        [path for path in sys.path
+         if os.path.abspath(path or os.curdir) != script_dir]
+    result = analyze(request["src_path"], request["entries"],
+                     request["prefix"])
+    sys.stdout.write(json.dumps(result))
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Cache of configured build environments.
+
+A configured miniconda is stored under PYSEALER_ENV_PATH by a key that
+hashes the host installer and the dependency lists. A later build with the
+same key clones the stored environment by hard links instead of installing
+it again. Files that embed the installation prefix are copied and
+rewritten for the new prefix, so the stored environment stays intact.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+from __future__ import print_function
+import os
+from os.path import isdir, isfile, join
+import json
+import shutil
+import hashlib
+
+import pysealer
+from pysealer import staging
+from pysealer import relocate
+
+ENV_META_NAME = "pysealer_env.json"
+
+
+def env_key(host_sha, conda_list, pip_list, requirements=None):
+    """Compute the cache key of a build environment.
+
+    Parameters
+    ----------
+    host_sha : string
+        the checksum of the host miniconda installer.
+    conda_list : list
+        the conda_install items.
+    pip_list : list
+        the pip_install items.
+    requirements : string
+        the content of requirements.txt if it's installed.
+
+    Returns
+    -------
+    The hex digest that identifies the environment.
+    """
+    key_dict = {"host": host_sha,
+                "conda_install": list(conda_list),
+                "pip_install": list(pip_list),
+                "requirements": requirements}
+    return hashlib.sha256(
+        json.dumps(key_dict, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def cache_path(key):
+    """The path of a cached environment."""
+    return join(pysealer.PYSEALER_ENV_PATH, key)
+
+
+def store_env(prefix, key):
+    """Store a configured environment in the cache.
+
+    Parameters
+    ----------
+    prefix : string
+        the installation path of the environment.
+    key : string
+        the cache key from env_key().
+    """
+    env_path = cache_path(key)
+    if isfile(join(env_path, ENV_META_NAME)):
+        return
+
+    tmp_path = env_path+".tmp"
+    if isdir(tmp_path):
+        shutil.rmtree(tmp_path)
+
+    prefix = os.path.abspath(prefix)
+    staging.stage_tree(prefix, join(tmp_path, "env"), mode="hardlink")
+    with open(join(tmp_path, ENV_META_NAME), mode="w") as f:
+        json.dump({"prefix": prefix,
+                   "prefix_files": relocate.find_prefix_files(prefix)}, f)
+
+    if isdir(env_path):
+        shutil.rmtree(env_path)
+    os.rename(tmp_path, env_path)
+    print ("[MESSAGE] The environment is cached at %s" % (env_path))
+
+
+def clone_env(key, prefix):
+    """Clone a cached environment to a new prefix.
+
+    Parameters
+    ----------
+    key : string
+        the cache key from env_key().
+    prefix : string
+        the installation path of the clone, must not exist.
+
+    Returns
+    -------
+    True if the environment is cloned, False if it's not cached or can't
+    be relocated to the prefix.
+    """
+    env_path = cache_path(key)
+    meta_path = join(env_path, ENV_META_NAME)
+    if not isfile(meta_path):
+        return False
+
+    with open(meta_path, mode="r") as f:
+        env_meta = json.load(f)
+
+    prefix = os.path.abspath(prefix)
+    old_prefix = env_meta["prefix"].encode("utf-8")
+    new_prefix = prefix.encode("utf-8")
+    prefix_files = env_meta["prefix_files"]
+    if len(new_prefix) > len(old_prefix) and \
+            "binary" in prefix_files.values():
+        print ("[MESSAGE] The cached environment can't be relocated to "
+               "a longer prefix %s." % (prefix))
+        return False
+
+    staging.stage_tree(join(env_path, "env"), prefix, mode="hardlink",
+                       exclude=set(prefix_files))
+
+    for rel_path, mode in prefix_files.items():
+        src_path = join(env_path, "env", rel_path)
+        dst_path = join(prefix, rel_path)
+        with open(src_path, mode="rb") as f:
+            content = f.read()
+        with open(dst_path, mode="wb") as f:
+            f.write(relocate.replace_prefix(content, old_prefix,
+                                            new_prefix, mode))
+        shutil.copymode(src_path, dst_path)
+
+    relocate.relocate_links(prefix, env_meta["prefix"])
+
+    print ("[MESSAGE] The cached environment %s is cloned to %s"
+           % (env_path, prefix))
+
+    return True
@@ -0,0 +1,414 @@
+"""Native self-extracting installer builder.
+
+The sealed app is streamed into a tar archive file by file, the stream is
+cut into chunks that are compressed in parallel and written in order after
+a small shell stub, followed by a table of the chunks. Concatenated gzip,
+bzip2 and xz streams are valid streams themselves, so the stub extracts
+the payload with the standard command line tools.
+
+At target, the chunks are verified and decompressed in parallel on all
+cores, then every extracted file is verified against the checksum list
+at the end of the payload. Decompressed chunks are kept until the
+extraction is done, so an interrupted install resumes from them. The
+peak disk use of an install is therefore the installer, the decompressed
+payload in the chunk folder and the extracted tree, i.e., about twice
+the size of the app besides the installer.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+from __future__ import print_function
+import os
+from os.path import join
+import io
+import json
+import time
+import zlib
+import bz2
+import hashlib
+import tarfile
+import tempfile
+import collections
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+
+def gzip_compress(data, level):
+    """Compress data as a gzip member."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16+zlib.MAX_WBITS)
+    return compressor.compress(data)+compressor.flush()
+
+
+def gzip_decompress(data):
+    """Decompress concatenated gzip members."""
+    result = []
+    while data:
+        decompressor = zlib.decompressobj(16+zlib.MAX_WBITS)
+        result.append(decompressor.decompress(data))
+        data = decompressor.unused_data
+    return b"".join(result)
+
+
+# codec name: (compress, decompress, shell command to decompress)
+CODECS = {
+    "none": (lambda data, level: data, lambda data: data, "cat"),
+    "gzip": (gzip_compress, gzip_decompress, "gzip -dc"),
+    "bzip2": (lambda data, level: bz2.compress(data, level),
+              bz2.decompress, "bzip2 -dc"),
+}
+if lzma is not None:
+    CODECS["xz"] = (lambda data, level: lzma.compress(data, preset=level),
+                    lzma.decompress, "xz -dc")
+
+# the list of extracted files and their SHA-256 checksums, in the format
+# of sha256sum
+CHECKSUM_NAME = ".pysealer_files.sha256"
+# records the payload checksum of a complete extraction
+EXTRACTED_NAME = ".pysealer_extracted"
+
+STUB_TEMPLATE = """#!/bin/sh
+# Self-extracting installer for %(label)s
+# Built by PySealer, payload: tar stream compressed by %(codec)s
+PAYLOAD_OFFSET=%(offset)010d
+TABLE_OFFSET=%(table_offset)015d
+PAYLOAD_SHA256=%(sha256)s
+TARGET_DIR=${1:-%(app_name)s}
+[ $# -gt 0 ] && shift
+
+NPROC=$(getconf _NPROCESSORS_ONLN 2>/dev/null || echo 1)
+if command -v sha256sum >/dev/null 2>&1; then
+    SHA256="sha256sum"
+elif command -v shasum >/dev/null 2>&1; then
+    SHA256="shasum -a 256"
+fi
+INSTALLER="$0"
+CHUNK_DIR="${TARGET_DIR}/.pysealer_chunks"
+CHECK_DIR="${TARGET_DIR}/.pysealer_check"
+export INSTALLER CHUNK_DIR SHA256
+
+mkdir -p "${TARGET_DIR}" || exit 1
+if [ "$(cat "${TARGET_DIR}/%(extracted)s" 2>/dev/null)" = \\
+        "${PAYLOAD_SHA256}" ]; then
+    echo "[MESSAGE] %(label)s is already extracted to ${TARGET_DIR}."
+else
+    echo "[MESSAGE] Extracting %(label)s to ${TARGET_DIR} by ${NPROC} jobs..."
+    mkdir -p "${CHUNK_DIR}" || exit 1
+    # the decompressed chunks take the size of the payload until the end
+    # of the extraction, an interrupted install reuses them
+    # index, offset in the installer, size and checksum of every chunk
+    tail -c +${TABLE_OFFSET} "$0" | xargs -n 4 -P ${NPROC} sh -c '
+        CHUNK="${CHUNK_DIR}/$1"
+        [ -f "${CHUNK}" ] && exit 0
+        tail -c +$2 "${INSTALLER}" | head -c $3 \\
+            > "${CHUNK}.z" || exit 1
+        if [ -n "${SHA256}" ] && \\
+                [ "$(${SHA256} < "${CHUNK}.z" | cut -c 1-64)" != "$4" ]; then
+            echo "[MESSAGE] The chunk $1 of the installer is corrupted." >&2
+            exit 1
+        fi
+        %(decompress)s < "${CHUNK}.z" > "${CHUNK}.part" || exit 1
+        rm "${CHUNK}.z" && mv "${CHUNK}.part" "${CHUNK}"' sh || exit 1
+    cat "${CHUNK_DIR}"/*[0-9] | tar -xf - -C "${TARGET_DIR}" || exit 1
+
+    if [ -n "${SHA256}" ]; then
+        echo "[MESSAGE] Verifying the extracted files by ${NPROC} jobs..."
+        rm -rf "${CHECK_DIR}" && mkdir -p "${CHECK_DIR}" || exit 1
+        (cd "${TARGET_DIR}" && cut -c 67- %(checksums)s | tr '\\n' '\\0' | \\
+            xargs -0 -n 64 -P ${NPROC} sh -c '${SHA256} "$@" \\
+                > "$(mktemp .pysealer_check/sum.XXXXXX)"' sh) || exit 1
+        sort "${TARGET_DIR}/%(checksums)s" > "${CHECK_DIR}/expected"
+        cat "${CHECK_DIR}"/sum.* | sort > "${CHECK_DIR}/actual"
+        if ! cmp -s "${CHECK_DIR}/expected" "${CHECK_DIR}/actual"; then
+            echo "[MESSAGE] The extracted files are corrupted:"
+            sort "${CHECK_DIR}/expected" "${CHECK_DIR}/actual" | uniq -u | \\
+                cut -c 67- | sort -u
+            exit 1
+        fi
+        rm -rf "${CHECK_DIR}"
+    fi
+    rm -rf "${CHUNK_DIR}"
+    echo "${PAYLOAD_SHA256}" > "${TARGET_DIR}/%(extracted)s"
+fi
+cd "${TARGET_DIR}" && %(startup)s "$@"
+exit $?
+"""
+
+
+class ChunkWriter(io.RawIOBase):
+    """A file object that compresses the written stream in chunks.
+
+    At most 2*workers chunks are in memory at a time, the compressed
+    chunks are written to the output file in order.
+    """
+
+    def __init__(self, out_file, codec, level, workers, chunk_size):
+        """Init the writer and the compressing threads."""
+        self.out_file = out_file
+        self.compress = CODECS[codec][0]
+        self.level = level
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.pool = ThreadPool(workers)
+        self.pending = collections.deque()
+        self.buffer = []
+        self.buffer_size = 0
+        self.sha = hashlib.sha256()
+        self.chunks = []
+
+    def writable(self):
+        """The writer is writable."""
+        return True
+
+    def write(self, data):
+        """Buffer data and compress every full chunk."""
+        self.buffer.append(bytes(data))
+        self.buffer_size += len(data)
+        if self.buffer_size >= self.chunk_size:
+            self.submit()
+        return len(data)
+
+    def submit(self):
+        """Compress the buffered data in the pool."""
+        if self.buffer_size == 0:
+            return
+        chunk = b"".join(self.buffer)
+        self.buffer = []
+        self.buffer_size = 0
+        self.pending.append((len(chunk), self.pool.apply_async(
+            self.compress, (chunk, self.level))))
+        while len(self.pending) >= 2*self.workers:
+            self.drain()
+
+    def drain(self):
+        """Write the oldest compressed chunk."""
+        raw_size, result = self.pending.popleft()
+        data = result.get()
+        self.out_file.write(data)
+        self.sha.update(data)
+        self.chunks.append({"raw_size": raw_size,
+                            "size": len(data),
+                            "sha256": hashlib.sha256(data).hexdigest()})
+
+    def finish(self):
+        """Write all pending chunks and stop the pool.
+
+        Returns
+        -------
+        The SHA-256 checksum of the payload.
+        """
+        self.submit()
+        while self.pending:
+            self.drain()
+        self.pool.close()
+        self.pool.join()
+        return self.sha.hexdigest()
+
+
+class HashReader(object):
+    """A file object that hashes the data read from it."""
+
+    def __init__(self, file_obj):
+        """Wrap a file object."""
+        self.file_obj = file_obj
+        self.sha = hashlib.sha256()
+
+    def read(self, size=-1):
+        """Read and hash data."""
+        data = self.file_obj.read(size)
+        self.sha.update(data)
+        return data
+
+
+def iter_tree(src_path):
+    """Walk a folder in sorted order.
+
+    Returns
+    -------
+    A generator of relative paths of folders, files and links.
+    """
+    for root, dirs, files in os.walk(src_path):
+        dirs.sort()
+        rel_root = os.path.relpath(root, src_path)
+        if rel_root != os.curdir:
+            yield rel_root
+        for file_name in sorted(files):
+            yield os.path.normpath(join(rel_root, file_name))
+        # links to folders are archived as links
+        for dir_name in dirs:
+            if os.path.islink(join(root, dir_name)):
+                yield os.path.normpath(join(rel_root, dir_name))
+        dirs[:] = [name for name in dirs
+                   if not os.path.islink(join(root, name))]
+
+
+def build_installer(src_path, installer_path, label="app",
+                    app_name="app", startup="./build.sh", codec="gzip",
+                    level=6, workers=None, chunk_size=4 << 20,
+                    mtime=None):
+    """Build a self-extracting installer of a folder.
+
+    Parameters
+    ----------
+    src_path : string
+        the folder to pack.
+    installer_path : string
+        the destination .run file, a manifest is written to
+        installer_path.manifest.json. The checksums of the files are
+        appended to the payload as CHECKSUM_NAME.
+    label : string
+        the description of the installer.
+    app_name : string
+        the default extraction folder.
+    startup : string
+        the command that is executed in the extracted folder.
+    codec : string
+        "gzip", "bzip2", "xz" or "none".
+    level : int
+        the compression level of the codec.
+    workers : int
+        the number of compressing threads, use all CPU cores if None.
+    chunk_size : int
+        the size of the tar stream that is compressed as one chunk.
+    mtime : int
+        archive every file with this time stamp and without its owner,
+        so that the installer is reproducible.
+
+    Returns
+    -------
+    The manifest as a dictionary.
+    """
+    if codec not in CODECS:
+        raise ValueError("The codec %s is not supported." % (codec))
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    stub_dict = {"label": label, "codec": codec, "app_name": app_name,
+                 "decompress": CODECS[codec][2], "startup": startup,
+                 "offset": 0, "table_offset": 0, "sha256": "0"*64,
+                 "checksums": CHECKSUM_NAME, "extracted": EXTRACTED_NAME}
+    stub_size = len((STUB_TEMPLATE % stub_dict).encode("utf-8"))
+    stub_dict["offset"] = stub_size+1
+
+    file_list = []
+    with open(installer_path, mode="wb") as f:
+        f.write(b"\x00"*stub_size)
+        writer = ChunkWriter(f, codec, level, workers, chunk_size)
+        tar = tarfile.open(fileobj=writer, mode="w|")
+        for rel_path in iter_tree(src_path):
+            file_path = join(src_path, rel_path)
+            tar_info = tar.gettarinfo(file_path, arcname=rel_path)
+            if mtime is not None:
+                tar_info.mtime = mtime
+                tar_info.uid = tar_info.gid = 0
+                tar_info.uname = tar_info.gname = ""
+            if not tar_info.isreg():
+                tar.addfile(tar_info)
+                continue
+            # the file is hashed while it's archived
+            with open(file_path, mode="rb") as file_obj:
+                reader = HashReader(file_obj)
+                tar.addfile(tar_info, reader)
+            file_list.append({"path": rel_path.replace(os.sep, "/"),
+                              "size": tar_info.size,
+                              "sha256": reader.sha.hexdigest()})
+
+        checksums = "".join("%s  %s\n" % (entry["sha256"], entry["path"])
+                            for entry in file_list).encode("utf-8")
+        tar_info = tarfile.TarInfo(CHECKSUM_NAME)
+        tar_info.size = len(checksums)
+        tar_info.mtime = int(time.time()) if mtime is None else mtime
+        tar_info.mode = 0o644
+        tar.addfile(tar_info, io.BytesIO(checksums))
+        tar.close()
+        stub_dict["sha256"] = writer.finish()
+
+        # the chunk table follows the payload, offsets count from 1 as
+        # in tail -c +offset
+        stub_dict["table_offset"] = f.tell()+1
+        offset = stub_dict["offset"]
+        for idx, chunk in enumerate(writer.chunks):
+            f.write(("%08d %d %d %s\n" % (idx, offset, chunk["size"],
+                                          chunk["sha256"])).encode("utf-8"))
+            offset += chunk["size"]
+
+        f.seek(0)
+        f.write((STUB_TEMPLATE % stub_dict).encode("utf-8"))
+
+    os.chmod(installer_path, 0o755)
+
+    installer_manifest = {"codec": codec,
+                          "level": level,
+                          "chunk_size": chunk_size,
+                          "payload_offset": stub_dict["offset"],
+                          "payload_sha256": stub_dict["sha256"],
+                          "chunks": writer.chunks,
+                          "files": file_list}
+    with open(installer_path+".manifest.json", mode="w") as f:
+        json.dump(installer_manifest, f, indent=1)
+
+    return installer_manifest
+
+
+def read_payload(installer_path, installer_manifest):
+    """Decompress the tar stream of an installer in a single thread."""
+    decompress = CODECS[installer_manifest["codec"]][1]
+    data = []
+    with open(installer_path, mode="rb") as f:
+        f.seek(installer_manifest["payload_offset"]-1)
+        for chunk in installer_manifest["chunks"]:
+            data.append(decompress(f.read(chunk["size"])))
+    return b"".join(data)
+
+
+def measure_codecs(src_path, codec_list=None, workers=None):
+    """Measure the installer size and speed of codecs.
+
+    Parameters
+    ----------
+    src_path : string
+        the folder to pack.
+    codec_list : list
+        (codec, level) tuples, all available codecs at level 6 if None.
+    workers : int
+        the number of compressing threads, use all CPU cores if None.
+
+    Returns
+    -------
+    A list of dictionaries with the codec, level, installer size,
+    compression time and decompression time in seconds.
+    """
+    if codec_list is None:
+        codec_list = [(codec, 6) for codec in sorted(CODECS)]
+
+    results = []
+    tmp_dir = tempfile.mkdtemp()
+    installer_path = join(tmp_dir, "measure.run")
+    try:
+        for codec, level in codec_list:
+            start_time = time.time()
+            installer_manifest = build_installer(
+                src_path, installer_path, codec=codec, level=level,
+                workers=workers)
+            compress_time = time.time()-start_time
+
+            start_time = time.time()
+            read_payload(installer_path, installer_manifest)
+            decompress_time = time.time()-start_time
+
+            results.append({"codec": codec,
+                            "level": level,
+                            "size": os.path.getsize(installer_path),
+                            "compress_time": compress_time,
+                            "decompress_time": decompress_time})
+    finally:
+        for file_name in os.listdir(tmp_dir):
+            os.remove(join(tmp_dir, file_name))
+        os.rmdir(tmp_dir)
+
+    return results
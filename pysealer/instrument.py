@@ -0,0 +1,312 @@
+"""Structured instrumentation of the sealing stages.
+
+A Tracer emits events for the start and end of every stage and
+subprocess, and aggregates counters such as the files compiled and the
+bytes copied or downloaded. An event is a dictionary:
+
+    {"name": "compile_app", "cat": "stage", "ph": "B", "ts": 1.5e9,
+     "pid": 123, "tid": 456, "args": {}}
+
+with the phase "B" (begin), "E" (end), "C" (counters) or "i" (instant)
+and the time stamp in seconds since the epoch. Events are passed to
+sinks, a sink is any callable that takes an event, e.g., a callback of a
+CI dashboard, JsonLinesSink or ChromeTraceSink.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+from __future__ import print_function
+import os
+import sys
+import json
+import signal
+import time
+import functools
+import threading
+import contextlib
+
+try:
+    import subprocess32 as sp
+except ImportError:
+    import subprocess as sp
+
+# the captured output of a subprocess is kept up to this size in events
+OUTPUT_LIMIT = 64 << 10
+
+# a subprocess leads its own process group, so it's terminated with the
+# children it starts, preexec_fn is not thread safe and only a fallback
+if sys.version_info >= (3, 2) or sp.__name__ == "subprocess32":
+    NEW_SESSION = {"start_new_session": True}
+elif hasattr(os, "setsid"):
+    NEW_SESSION = {"preexec_fn": os.setsid}
+else:
+    NEW_SESSION = {}
+
+
+class CancelledError(Exception):
+    """A subprocess is not started or is stopped by Tracer.cancel()."""
+
+
+def send_signal(proc, signum):
+    """Send a signal to a running subprocess and its process group."""
+    if proc.poll() is not None:
+        return
+    try:
+        if hasattr(os, "killpg") and os.getpgid(proc.pid) == proc.pid:
+            os.killpg(proc.pid, signum)
+        else:
+            proc.send_signal(signum)
+    except (OSError, ValueError):
+        pass
+
+
+def terminate(proc):
+    """Terminate a running subprocess and its process group."""
+    send_signal(proc, signal.SIGTERM)
+
+
+def write_input(stdin, data):
+    """Write the input of a subprocess and close its stdin."""
+    try:
+        stdin.write(data)
+    except (IOError, OSError):
+        # the subprocess exits before reading all input
+        pass
+    finally:
+        try:
+            stdin.close()
+        except (IOError, OSError):
+            pass
+
+
+class JsonLinesSink(object):
+    """Write events to a file as one JSON object per line."""
+
+    def __init__(self, log_path):
+        """Open the log file for appending."""
+        self.log_file = open(log_path, mode="a")
+        self.lock = threading.Lock()
+
+    def __call__(self, event):
+        """Write an event."""
+        with self.lock:
+            self.log_file.write(json.dumps(event, sort_keys=True)+"\n")
+            self.log_file.flush()
+
+    def close(self):
+        """Close the log file."""
+        self.log_file.close()
+
+
+class ChromeTraceSink(object):
+    """Write events as a Chrome trace that Perfetto opens as well.
+
+    The events are streamed in the JSON array format, which viewers also
+    accept when the trace is not closed, e.g., after a crash.
+    """
+
+    def __init__(self, trace_path):
+        """Open the trace file."""
+        self.trace_file = open(trace_path, mode="w")
+        self.trace_file.write("[\n")
+        self.lock = threading.Lock()
+        self.num_events = 0
+
+    def __call__(self, event):
+        """Write an event with the time stamp in microseconds."""
+        trace_event = dict(event)
+        trace_event["ts"] = int(event["ts"]*1e6)
+        if event["ph"] == "i":
+            trace_event["s"] = "p"
+        with self.lock:
+            self.trace_file.write(("" if self.num_events == 0 else ",\n") +
+                                  json.dumps(trace_event, sort_keys=True))
+            self.trace_file.flush()
+            self.num_events += 1
+
+    def close(self):
+        """Terminate the JSON array and close the trace file."""
+        self.trace_file.write("\n]\n")
+        self.trace_file.close()
+
+
+class Tracer(object):
+    """Emitter of stage, subprocess and counter events."""
+
+    def __init__(self, sinks=(), echo=True):
+        """Init a tracer.
+
+        Parameters
+        ----------
+        sinks : list
+            callables that take every event.
+        echo : bool
+            print the messages and the output of subprocesses to the
+            console.
+        """
+        self.sinks = list(sinks)
+        self.echo = echo
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.cancelled = threading.Event()
+        self.procs = set()
+
+    def add_sink(self, sink):
+        """Send the following events to a sink as well."""
+        self.sinks.append(sink)
+
+    def close(self):
+        """Close the sinks that hold a file."""
+        for sink in self.sinks:
+            if hasattr(sink, "close"):
+                sink.close()
+
+    def cancel(self):
+        """Terminate the running subprocesses and refuse new ones.
+
+        Call reset() to start subprocesses again.
+        """
+        self.cancelled.set()
+        with self.lock:
+            for proc in self.procs:
+                terminate(proc)
+
+    def interrupt(self):
+        """Forward an interrupt to the running subprocesses.
+
+        The subprocesses lead their own process groups, so Ctrl-C in the
+        terminal only reaches them by this.
+        """
+        with self.lock:
+            for proc in self.procs:
+                send_signal(proc, signal.SIGINT)
+
+    def reset(self):
+        """Allow subprocesses after a cancel()."""
+        self.cancelled.clear()
+
+    def emit(self, name, cat, ph, args=None):
+        """Send an event to all sinks."""
+        event = {"name": name, "cat": cat, "ph": ph, "ts": time.time(),
+                 "pid": os.getpid(),
+                 "tid": threading.current_thread().ident,
+                 "args": args if args is not None else {}}
+        for sink in self.sinks:
+            sink(event)
+
+    def count(self, name, value=1):
+        """Add to a counter, counters are emitted at the end of a span."""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0)+value
+
+    def message(self, text):
+        """Report a progress message."""
+        if self.echo:
+            print ("[MESSAGE] "+text)
+        self.emit("message", "message", "i", {"text": text})
+
+    @contextlib.contextmanager
+    def span(self, name, cat="stage", **args):
+        """Emit the begin and end events of a block.
+
+        The end event has the duration in seconds, the error if the
+        block raises and a snapshot of the counters.
+        """
+        self.emit(name, cat, "B", args)
+        start_time = time.time()
+        end_args = {}
+        try:
+            yield end_args
+        except BaseException as e:
+            end_args["error"] = repr(e)
+            raise
+        finally:
+            end_args["duration"] = time.time()-start_time
+            with self.lock:
+                counters = dict(self.counters)
+            self.emit(name, cat, "E", end_args)
+            if counters:
+                self.emit("counters", "counter", "C", counters)
+
+    def call(self, args, check=True, merge_stderr=True, echo=None,
+             input=None, **kwargs):
+        """Run a subprocess and record it.
+
+        Parameters
+        ----------
+        args : list
+            the command.
+        check : bool
+            raise CalledProcessError if the command fails.
+        merge_stderr : bool
+            capture stderr together with stdout, otherwise stderr goes
+            to the console.
+        echo : bool
+            print the output while it's captured, the tracer's echo if
+            None.
+        input : bytes
+            sent to the stdin of the command, which is closed after.
+        kwargs : dict
+            other arguments of subprocess.Popen.
+
+        Returns
+        -------
+        The captured output as a string.
+        """
+        if echo is None:
+            echo = self.echo
+        if self.cancelled.is_set():
+            raise CancelledError("%s is cancelled." % (args[0]))
+        with self.span(os.path.basename(str(args[0])), cat="subprocess",
+                       args=[str(arg) for arg in args]) as end_args:
+            for key, value in NEW_SESSION.items():
+                kwargs.setdefault(key, value)
+            proc = sp.Popen(args, stdout=sp.PIPE,
+                            stderr=sp.STDOUT if merge_stderr else None,
+                            stdin=sp.PIPE if input is not None else None,
+                            **kwargs)
+            with self.lock:
+                self.procs.add(proc)
+            if self.cancelled.is_set():
+                terminate(proc)
+            if input is not None:
+                # written by a thread, so a full stdout pipe can't block
+                writer = threading.Thread(target=write_input,
+                                          args=(proc.stdin, input))
+                writer.daemon = True
+                writer.start()
+            output = []
+            try:
+                for line in iter(proc.stdout.readline, b""):
+                    output.append(line)
+                    if echo:
+                        sys.stdout.write(line.decode("utf-8", "replace"))
+                        sys.stdout.flush()
+                proc.stdout.close()
+                returncode = proc.wait()
+            except KeyboardInterrupt:
+                self.interrupt()
+                proc.wait()
+                raise
+            finally:
+                with self.lock:
+                    self.procs.discard(proc)
+            output = b"".join(output).decode("utf-8", "replace")
+            end_args["returncode"] = returncode
+            end_args["output"] = output[-OUTPUT_LIMIT:]
+
+        if self.cancelled.is_set() and returncode != 0:
+            raise CancelledError("%s is cancelled." % (args[0]))
+        if check and returncode != 0:
+            raise sp.CalledProcessError(returncode, args, output)
+        return output
+
+
+def traced(method):
+    """Run a method of an object with a tracer as a stage span."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.tracer.span(method.__name__):
+            return method(self, *args, **kwargs)
+    return wrapper
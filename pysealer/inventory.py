@@ -0,0 +1,340 @@
+"""Single-pass inventory of the app files.
+
+The app is walked once per build by os.scandir, which gets the entry
+types from the folder listing, so only the files that pass the ignore
+rules are stat'ed. Every file is recorded as its relative path, type,
+size, mtime and a content hash that is computed on first use. The
+columns are kept in arrays, so that trees of 100k+ files stay compact:
+
+    paths   ["pkg/__init__.py", "pkg/data.csv", "main.py", ...]
+    kinds   bytearray of FILE or LINK
+    sizes   array of int
+    mtimes  array of float
+    hashes  [hex digest or None, ...]
+
+The inventory is saved at pysealer_build/inventory.json. The next build
+reuses the hash of a file whose type, size and mtime are unchanged and
+reports the difference against it.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+from __future__ import print_function
+import os
+from os.path import isfile, join
+import sys
+import json
+import hashlib
+from array import array
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+INVENTORY_NAME = "inventory.json"
+INVENTORY_VERSION = 1
+
+# the types of the entries, linked folders are listed like files
+FILE = ord("f")
+LINK = ord("l")
+
+# array type of the sizes, "q" is not supported before Python 3.3
+SIZE_TYPE = "q" if sys.version_info >= (3, 3) else "l"
+
+
+class ListEntry(object):
+    """os.scandir style entry by os.listdir, if scandir is missing."""
+
+    def __init__(self, folder, name):
+        """Init an entry of a folder by its name."""
+        self.name = name
+        self.path = join(folder, name)
+        self._lstat = None
+
+    def stat(self, follow_symlinks=True):
+        """The status of the entry, see os.DirEntry."""
+        if follow_symlinks:
+            return os.stat(self.path)
+        if self._lstat is None:
+            self._lstat = os.lstat(self.path)
+        return self._lstat
+
+    def is_symlink(self):
+        """Check if the entry is a symbolic link."""
+        return (self.stat(follow_symlinks=False).st_mode & 0o170000) == \
+            0o120000
+
+    def is_dir(self, follow_symlinks=True):
+        """Check if the entry is a folder."""
+        if self.is_symlink():
+            return follow_symlinks and os.path.isdir(self.path)
+        return (self.stat(follow_symlinks=False).st_mode & 0o170000) == \
+            0o040000
+
+
+def list_entries(folder):
+    """List the entries of a folder, sorted by name."""
+    if scandir is not None:
+        entries = list(scandir(folder))
+    else:
+        entries = [ListEntry(folder, name) for name in os.listdir(folder)]
+    return sorted(entries, key=lambda entry: entry.name)
+
+
+def walk_entries(root, path_filter=None, excluded=None):
+    """Walk a folder by scandir, as pathfilter.PathFilter.walk().
+
+    Excluded folders are pruned without walking into them. Linked
+    folders are listed like files and are not walked.
+
+    Parameters
+    ----------
+    root : string
+        the folder to walk.
+    path_filter : pathfilter.PathFilter
+        the ignore rules, nothing is excluded if None.
+    excluded : list
+        receives the relative paths of the excluded files.
+
+    Returns
+    -------
+    A generator of the relative paths, separated by "/", and their
+    entries.
+    """
+    folders = [("", root)]
+    while folders:
+        prefix, folder = folders.pop()
+        for entry in list_entries(folder):
+            rel_path = prefix+entry.name
+            if entry.is_dir():
+                if path_filter is not None and \
+                        path_filter.excluded(rel_path, is_dir=True):
+                    continue
+                if entry.is_symlink():
+                    yield rel_path, entry
+                else:
+                    folders.append((rel_path+"/", entry.path))
+            elif path_filter is not None and path_filter.excluded(rel_path):
+                if excluded is not None:
+                    excluded.append(rel_path)
+            else:
+                yield rel_path, entry
+
+
+def list_tree(root):
+    """List the files and links under a folder without stat'ing them.
+
+    Returns
+    -------
+    A set of paths relative to root, separated by os.sep, empty if the
+    folder doesn't exist.
+    """
+    if not os.path.isdir(root):
+        return set()
+    return set(rel_path.replace("/", os.sep)
+               for rel_path, _ in walk_entries(root))
+
+
+class Inventory(object):
+    """The files of a folder with their size, mtime and hash."""
+
+    def __init__(self, root, algorithm="sha256"):
+        """Init an empty inventory.
+
+        Parameters
+        ----------
+        root : string
+            the folder of the files.
+        algorithm : string
+            the hash algorithm of the files, supported by hashlib.
+        """
+        self.root = root
+        self.algorithm = algorithm
+        self.paths = []
+        self.kinds = bytearray()
+        self.sizes = array(SIZE_TYPE)
+        self.mtimes = array("d")
+        self.hashes = []
+        # the excluded compiled files, e.g., "pkg/module.pyc"
+        self.compiled = set()
+        self._index = None
+
+    @classmethod
+    def scan(cls, root, path_filter=None, previous=None):
+        """Walk a folder once and stat the files that are not excluded.
+
+        Parameters
+        ----------
+        root : string
+            the folder to walk.
+        path_filter : pathfilter.PathFilter
+            the ignore rules, nothing is excluded if None.
+        previous : Inventory
+            the inventory of the last build, the hashes of the unchanged
+            files are reused.
+
+        Returns
+        -------
+        An inventory sorted by the relative paths.
+        """
+        self = cls(root) if previous is None else \
+            cls(root, algorithm=previous.algorithm)
+        records = []
+        excluded = []
+        for rel_path, entry in walk_entries(root, path_filter, excluded):
+            st = entry.stat(follow_symlinks=False)
+            kind = FILE
+            if entry.is_symlink():
+                kind = LINK
+                # a linked file changes with its target
+                try:
+                    st = entry.stat()
+                except OSError:
+                    pass
+            records.append((rel_path.replace("/", os.sep), kind,
+                            st.st_size, st.st_mtime))
+        records.sort()
+
+        for rel_path, kind, size, mtime in records:
+            file_sha = None
+            i = previous.find(rel_path) if previous is not None else None
+            if i is not None and previous.kinds[i] == kind and \
+                    previous.sizes[i] == size and \
+                    previous.mtimes[i] == mtime:
+                file_sha = previous.hashes[i]
+            self.paths.append(rel_path)
+            self.kinds.append(kind)
+            self.sizes.append(size)
+            self.mtimes.append(mtime)
+            self.hashes.append(file_sha)
+        self.compiled = set(rel_path.replace("/", os.sep)
+                            for rel_path in excluded
+                            if rel_path.endswith(".pyc"))
+
+        return self
+
+    @classmethod
+    def load(cls, file_path):
+        """Load a saved inventory.
+
+        Returns
+        -------
+        The inventory, None if the file is missing, corrupted or of
+        another version.
+        """
+        if not isfile(file_path):
+            return None
+        try:
+            with open(file_path, mode="r") as f:
+                inventory_dict = json.load(f)
+        except ValueError:
+            print ("[MESSAGE] The inventory at %s is corrupted, ignored."
+                   % (file_path))
+            return None
+        if inventory_dict.get("version") != INVENTORY_VERSION:
+            return None
+
+        self = cls(inventory_dict["root"],
+                   algorithm=inventory_dict["algorithm"])
+        self.paths = [rel_path.replace("/", os.sep)
+                      for rel_path in inventory_dict["paths"]]
+        self.kinds = bytearray(inventory_dict["kinds"].encode("ascii"))
+        self.sizes = array(SIZE_TYPE, inventory_dict["sizes"])
+        self.mtimes = array("d", inventory_dict["mtimes"])
+        self.hashes = inventory_dict["hashes"]
+        return self
+
+    def save(self, file_path):
+        """Write the inventory to disk, replacing the saved one."""
+        tmp_path = file_path+".tmp"
+        with open(tmp_path, mode="w") as f:
+            json.dump({"version": INVENTORY_VERSION,
+                       "root": self.root,
+                       "algorithm": self.algorithm,
+                       "paths": [rel_path.replace(os.sep, "/")
+                                 for rel_path in self.paths],
+                       "kinds": self.kinds.decode("ascii"),
+                       "sizes": self.sizes.tolist(),
+                       "mtimes": self.mtimes.tolist(),
+                       "hashes": self.hashes}, f, separators=(",", ":"))
+        os.rename(tmp_path, file_path)
+
+    def __len__(self):
+        """The number of files."""
+        return len(self.paths)
+
+    def __contains__(self, rel_path):
+        """Check if a relative path is in the inventory."""
+        return self.find(rel_path) is not None
+
+    def find(self, rel_path):
+        """The position of a relative path, None if it's not listed."""
+        if self._index is None:
+            self._index = dict((path, i) for i, path in
+                               enumerate(self.paths))
+        return self._index.get(rel_path)
+
+    def stat(self, rel_path):
+        """The size and mtime of a listed file."""
+        i = self.find(rel_path)
+        return self.sizes[i], self.mtimes[i]
+
+    def is_link(self, rel_path):
+        """Check if a listed file is a symbolic link."""
+        return self.kinds[self.find(rel_path)] == LINK
+
+    def file_hash(self, rel_path):
+        """The hash of a listed file, it's computed on first use.
+
+        The hash of a linked folder is the one of the link target.
+        """
+        i = self.find(rel_path)
+        if self.hashes[i] is None:
+            file_path = join(self.root, rel_path)
+            if self.kinds[i] == LINK and not isfile(file_path):
+                self.hashes[i] = hashlib.new(
+                    self.algorithm,
+                    os.readlink(file_path).encode("utf-8")).hexdigest()
+            else:
+                sha = hashlib.new(self.algorithm)
+                with open(file_path, mode="rb") as f:
+                    while True:
+                        block = f.read(1 << 20)
+                        if not block:
+                            break
+                        sha.update(block)
+                self.hashes[i] = sha.hexdigest()
+        return self.hashes[i]
+
+    def diff(self, previous):
+        """Compare the inventory against the one of the last build.
+
+        Files are compared by type, size and mtime, nothing is hashed.
+
+        Returns
+        -------
+        added : list
+            files that are not in the previous inventory.
+        changed : list
+            files of another type, size or mtime.
+        removed : list
+            files that are only in the previous inventory.
+        """
+        added = []
+        changed = []
+        for i, rel_path in enumerate(self.paths):
+            j = previous.find(rel_path)
+            if j is None:
+                added.append(rel_path)
+            elif (previous.kinds[j], previous.sizes[j],
+                  previous.mtimes[j]) != (self.kinds[i], self.sizes[i],
+                                          self.mtimes[i]):
+                changed.append(rel_path)
+        removed = [rel_path for rel_path in previous.paths
+                   if rel_path not in self]
+        return added, changed, removed
@@ -0,0 +1,187 @@
+"""Fast-start launcher of sealed app scripts.
+
+The interpreter of a sealed app doesn't change after the installation, so
+the module search path that the site module computes is frozen once at
+install time:
+
+    python -E -s launcher.py --freeze <app_path>
+
+The app scripts then start the interpreter without the site module, the
+user site and the environment variables, and the launcher restores the
+frozen sys.path before it runs the compiled script:
+
+    python -I -S -B launcher.py [--archive] <app_path> <script.pyc> [args...]
+
+The import time log of "python -X importtime" is summarized by:
+
+    python launcher.py --report <log> [top]
+
+This module only depends on the standard library so that it can be
+shipped with a sealed app and executed by the target interpreter.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+from __future__ import print_function
+import os
+from os.path import isdir, join
+import sys
+import marshal
+
+# first line: python version, then one path per line
+LAUNCH_CONFIG_NAME = "pysealer_launch.txt"
+APP_PATH_MARK = "{APP_PATH}"
+
+
+def python_version():
+    """The version of the running interpreter as a string."""
+    return ".".join(map(str, sys.version_info[:3]))
+
+
+def pyc_header_size():
+    """The size of the .pyc header of the running interpreter."""
+    if sys.version_info >= (3, 7):
+        return 16
+    elif sys.version_info >= (3, 3):
+        return 12
+    return 8
+
+
+def freeze(app_path):
+    """Record the module search path of the running interpreter.
+
+    Paths in the app folder are recorded relative to it, so that the
+    installed app can be moved.
+    """
+    app_path = os.path.abspath(app_path)
+    # the first entry is the folder of this script
+    frozen_path = []
+    for path in sys.path[1:]:
+        path = os.path.abspath(path) if path else os.getcwd()
+        if path == app_path or path.startswith(app_path+os.sep):
+            path = APP_PATH_MARK+path[len(app_path):]
+        if path not in frozen_path:
+            frozen_path.append(path)
+
+    with open(join(app_path, LAUNCH_CONFIG_NAME), mode="w") as f:
+        f.write("\n".join([python_version()]+frozen_path)+"\n")
+
+    print ("[MESSAGE] %d module search paths are frozen at %s"
+           % (len(frozen_path), join(app_path, LAUNCH_CONFIG_NAME)))
+
+
+def load_path(app_path):
+    """Get the frozen module search path of an installed app."""
+    with open(join(app_path, LAUNCH_CONFIG_NAME), mode="r") as f:
+        lines = f.read().splitlines()
+    if lines[0] != python_version():
+        raise RuntimeError("The module search path is frozen by python "
+                           "%s, run the build script again." % (lines[0]))
+    return [app_path+path[len(APP_PATH_MARK):]
+            if path.startswith(APP_PATH_MARK) else path
+            for path in lines[1:] if path]
+
+
+def run(app_path, script_path, archive=False):
+    """Run a compiled script with the frozen module search path.
+
+    The script is executed as __main__ without runpy, which imports a
+    number of modules that the app may not need.
+
+    Parameters
+    ----------
+    app_path : string
+        the installed app.
+    script_path : string
+        the compiled script, relative to the app or absolute.
+    archive : bool
+        load the app modules from the module archive of the app.
+    """
+    app_path = os.path.abspath(app_path)
+    script_path = os.path.abspath(join(app_path, script_path))
+    src_path = join(app_path, "src")
+
+    # the same order as PYTHONPATH=${SRC_PATH} python script.pyc
+    sys.path[:] = [os.path.dirname(script_path), src_path] + \
+        load_path(app_path)
+
+    if archive:
+        sys.path.insert(0, app_path)
+        try:
+            import pysealer_archive
+        finally:
+            del sys.path[0]
+        if not isdir(src_path):
+            src_path = os.path.dirname(script_path)
+        pysealer_archive.install(
+            join(app_path, "modules.pysa"), src_path,
+            pysealer_archive.script_prefixes(src_path, script_path))
+
+    with open(script_path, mode="rb") as f:
+        code = marshal.loads(f.read()[pyc_header_size():])
+
+    main_module = type(sys)("__main__")
+    main_module.__file__ = script_path
+    main_module.__builtins__ = sys.modules["__main__"].__builtins__
+    sys.modules["__main__"] = main_module
+    sys.argv[0] = script_path
+    exec(code, main_module.__dict__)
+
+
+def importtime_report(log_path, top=20):
+    """Summarize an import time log of python -X importtime.
+
+    Returns
+    -------
+    A dictionary of the total import time in microseconds and the slowest
+    modules by their self time and cumulative time.
+    """
+    modules = []
+    with open(log_path, mode="r") as f:
+        for line in f:
+            if not line.startswith("import time:"):
+                continue
+            fields = line[len("import time:"):].split("|")
+            if len(fields) != 3 or not fields[0].strip().isdigit():
+                continue
+            modules.append({"module": fields[2].strip(),
+                            "self_us": int(fields[0]),
+                            "cumulative_us": int(fields[1]),
+                            # top-level imports are not indented
+                            "level": (len(fields[2].rstrip()) -
+                                      len(fields[2].strip())-1)//2})
+
+    return {"modules": len(modules),
+            "total_us": sum(module["cumulative_us"] for module in modules
+                            if module["level"] == 0),
+            "self": sorted(modules, key=lambda module: -module["self_us"])
+            [:top],
+            "cumulative": sorted(
+                modules, key=lambda module: -module["cumulative_us"])[:top]}
+
+
+def main():
+    """Entry of the launcher in the target interpreter."""
+    if sys.argv[1] == "--freeze":
+        freeze(sys.argv[2])
+    elif sys.argv[1] == "--report":
+        report = importtime_report(
+            sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 20)
+        print ("[MESSAGE] %d modules are imported in %.1f ms"
+               % (report["modules"], report["total_us"]/1000.))
+        for module in report["cumulative"]:
+            print ("%10.1f ms %10.1f ms  %s"
+                   % (module["cumulative_us"]/1000.,
+                      module["self_us"]/1000., module["module"]))
+    else:
+        archive = sys.argv[1] == "--archive"
+        if archive:
+            del sys.argv[1]
+        app_path, script_path = sys.argv[1:3]
+        sys.argv = sys.argv[2:]
+        run(app_path, script_path, archive)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Build manifest for incremental rebuilds.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+from __future__ import print_function
+import os
+from os.path import isfile, join
+import json
+import hashlib
+import threading
+
+MANIFEST_NAME = ".pysealer_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def file_hash(file_path, block_size=1 << 20, algorithm="sha1"):
+    """Compute the hash of a file.
+
+    Parameters
+    ----------
+    file_path : string
+        the file to hash.
+    block_size : int
+        the number of bytes read at a time.
+    algorithm : string
+        a hash algorithm supported by hashlib.
+
+    Returns
+    -------
+    The hex digest of the file content.
+    """
+    sha = hashlib.new(algorithm)
+    with open(file_path, mode="rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class BuildManifest(object):
+    """Record of the files and environment behind a build folder.
+
+    Every file is stored as its relative path with size, mtime and
+    content hash. A file is only hashed again when its size or mtime
+    differs from the recorded one.
+    """
+
+    def __init__(self, manifest_path):
+        """Init a manifest, load the saved one if it exists."""
+        self.manifest_path = manifest_path
+        self.env = {}
+        self.files = {}
+        # stages that run concurrently save the same manifest
+        self.lock = threading.Lock()
+
+        if isfile(self.manifest_path):
+            try:
+                with open(self.manifest_path, mode="r") as f:
+                    manifest_dict = json.load(f)
+            except ValueError:
+                print ("[MESSAGE] The manifest at %s is corrupted, "
+                       "ignored." % (self.manifest_path))
+                return
+            if manifest_dict.get("version") == MANIFEST_VERSION:
+                self.env = manifest_dict.get("env", {})
+                self.files = manifest_dict.get("files", {})
+
+    def save(self):
+        """Write the manifest to disk."""
+        tmp_path = self.manifest_path+".tmp"
+        with self.lock:
+            with open(tmp_path, mode="w") as f:
+                json.dump({"version": MANIFEST_VERSION,
+                           "env": self.env,
+                           "files": self.files}, f, indent=1, sort_keys=True)
+            os.rename(tmp_path, self.manifest_path)
+
+    def stat_entry(self, root, rel_path, inventory=None):
+        """Get the manifest entry of a file.
+
+        Parameters
+        ----------
+        root : string
+            the root folder of the tracked tree.
+        rel_path : string
+            the file path relative to root.
+        inventory : inventory.Inventory
+            the inventory of root, the file is not stat'ed and its hash is
+            shared with the inventory.
+
+        Returns
+        -------
+        A dictionary of size, mtime and hash.
+        """
+        if inventory is not None:
+            size, mtime = inventory.stat(rel_path)
+        else:
+            st = os.stat(join(root, rel_path))
+            size, mtime = st.st_size, st.st_mtime
+        old_entry = self.files.get(rel_path)
+        if old_entry is not None and old_entry["size"] == size \
+                and old_entry["mtime"] == mtime:
+            file_sha = old_entry["hash"]
+        elif inventory is not None:
+            file_sha = inventory.file_hash(rel_path)
+        else:
+            file_sha = file_hash(join(root, rel_path))
+        return {"size": size, "mtime": mtime, "hash": file_sha}
+
+    def diff(self, root, rel_paths, inventory=None):
+        """Compare a list of files against the manifest.
+
+        The manifest is not modified, assign new_files to files and save
+        the manifest to commit the result.
+
+        Parameters
+        ----------
+        root : string
+            the root folder of the tracked tree.
+        rel_paths : list
+            the file paths relative to root.
+        inventory : inventory.Inventory
+            the inventory of root, see stat_entry().
+
+        Returns
+        -------
+        new_files : dict
+            manifest entries of the current files.
+        changed : list
+            files that are added or have different content.
+        removed : list
+            files that are recorded but no longer exist.
+        unchanged : list
+            files that have the same content as recorded.
+        """
+        new_files = {}
+        changed = []
+        unchanged = []
+        for rel_path in rel_paths:
+            entry = self.stat_entry(root, rel_path, inventory)
+            new_files[rel_path] = entry
+            old_entry = self.files.get(rel_path)
+            if old_entry is not None and old_entry["hash"] == entry["hash"]:
+                unchanged.append(rel_path)
+            else:
+                changed.append(rel_path)
+        removed = sorted(set(self.files)-set(new_files))
+
+        return new_files, sorted(changed), removed, sorted(unchanged)
@@ -0,0 +1,196 @@
+"""Sealing of one app for several targets in one run.
+
+A target is named <platform>-<arch>-py<version>, e.g., linux-64-py3. The
+app is built once per python version, since the compiled sources only
+depend on the bytecode format of the host interpreter, and every target
+is sealed from the shared build into its own output folder:
+
+    app_path/pysealer_build/py<version>        shared build
+    app_path/pysealer_build/dist/<target>      sealed app and installer
+
+The environments of the python versions are configured concurrently.
+A python version compiles once its environment is configured, since
+conda may replace the interpreter. The compiled files are written next
+to the sources, so the python versions compile one after another.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+from __future__ import print_function
+import os
+from os.path import isfile, join
+import json
+
+from pysealer import sealer
+from pysealer import pipeline
+from pysealer import instrument
+
+
+def parse_target(target):
+    """Parse a target name.
+
+    Returns
+    -------
+    A dictionary of the platform, arch and python version.
+    """
+    try:
+        platform, arch, pyver = target.split("-")
+        spec = {"platform": platform, "arch": int(arch),
+                "pyver": int(pyver[2:])}
+        if not pyver.startswith("py") or \
+                platform not in ["osx", "windows", "linux"] or \
+                spec["arch"] not in [32, 64] or spec["pyver"] not in [2, 3]:
+            raise ValueError
+        return spec
+    except ValueError:
+        raise ValueError("The target %s is not supported, use "
+                         "<platform>-<arch>-py<version>." % (target))
+
+
+def folder_size(path):
+    """The total size of the files in a folder."""
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for file_name in files:
+            total += os.lstat(join(root, file_name)).st_size
+    return total
+
+
+def seal_matrix(app_path, targets, host_platform="osx", host_arch=64,
+                workers=None, installer_mode="native", makeself=None,
+                codec="gzip", tracer=None, sealer_args=None,
+                seal_args=None):
+    """Seal an app for several targets.
+
+    Parameters
+    ----------
+    app_path : string
+        the app root.
+    targets : list
+        target names, see parse_target().
+    host_platform : string
+        the platform of this machine.
+    host_arch : int
+        the architecture of this machine.
+    workers : int
+        the maximum number of concurrent stages, no limit if None.
+    installer_mode : string
+        "native", "makeself" or "none", see Sealer.run().
+    makeself : string
+        the makeself script, see Sealer.makeself().
+    codec : string
+        the codec of the native installer.
+    tracer : instrument.Tracer
+        the tracer that all sealers report to.
+    sealer_args : dict
+        other keyword arguments of Sealer, e.g., env_cache.
+    seal_args : dict
+        keyword arguments of Sealer.seal_app().
+
+    Returns
+    -------
+    A summary of the targets with the time of their shared build, the
+    time of sealing and building the installer, and the size of their
+    sealed app and installer, also saved at
+    pysealer_build/dist/matrix.json.
+    """
+    if installer_mode not in ["native", "makeself", "none"]:
+        raise ValueError("The installer mode %s is not supported."
+                         % (installer_mode))
+    if tracer is None:
+        tracer = instrument.Tracer()
+    sealer_args = dict(sealer_args or {})
+    seal_args = dict(seal_args or {})
+
+    target_specs = dict((target, parse_target(target)) for target in targets)
+    pyvers = sorted(set(spec["pyver"] for spec in target_specs.values()))
+    dist_path = join(app_path, "pysealer_build", "dist")
+
+    def make_sealer(target):
+        spec = target_specs[target]
+        return sealer.Sealer(
+            app_path, host_platform=host_platform,
+            target_platform=spec["platform"], pyver=spec["pyver"],
+            host_arch=host_arch, target_arch=spec["arch"], tracer=tracer,
+            build_path=join(app_path, "pysealer_build",
+                            "py%d" % (spec["pyver"])),
+            output_path=join(dist_path, target), **sealer_args)
+
+    # the first target of a python version builds for all of them
+    builders = {}
+    for target in targets:
+        pyver = target_specs[target]["pyver"]
+        if pyver not in builders:
+            builders[pyver] = make_sealer(target)
+
+    app_names = {}
+
+    def seal(target):
+        spec = target_specs[target]
+        target_sealer = builders[spec["pyver"]].for_target(
+            spec["platform"], spec["arch"], join(dist_path, target))
+        target_sealer.seal_app(**seal_args)
+        app_names[target] = target_sealer.app_name
+        if installer_mode == "native":
+            target_sealer.build_installer(codec=codec)
+        elif installer_mode == "makeself":
+            target_sealer.makeself(makeself)
+
+    tasks = []
+    previous_prepare = []
+    for pyver in pyvers:
+        builder = builders[pyver]
+        tasks += [
+            pipeline.Task("init_build_py%d" % (pyver), builder.init_build),
+            pipeline.Task("config_environment_py%d" % (pyver),
+                          builder.config_environment,
+                          ["init_build_py%d" % (pyver)]),
+            pipeline.Task("compile_app_py%d" % (pyver), builder.compile_app,
+                          ["config_environment_py%d" % (pyver)] +
+                          previous_prepare),
+            pipeline.Task("prepare_app_py%d" % (pyver), builder.prepare_app,
+                          ["compile_app_py%d" % (pyver)])]
+        previous_prepare = ["prepare_app_py%d" % (pyver)]
+    for target in targets:
+        pyver = target_specs[target]["pyver"]
+        tasks.append(pipeline.Task(
+            target, lambda target=target: seal(target),
+            ["config_environment_py%d" % (pyver),
+             "prepare_app_py%d" % (pyver)]))
+
+    tracer.reset()
+    with tracer.span("matrix", targets=list(targets)):
+        durations = pipeline.run_tasks(tasks, workers=workers,
+                                       on_cancel=tracer.cancel)
+
+    summary = {}
+    for target in targets:
+        pyver = target_specs[target]["pyver"]
+        output_path = join(dist_path, target)
+        installer_path = join(output_path, app_names[target]+".run")
+        summary[target] = {
+            "build_time": sum(durations.get(
+                "%s_py%d" % (stage, pyver), 0.) for stage in
+                ["init_build", "config_environment", "compile_app",
+                 "prepare_app"]),
+            "seal_time": durations[target],
+            "output_path": output_path,
+            "app_size": folder_size(join(output_path, app_names[target])),
+            "installer_size": os.path.getsize(installer_path)
+            if isfile(installer_path) else None}
+
+    with open(join(dist_path, "matrix.json"), mode="w") as f:
+        json.dump(summary, f, indent=1, sort_keys=True)
+    for target in targets:
+        tracer.message("%s: build %.2fs (shared by py%d targets), seal "
+                       "%.2fs, app %d bytes, installer %s bytes"
+                       % (target, summary[target]["build_time"],
+                          target_specs[target]["pyver"],
+                          summary[target]["seal_time"],
+                          summary[target]["app_size"],
+                          summary[target]["installer_size"]))
+    tracer.message("The matrix summary is at %s"
+                   % (join(dist_path, "matrix.json")))
+
+    return summary
@@ -0,0 +1,166 @@
+"""Gitignore-style filtering of the app files.
+
+The rules are read from the ignore list in .pysealer_config.yml and the
+.pysealerignore file of the app, after DEFAULT_RULES:
+
+    # a comment
+    data/            a folder named data at any depth
+    /notebooks       notebooks at the app root only
+    *.ipynb          a file name pattern at any depth
+    docs/**/*.png    "**" matches any number of folders
+    !docs/logo.png   re-include a file that an earlier rule excludes
+
+The last matching rule decides. An excluded folder is not walked, so its
+files can't be re-included. All rules are compiled into one regular
+expression per entry type.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+from __future__ import print_function
+import os
+from os.path import isfile
+import re
+
+from pysealer import inventory
+
+IGNORE_NAME = ".pysealerignore"
+
+DEFAULT_RULES = [".git/", ".hg/", ".svn/", ".tox/", ".venv/", "venv/",
+                 "node_modules/", ".ipynb_checkpoints/",
+                 "*.egg-info/", ".DS_Store", "*.swp"]
+
+
+def read_rules(file_path):
+    """Read the rules of an ignore file, an empty list if it's missing."""
+    if not isfile(file_path):
+        return []
+    with open(file_path, mode="r") as f:
+        return [line.rstrip("\n") for line in f]
+
+
+def translate(pattern):
+    """Translate a rule pattern to a regular expression.
+
+    Parameters
+    ----------
+    pattern : string
+        the pattern without "!" and the trailing "/".
+
+    Returns
+    -------
+    A regular expression that matches a whole relative path.
+    """
+    # a pattern with a slash is relative to the app root
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+            continue
+        elif pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+            continue
+        elif char == "*":
+            regex += "[^/]*"
+        elif char == "?":
+            regex += "[^/]"
+        elif char == "[" and "]" in pattern[i+2:]:
+            end = pattern.index("]", i+2)
+            chars = pattern[i+1:end]
+            if chars.startswith("!"):
+                chars = "^"+chars[1:]
+            regex += "["+chars.replace("\\", "\\\\")+"]"
+            i = end
+        elif char == "\\" and i+1 < len(pattern):
+            i += 1
+            regex += re.escape(pattern[i])
+        else:
+            regex += re.escape(char)
+        i += 1
+
+    return ("" if anchored else "(?:.*/)?")+regex
+
+
+class PathFilter(object):
+    """A compiled list of ignore rules."""
+
+    def __init__(self, rules):
+        """Compile the rules.
+
+        Parameters
+        ----------
+        rules : list
+            rule lines in their order, see the module docstring.
+        """
+        self.rules = []
+        for line in rules:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            self.rules.append((translate(line), negate, dir_only))
+
+        # the alternatives are in reversed order, so the first match is
+        # the last matching rule
+        self.dir_regex, self.dir_negate = self.compile(self.rules)
+        self.file_regex, self.file_negate = self.compile(
+            [rule for rule in self.rules if not rule[2]])
+
+    @staticmethod
+    def compile(rules):
+        """Combine rules into one regular expression, None if empty."""
+        if not rules:
+            return None, []
+        regex = re.compile("|".join("(%s)\\Z" % (rule[0])
+                                    for rule in reversed(rules)))
+        return regex, [rule[1] for rule in reversed(rules)]
+
+    def excluded(self, rel_path, is_dir=False):
+        """Check if a path is excluded.
+
+        Parameters
+        ----------
+        rel_path : string
+            the path relative to the app root, separated by "/".
+        is_dir : bool
+            the path is a folder.
+        """
+        regex, negate = (self.dir_regex, self.dir_negate) if is_dir else \
+            (self.file_regex, self.file_negate)
+        if regex is None:
+            return False
+        match = regex.match(rel_path)
+        return match is not None and not negate[match.lastindex-1]
+
+    def walk(self, root):
+        """List the files under a folder that are not excluded.
+
+        Excluded folders are pruned without walking into them. Linked
+        folders are listed like files and are not walked. See
+        inventory.walk_entries().
+
+        Parameters
+        ----------
+        root : string
+            the app root.
+
+        Returns
+        -------
+        A sorted list of paths relative to root, separated by os.sep.
+        """
+        return sorted(rel_path.replace("/", os.sep) for rel_path, _ in
+                      inventory.walk_entries(root, path_filter=self))
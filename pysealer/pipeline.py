@@ -0,0 +1,183 @@
+"""Concurrent scheduler of dependent tasks.
+
+Tasks form a directed acyclic graph by their dependencies. A task starts
+as soon as all its dependencies are done, at most `workers` tasks run at
+a time. When a task fails no new task is started, the running tasks are
+asked to stop and the first error is raised once they have finished.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+from __future__ import print_function
+import time
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class Task(object):
+    """A named unit of work with the names of its dependencies."""
+
+    def __init__(self, name, func, deps=()):
+        """Init a task.
+
+        Parameters
+        ----------
+        name : string
+            the unique name of the task.
+        func : callable
+            the work, called without arguments.
+        deps : list
+            the names of the tasks that have to finish first.
+        """
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+
+
+def check_tasks(tasks):
+    """Check that the dependencies of tasks exist and have no cycle.
+
+    Returns
+    -------
+    The task names in a topological order.
+    """
+    task_dict = dict((task.name, task) for task in tasks)
+    if len(task_dict) != len(tasks):
+        raise ValueError("The task names are not unique.")
+    for task in tasks:
+        for dep in task.deps:
+            if dep not in task_dict:
+                raise ValueError("The dependency %s of task %s is not "
+                                 "a task." % (dep, task.name))
+
+    order = []
+    done = set()
+    while len(order) < len(tasks):
+        ready = [task.name for task in tasks if task.name not in done and
+                 all(dep in done for dep in task.deps)]
+        if not ready:
+            raise ValueError("The tasks have a cyclic dependency.")
+        order += ready
+        done.update(ready)
+
+    return order
+
+
+def critical_path(tasks, durations):
+    """Find the longest chain of dependent tasks by their durations.
+
+    Returns
+    -------
+    length : float
+        the sum of the durations on the path.
+    path : list
+        the task names on the path.
+    """
+    task_dict = dict((task.name, task) for task in tasks)
+    finish = {}
+    previous = {}
+    for name in check_tasks(tasks):
+        deps = task_dict[name].deps
+        previous[name] = max(deps, key=lambda dep: finish[dep]) \
+            if deps else None
+        finish[name] = durations.get(name, 0.) + \
+            (finish[previous[name]] if deps else 0.)
+
+    if not finish:
+        return 0., []
+    name = max(finish, key=lambda name: finish[name])
+    length = finish[name]
+    path = []
+    while name is not None:
+        path.insert(0, name)
+        name = previous[name]
+    return length, path
+
+
+def run_tasks(tasks, workers=None, on_cancel=None):
+    """Run tasks concurrently in dependency order.
+
+    Parameters
+    ----------
+    tasks : list
+        Task objects, earlier tasks start first when several are ready.
+    workers : int
+        the maximum number of running tasks, no limit if None.
+    on_cancel : callable
+        called once when a task fails or the run is interrupted, to stop
+        the running tasks, e.g., Tracer.cancel.
+
+    Returns
+    -------
+    A dictionary of task name to its duration in seconds.
+    """
+    check_tasks(tasks)
+    if workers is None:
+        workers = len(tasks)
+    if workers < 1:
+        raise ValueError("The number of workers %d is not supported."
+                         % (workers))
+
+    pending = list(tasks)
+    running = {}
+    done = set()
+    durations = {}
+    errors = []
+    results = queue.Queue()
+
+    def work(task):
+        start_time = time.time()
+        try:
+            task.func()
+        except BaseException as e:
+            results.put((task.name, e, time.time()-start_time))
+        else:
+            results.put((task.name, None, time.time()-start_time))
+
+    def cancel():
+        if on_cancel is not None:
+            on_cancel()
+
+    while pending or running:
+        if not errors:
+            for task in list(pending):
+                if len(running) >= workers:
+                    break
+                if all(dep in done for dep in task.deps):
+                    pending.remove(task)
+                    running[task.name] = threading.Thread(
+                        target=work, args=(task,))
+                    running[task.name].start()
+        if not running:
+            break
+
+        try:
+            # a timeout keeps the main thread interruptible in python 2
+            name, error, duration = results.get(timeout=1.)
+        except queue.Empty:
+            continue
+        except BaseException as e:
+            # interrupted, wait for the running tasks to stop
+            if not errors:
+                cancel()
+            errors.append(e)
+            continue
+
+        running.pop(name).join()
+        durations[name] = duration
+        if error is None:
+            done.add(name)
+        else:
+            if not errors:
+                cancel()
+            errors.append(error)
+
+    if errors:
+        raise errors[0]
+
+    return durations
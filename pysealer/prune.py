@@ -0,0 +1,193 @@
+"""Pruning of build environments with a footprint report.
+
+Files are matched by shell patterns on their path relative to the
+environment, "*" also matches "/". Every file is accounted to the conda
+package that installed it and to the first prune category it matches.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+from __future__ import print_function
+import os
+from os.path import isdir, islink, join
+import json
+import fnmatch
+
+try:
+    import subprocess32 as sp
+except ImportError:
+    import subprocess as sp
+
+# category: shell patterns
+DEFAULT_RULES = {
+    "pkgs": ["pkgs/*"],
+    "tests": ["*/site-packages/*/tests/*", "*/site-packages/*/test/*",
+              "lib/python*/test/*"],
+    "docs": ["share/doc/*", "share/man/*", "share/info/*",
+             "share/gtk-doc/*"],
+    "headers": ["include/*"],
+    "static_libs": ["*.a"],
+    "pycache_dups": ["*/__pycache__/*.opt-1.pyc",
+                     "*/__pycache__/*.opt-2.pyc", "*.pyo"],
+    "conda_build": ["conda-build:*"],
+}
+
+UNTRACKED = "<untracked>"
+
+
+def package_map(prefix):
+    """Map the files of an environment to the conda packages.
+
+    Returns
+    -------
+    A dictionary of relative file path to package name.
+    """
+    file_map = {}
+    conda_meta = join(prefix, "conda-meta")
+    if not isdir(conda_meta):
+        return file_map
+
+    for entry in os.listdir(conda_meta):
+        if not entry.endswith(".json"):
+            continue
+        with open(join(conda_meta, entry), mode="r") as f:
+            pkg_meta = json.load(f)
+        for file_path in pkg_meta.get("files", []):
+            file_map[file_path] = pkg_meta["name"]
+        file_map["conda-meta/"+entry] = pkg_meta["name"]
+
+    return file_map
+
+
+def match_category(rel_path, package, rules):
+    """Get the first prune category of a file, None if it's kept.
+
+    A pattern "<package>:*" matches all files of a conda package.
+    """
+    for category in sorted(rules):
+        for pattern in rules[category]:
+            if ":" in pattern:
+                pkg_pattern, file_pattern = pattern.split(":", 1)
+                if fnmatch.fnmatchcase(package, pkg_pattern) and \
+                        fnmatch.fnmatchcase(rel_path, file_pattern):
+                    return category
+            elif fnmatch.fnmatchcase(rel_path, pattern):
+                return category
+    return None
+
+
+def find_strip():
+    """Find the strip command, None if it's not available."""
+    for path in os.environ.get("PATH", "").split(os.pathsep):
+        if os.access(join(path, "strip"), os.X_OK):
+            return join(path, "strip")
+    return None
+
+
+def strip_file(strip_bin, file_path):
+    """Strip the symbols of a shared library.
+
+    The stripped file replaces the original by a rename, so hard links of
+    the original (e.g., in the environment cache) are not modified.
+
+    Returns
+    -------
+    The number of bytes saved.
+    """
+    tmp_path = file_path+".strip"
+    strip_args = ["-x"] if os.uname()[0] == "Darwin" \
+        else ["--strip-unneeded"]
+    with open(os.devnull, "w") as devnull:
+        ret = sp.call([strip_bin]+strip_args+["-o", tmp_path, file_path],
+                      stdout=devnull, stderr=devnull)
+    if ret != 0 or not os.path.isfile(tmp_path):
+        if os.path.isfile(tmp_path):
+            os.remove(tmp_path)
+        return 0
+
+    saved = os.path.getsize(file_path)-os.path.getsize(tmp_path)
+    if saved <= 0:
+        os.remove(tmp_path)
+        return 0
+    os.chmod(tmp_path, os.stat(file_path).st_mode)
+    os.rename(tmp_path, file_path)
+    return saved
+
+
+def prune(prefix, rules=None, strip=False, dry_run=False):
+    """Prune an environment and report its footprint.
+
+    Parameters
+    ----------
+    prefix : string
+        the environment to prune.
+    rules : dict
+        prune categories to lists of patterns, DEFAULT_RULES if None.
+    strip : bool
+        strip the symbols of extension modules and shared libraries.
+    dry_run : bool
+        only report the footprint, nothing is removed.
+
+    Returns
+    -------
+    The footprint report as a dictionary with the bytes and file counts
+    per package and per category, before and after pruning.
+    """
+    if rules is None:
+        rules = DEFAULT_RULES
+    file_map = package_map(prefix)
+    strip_bin = find_strip() if strip and not dry_run else None
+
+    report = {"packages": {}, "categories": {},
+              "total": {"files": 0, "bytes": 0,
+                        "removed_files": 0, "removed_bytes": 0,
+                        "stripped_bytes": 0}}
+
+    def account(group, name, size, removed):
+        entry = report[group].setdefault(
+            name, {"files": 0, "bytes": 0,
+                   "removed_files": 0, "removed_bytes": 0})
+        entry["files"] += 1
+        entry["bytes"] += size
+        if removed:
+            entry["removed_files"] += 1
+            entry["removed_bytes"] += size
+
+    pruned_dirs = set()
+    for root, dirs, files in os.walk(prefix):
+        for file_name in files:
+            file_path = join(root, file_name)
+            rel_path = os.path.relpath(file_path, prefix).replace(
+                os.sep, "/")
+            size = os.lstat(file_path).st_size
+            package = file_map.get(rel_path, UNTRACKED)
+            category = match_category(rel_path, package, rules)
+
+            account("packages", package, size, category is not None)
+            account("categories", category or "kept", size,
+                    category is not None)
+            report["total"]["files"] += 1
+            report["total"]["bytes"] += size
+
+            if category is not None:
+                report["total"]["removed_files"] += 1
+                report["total"]["removed_bytes"] += size
+                if not dry_run:
+                    os.remove(file_path)
+                    pruned_dirs.add(root)
+            elif strip_bin is not None and not islink(file_path) and \
+                    (file_name.endswith((".so", ".dylib")) or
+                     ".so." in file_name):
+                report["total"]["stripped_bytes"] += \
+                    strip_file(strip_bin, file_path)
+
+    # remove the folders that become empty by pruning
+    while pruned_dirs:
+        root = max(pruned_dirs, key=len)
+        pruned_dirs.remove(root)
+        if root != prefix and not os.listdir(root):
+            os.rmdir(root)
+            pruned_dirs.add(os.path.dirname(root))
+
+    return report
@@ -0,0 +1,192 @@
+"""Relocation of installed conda environments.
+
+This module only depends on the standard library so that it can be
+shipped with a sealed app and executed by the target interpreter:
+
+    python relocate.py <new_prefix> [workers]
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+from __future__ import print_function
+import os
+from os.path import islink, join
+import sys
+import json
+import shutil
+import multiprocessing
+
+PREFIX_RECORD_NAME = ".pysealer_prefix.json"
+
+
+def find_prefix_files(prefix, exclude_dirs=()):
+    """Find the files that embed the installation prefix.
+
+    Parameters
+    ----------
+    prefix : string
+        the installation path of the environment.
+    exclude_dirs : tuple
+        top-level folders that are not searched.
+
+    Returns
+    -------
+    A dictionary that maps relative file paths to "text" or "binary".
+    """
+    prefix_bytes = prefix.encode("utf-8")
+    prefix_files = {}
+    for root, dirs, files in os.walk(prefix):
+        if root == prefix:
+            dirs[:] = [name for name in dirs if name not in exclude_dirs]
+        for file_name in files:
+            file_path = join(root, file_name)
+            if islink(file_path):
+                continue
+            with open(file_path, mode="rb") as f:
+                content = f.read()
+            if prefix_bytes in content:
+                prefix_files[os.path.relpath(file_path, prefix)] = \
+                    "binary" if b"\x00" in content else "text"
+
+    return prefix_files
+
+
+def replace_prefix(content, old_prefix, new_prefix, mode):
+    """Replace the installation prefix in a file content.
+
+    A binary file keeps its length, each C string that contains the
+    prefix is padded by null bytes after replacement.
+    """
+    if mode == "text":
+        return content.replace(old_prefix, new_prefix)
+
+    padding = len(old_prefix)-len(new_prefix)
+    segments = content.split(b"\x00")
+    for idx, segment in enumerate(segments):
+        count = segment.count(old_prefix)
+        if count:
+            segments[idx] = segment.replace(old_prefix, new_prefix) + \
+                b"\x00"*(padding*count)
+    # the padding is in the null separated segments, join back
+    return b"\x00".join(segments)
+
+
+def relocate_links(prefix, old_prefix):
+    """Point absolute symbolic links into the old prefix to the new one."""
+    for root, dirs, files in os.walk(prefix):
+        for name in dirs+files:
+            link_path = join(root, name)
+            if islink(link_path) and \
+                    os.readlink(link_path).startswith(old_prefix):
+                link_target = prefix+os.readlink(link_path)[len(old_prefix):]
+                os.remove(link_path)
+                os.symlink(link_target, link_path)
+
+
+def relocate_file(args):
+    """Replace the prefix in a file.
+
+    The file is written as a new file and renamed, the old one may be a
+    running executable. A relocated file has no old prefix, so a file is
+    relocated again safely when an install resumes.
+
+    Parameters
+    ----------
+    args : tuple
+        file path, old prefix, new prefix and mode, in one tuple for
+        Pool.map.
+    """
+    file_path, old_prefix, new_prefix, mode = args
+    with open(file_path, mode="rb") as f:
+        content = f.read()
+    if old_prefix not in content:
+        return
+    with open(file_path+".relocate", mode="wb") as f:
+        f.write(replace_prefix(content, old_prefix, new_prefix, mode))
+    shutil.copymode(file_path, file_path+".relocate")
+    os.rename(file_path+".relocate", file_path)
+
+
+def relocate(prefix, workers=1):
+    """Relocate a packed environment in place.
+
+    The environment is described by the record written by
+    write_prefix_record().
+
+    Parameters
+    ----------
+    prefix : string
+        the new installation path of the environment.
+    workers : int
+        the number of relocating processes, use all CPU cores if None.
+
+    Returns
+    -------
+    A list of binary files that can't be relocated because the new prefix
+    is longer than the old one.
+    """
+    prefix = os.path.abspath(prefix)
+    with open(join(prefix, PREFIX_RECORD_NAME), mode="r") as f:
+        prefix_record = json.load(f)
+
+    old_prefix = prefix_record["prefix"].encode("utf-8")
+    new_prefix = prefix.encode("utf-8")
+    skipped = []
+    jobs = []
+    for rel_path, mode in sorted(prefix_record["prefix_files"].items()):
+        if mode == "binary" and len(new_prefix) > len(old_prefix):
+            skipped.append(rel_path)
+            continue
+        jobs.append((join(prefix, rel_path), old_prefix, new_prefix, mode))
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if workers > 1 and len(jobs) > 1:
+        pool = multiprocessing.Pool(min(workers, len(jobs)))
+        try:
+            pool.map(relocate_file, jobs,
+                     max(1, len(jobs)//(workers*4)))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for job in jobs:
+            relocate_file(job)
+
+    relocate_links(prefix, prefix_record["prefix"])
+
+    return skipped
+
+
+def write_prefix_record(prefix, copy_path, exclude_dirs=()):
+    """Record the prefix files of an environment for relocate().
+
+    Parameters
+    ----------
+    prefix : string
+        the installation path of the environment.
+    copy_path : string
+        a copy of the environment that is relocated later.
+    exclude_dirs : tuple
+        top-level folders that are not searched.
+    """
+    prefix = os.path.abspath(prefix)
+    with open(join(copy_path, PREFIX_RECORD_NAME), mode="w") as f:
+        json.dump({"prefix": prefix,
+                   "prefix_files": find_prefix_files(prefix, exclude_dirs)},
+                  f)
+
+
+def main():
+    """Entry of the relocation at target."""
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    skipped = relocate(sys.argv[1], workers=workers)
+    for rel_path in skipped:
+        print ("[MESSAGE] %s can't be relocated to a longer prefix."
+               % (rel_path))
+    print ("[MESSAGE] The environment is relocated to %s" % (sys.argv[1]))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,16 +7,44 @@ Email : duguyue100@gmail.com
 from __future__ import print_function
 import os
 from os.path import isdir, isfile, join
+import re
+import copy
+import json
+import shlex
+import time
+import hashlib
 import datetime
 import shutil
+import tempfile
 import yaml
 
+import pysealer
 from pysealer import utils
-
-try:
-    import subprocess32 as sp
-except ImportError:
-    import subprocess as sp
+from pysealer import manifest
+from pysealer import compiler
+from pysealer import envcache
+from pysealer import relocate
+from pysealer import staging
+from pysealer import archive
+from pysealer import installer
+from pysealer import depgraph
+from pysealer import prune
+from pysealer import launcher
+from pysealer import zygote
+from pysealer import instrument
+from pysealer import pipeline
+from pysealer import delta
+from pysealer import store
+from pysealer import pathfilter
+from pysealer import inventory
+from pysealer import buildcache
+from pysealer import verify
+from pysealer import __about__
+from pysealer.instrument import traced
+
+# the helper scripts that the build script compiles for the app scripts
+HELPERS = ["pysealer_archive.py", "pysealer_launcher.py",
+           "pysealer_zygote.py"]
 
 
 class Sealer():
@@ -24,8 +52,33 @@ class Sealer():
 
     def __init__(self, app_path, host_platform="osx",
                  target_platform="osx", pyver=2,
-                 host_arch=64, target_arch=64):
-        """Init a Sealer class."""
+                 host_arch=64, target_arch=64, incremental=False,
+                 conda_url=None, env_cache=False, stage_mode="auto",
+                 tracer=None, build_path=None, output_path=None,
+                 artifact_store=False, reproducible=False,
+                 conda_sha256=None):
+        """Init a Sealer class.
+
+        The build folder is app_path/pysealer_build and the sealed app
+        and installer are written to app_path, unless build_path and
+        output_path are given. Sealers of different targets share a build
+        folder when they have the same host and python version.
+
+        In reproducible mode the compiled files, scripts and installer of
+        the same inputs are identical byte for byte, time stamps are taken
+        from SOURCE_DATE_EPOCH (or 0). A packed environment embeds the
+        absolute path of the build folder, so with env_mode="pack" the
+        build path is an input as well, see pack_environment().
+
+        The miniconda installers are verified against conda_sha256, a
+        dictionary of <platform>-<arch>-py<version> to the expected SHA-256
+        checksum, or the conda_sha256 section of .pysealer_config.yml if
+        None. Installers without an expected checksum are only checked
+        against the checksum recorded at their first download.
+        """
+        # Stages, subprocesses and counters are reported to the tracer
+        self.tracer = tracer if tracer is not None else instrument.Tracer()
+
         # App's Core Path
         if isdir(app_path):
             self.app_path = app_path
@@ -70,46 +123,418 @@ class Sealer():
         self.config_path = join(self.app_path, ".pysealer_config.yml")
 
         # General path configuration
-        self.build_path = join(self.app_path, "pysealer_build")
+        self.build_path = build_path if build_path is not None else \
+            join(self.app_path, "pysealer_build")
+        self.output_path = output_path if output_path is not None else \
+            self.app_path
         self.build_src = join(self.build_path, "src")
         self.build_conda = join(self.build_path, "miniconda")
         self.build_bin = join(self.build_conda, "bin")
+        self.build_conda_bin = join(self.build_bin, "conda")
+        self.build_pip = join(self.build_bin, "pip")
 
-        # init the right miniconda for the host and target python
-        self.host_downurl, self.host_conda = utils.get_conda(
+        # Incremental build keeps the build folder and a manifest of it
+        self.incremental = incremental
+        self.manifest_path = join(self.build_path, manifest.MANIFEST_NAME)
+        self.env_reused = False
+        self.pkgs_pruned = False
+        self.app_diff = None
+        self.app_files = None
+
+        # The app is walked once per build, the inventory of the files is
+        # saved for the next build
+        self.inventory_path = join(self.build_path, inventory.INVENTORY_NAME)
+        self.inventory = None
+        self.last_inventory = None
+
+        # Configured environments are shared by a cache under ~/.pysealer
+        self.env_cache = env_cache
+
+        # Installers, packages, wheels and bytecode are shared by a
+        # content-addressed store under ~/.pysealer
+        self.artifact_store = store.ArtifactStore() if artifact_store \
+            else None
+
+        # Outputs don't depend on the time and location of the build
+        self.reproducible = reproducible
+
+        # Files are staged by reflinks or hard links where possible
+        if stage_mode in staging.STAGE_MODES:
+            self.stage_mode = stage_mode
+        else:
+            raise ValueError("The staging mode %s is not supported."
+                             % (stage_mode))
+        self.stage_stats = staging.StageStats(tracer=self.tracer)
+
+        # init the right miniconda for the host and target python,
+        # the installers are only downloaded when a stage needs them.
+        self.conda_url = conda_url
+        self.host_downurl, _ = utils.get_conda_url(
             platform=self.host_platform, pyver=self.pyver,
-            arch=self.host_arch)
-        print ("[MESSAGE] Host conda environment is downloaded.")
-
-        self.target_downurl, self.target_conda = utils.get_conda(
+            arch=self.host_arch, base_url=self.conda_url)
+        self.target_downurl, _ = utils.get_conda_url(
             platform=self.target_platform, pyver=self.pyver,
-            arch=self.target_arch)
-        print ("[MESSAGE] Target conda environment is downloaded.")
+            arch=self.target_arch, base_url=self.conda_url)
+        self.conda_sha256 = conda_sha256
+        self._host_conda = None
+        self._target_conda = None
+
+    def for_target(self, target_platform, target_arch, output_path=None):
+        """Get a sealer of another target that shares this build.
+
+        The build state, e.g., the compiled interpreter and if the package
+        cache is pruned, is kept, so the new sealer only seals the app.
+
+        Parameters
+        ----------
+        target_platform : string
+            "osx", "linux", or "windows".
+        target_arch : int
+            32 or 64.
+        output_path : string
+            the folder of the sealed app and installer, the output path
+            of this sealer if None.
+        """
+        if target_platform not in ["osx", "windows", "linux"]:
+            raise ValueError("The target platform %s is "
+                             "not supported." % (target_platform))
+        if target_arch not in [32, 64]:
+            raise ValueError("The architecture %d is not supported"
+                             % (target_arch))
+
+        target_sealer = copy.copy(self)
+        target_sealer.target_platform = target_platform
+        target_sealer.target_arch = target_arch
+        if output_path is not None:
+            target_sealer.output_path = output_path
+        target_sealer.target_downurl, _ = utils.get_conda_url(
+            platform=target_platform, pyver=self.pyver, arch=target_arch,
+            base_url=self.conda_url)
+        if target_sealer.target_downurl != self.target_downurl:
+            target_sealer._target_conda = None
+        target_sealer.stage_stats = staging.StageStats(tracer=self.tracer)
+
+        return target_sealer
+
+    @traced
+    def fetch_conda(self, host=True, target=True):
+        """Download the host and target installers concurrently.
+
+        Parameters
+        ----------
+        host : bool
+            fetch the host installer if it's not fetched yet.
+        target : bool
+            fetch the target installer if it's not fetched yet.
+        """
+        conda_specs = []
+        if host and self._host_conda is None:
+            conda_specs.append(("host", dict(
+                platform=self.host_platform, pyver=self.pyver,
+                arch=self.host_arch, base_url=self.conda_url,
+                sha256=self.conda_checksum(self.host_platform,
+                                           self.host_arch))))
+        if target and self._target_conda is None:
+            conda_specs.append(("target", dict(
+                platform=self.target_platform, pyver=self.pyver,
+                arch=self.target_arch, base_url=self.conda_url,
+                sha256=self.conda_checksum(self.target_platform,
+                                           self.target_arch))))
+        if not conda_specs:
+            return
+
+        results = utils.get_condas([spec for _, spec in conda_specs],
+                                   tracer=self.tracer,
+                                   artifact_store=self.artifact_store)
+        for (role, _), (_, conda_path) in zip(conda_specs, results):
+            if role == "host":
+                self._host_conda = conda_path
+                self.tracer.message("Host conda environment is downloaded.")
+            else:
+                self._target_conda = conda_path
+                self.tracer.message("Target conda environment is downloaded.")
+        self.commit_store()
+
+    def conda_checksum(self, platform, arch):
+        """The expected SHA-256 checksum of an installer, None if unknown.
+
+        Parameters
+        ----------
+        platform : string
+            "osx", "linux", or "windows".
+        arch : int
+            32 or 64.
+        """
+        checksums = self.conda_sha256
+        if checksums is None and isfile(self.config_path):
+            checksums = utils.load_config(self.config_path).get(
+                "conda_sha256")
+        sha256 = (checksums or {}).get("%s-%d-py%d"
+                                       % (platform, arch, self.pyver))
+        if sha256 is not None and not isinstance(sha256, str):
+            # YAML reads an unquoted checksum of digits as a number
+            raise ValueError("The checksum %s is not a string, quote it in "
+                             "the configuration." % (sha256))
+        return sha256
+
+    def commit_store(self):
+        """Save the use of the artifact store and apply its size cap."""
+        if self.artifact_store is None:
+            return
+        evicted = self.artifact_store.commit()
+        if evicted > 0:
+            self.tracer.message("%d bytes are evicted from the artifact "
+                                "store." % (evicted))
+
+    def store_folder(self, folder_path, kind, extensions):
+        """Move the files of a folder to the artifact store.
+
+        The files are replaced by hard links to the store and named by
+        kind:file_name.
+        """
+        if self.artifact_store is None or not isdir(folder_path):
+            return
+        num_stored = 0
+        for file_name in sorted(os.listdir(folder_path)):
+            file_path = join(folder_path, file_name)
+            if file_name.endswith(extensions) and isfile(file_path) and \
+                    not os.path.islink(file_path):
+                self.artifact_store.put(file_path, kind,
+                                        ref=kind+":"+file_name)
+                num_stored += 1
+        self.commit_store()
+        self.tracer.message("%d files of %s are in the artifact store."
+                            % (num_stored, folder_path))
+
+    @property
+    def host_conda(self):
+        """The host miniconda installer, downloaded at first use."""
+        if self._host_conda is None:
+            self.fetch_conda(host=True, target=False)
+        return self._host_conda
+
+    @property
+    def target_conda(self):
+        """The target miniconda installer, downloaded at first use."""
+        if self._target_conda is None:
+            self.fetch_conda(host=False, target=True)
+        return self._target_conda
+
+    @traced
+    def init_build(self, rescan=True):
+        """Initialize the app building environment.
+
+        Parameters
+        ----------
+        rescan : bool
+            walk the app again, False if the build already started, see
+            run().
+        """
+        # the inventory of the last build is loaded before the cleanup
+        if rescan:
+            self.reset_inventory()
 
-    def init_build(self):
-        """Initialize the app building environment."""
         # install the host python distribution at app build folder.
         if not isdir(self.build_path):
             os.makedirs(self.build_path)
-            print ("[MESSAGE] App local build path is at %s"
-                   % (self.build_path))
+            self.tracer.message("App local build path is at %s"
+                                % (self.build_path))
+        elif self.incremental:
+            self.tracer.message("App local build path is reused for "
+                                "incremental build.")
         else:
             shutil.rmtree(self.build_path)
             os.makedirs(self.build_path)
-            print ("[MESSAGE] App local build path is cleaned up!")
+            self.tracer.message("App local build path is cleaned up!")
+
+        self.manifest = manifest.BuildManifest(self.manifest_path)
+
+        # reuse the installed miniconda only if nothing it depends on changed
+        if self.incremental and isdir(self.build_conda):
+            if self.manifest.env == self.get_env_state():
+                self.env_reused = True
+                self.tracer.message("Host installer and configuration are "
+                                    "unchanged, the miniconda at %s is reused."
+                                    % (self.build_conda))
+            else:
+                shutil.rmtree(self.build_conda)
+                self.manifest.env = {}
+                self.manifest.save()
+                self.tracer.message("Host installer or configuration is "
+                                    "changed, the miniconda is removed.")
 
         # prepare for build src folder
         if not isdir(self.build_src):
             os.makedirs(self.build_src)
 
-        # install miniconda at the path
-        if not isdir(self.build_conda):
-            sp.check_call(["chmod", "+x", self.host_conda])
-            sp.check_call([self.host_conda, "-b", "-p",
-                           self.build_conda])
-        print ("[MESSAGE] The miniconda at %s is "
-               "installed at %s" % (self.host_conda, self.build_conda))
+        # clone a cached environment or install miniconda at the path
+        if not isdir(self.build_conda) and self.env_cache and \
+                self.get_env_key() is not None and \
+                envcache.clone_env(self.get_env_key(), self.build_conda):
+            self.env_reused = True
+        elif not isdir(self.build_conda):
+            self.tracer.call(["chmod", "+x", self.host_conda])
+            self.tracer.call([self.host_conda, "-b", "-p",
+                              self.build_conda])
+        self.tracer.message("The miniconda at %s is installed at %s"
+                            % (self.host_conda, self.build_conda))
+
+        # the app is walked before the stages that read it run concurrently
+        if self.incremental:
+            self.diff_app()
+        else:
+            self.list_app_files()
+
+    def get_env_state(self):
+        """Get the state that the build environment depends on.
+
+        The state has the same inputs as get_env_key(), i.e., the host
+        installer, the dependency lists and the installed
+        requirements.txt.
+        """
+        return {"host_conda": manifest.file_hash(self.host_conda),
+                "env_key": self.get_env_key()}
+
+    def get_env_key(self):
+        """Get the environment cache key of the app.
+
+        Returns
+        -------
+        The key from envcache.env_key(), None if the app has no
+        configuration.
+        """
+        if not isfile(self.config_path):
+            return None
+
+        config_dict = utils.load_config(self.config_path)
+        pip_list = config_dict.get("pip_install", [])
+        requirements = None
+        requirements_path = join(self.app_path, "requirements.txt")
+        if "requirements.txt" in pip_list and isfile(requirements_path):
+            with open(requirements_path, mode="r") as f:
+                requirements = f.read()
+
+        return envcache.env_key(
+            manifest.file_hash(self.host_conda, algorithm="sha256"),
+            config_dict.get("conda_install", []), pip_list, requirements)
+
+    def save_env_state(self):
+        """Record a configured build environment in the manifest."""
+        if self.incremental:
+            self.manifest.env = self.get_env_state()
+            self.manifest.save()
+
+    def get_path_filter(self):
+        """Compile the ignore rules of the app.
+
+        The rules are pathfilter.DEFAULT_RULES, the ignore list of
+        .pysealer_config.yml and .pysealerignore, the build outputs are
+        always excluded. If the output path is the app root, the sealed
+        app of an earlier build, the installers and the delta packages
+        are excluded as well.
+        """
+        config_dict = utils.load_config(self.config_path) \
+            if isfile(self.config_path) else {}
+        rules = list(pathfilter.DEFAULT_RULES)
+        rules += config_dict.get("ignore", [])
+        rules += pathfilter.read_rules(join(self.app_path,
+                                            pathfilter.IGNORE_NAME))
+
+        rules += ["/pysealer_build/", "/sealed_app/", "__pycache__/",
+                  "*.pyc", "*.pyo"]
+        for out_path in [self.build_path, self.output_path]:
+            rel_path = os.path.relpath(out_path, self.app_path)
+            if rel_path != os.curdir and not rel_path.startswith(os.pardir):
+                rules.append("/%s/" % (rel_path.replace(os.sep, "/")))
+
+        if os.path.relpath(self.output_path, self.app_path) == os.curdir:
+            app_name = config_dict["app_name"][0] \
+                if "app_name" in config_dict else "app"
+            # a source folder of the same name is kept, see seal_app()
+            if isfile(join(self.app_path, app_name, delta.RELEASE_NAME)):
+                rules.append("/%s/" % (app_name))
+            rules += ["/%s.run" % (app_name),
+                      "/%s.run.manifest.json" % (app_name),
+                      "/%s-*-to-*.run" % (app_name),
+                      "/%s-*-to-*.delta/" % (app_name)]
+
+        return pathfilter.PathFilter(rules)
+
+    def reset_inventory(self):
+        """Start a new build, the app is walked again on the next use.
+
+        The current inventory, or the saved one of the last build, is kept
+        to reuse the hashes of the unchanged files.
+        """
+        if self.inventory is not None:
+            self.last_inventory = self.inventory
+        elif self.last_inventory is None:
+            self.last_inventory = inventory.Inventory.load(
+                self.inventory_path)
+        self.inventory = None
+        self.app_files = None
+        self.app_diff = None
+
+    def get_inventory(self):
+        """The inventory of the app files after the ignore rules.
+
+        The app is walked once per build, all stages read the types,
+        sizes, mtimes and hashes of the files from the inventory.
+        """
+        if self.inventory is None:
+            previous = self.last_inventory
+            if previous is not None and previous.root != self.app_path:
+                previous = None
+            self.inventory = inventory.Inventory.scan(
+                self.app_path, self.get_path_filter(), previous=previous)
+            self.last_inventory = None
+            self.tracer.count("files_scanned", len(self.inventory))
+            if previous is None:
+                self.tracer.message("The app has %d files."
+                                    % (len(self.inventory)))
+            else:
+                added, changed, removed = self.inventory.diff(previous)
+                self.tracer.message(
+                    "The app has %d files, %d added, %d changed and %d "
+                    "removed since the last build."
+                    % (len(self.inventory), len(added), len(changed),
+                       len(removed)))
+
+        return self.inventory
+
+    def save_inventory(self):
+        """Save the inventory with its hashes for the next build."""
+        if self.inventory is not None and isdir(self.build_path):
+            self.inventory.save(self.inventory_path)
+
+    def list_app_files(self):
+        """List the source files of the app relative to the app path.
+
+        Top-level python modules and all files in the app folders are
+        listed, unless the ignore rules exclude them. Compiled files are
+        outputs of the build and are not listed. The list is made once per
+        build from the inventory and shared by all stages.
+        """
+        if self.app_files is None:
+            self.app_files = [
+                rel_path for rel_path in self.get_inventory().paths
+                if os.sep in rel_path or rel_path.endswith(".py")]
+
+        return self.app_files
 
+    def diff_app(self):
+        """Compare the app files against the build manifest.
+
+        The result is computed once and shared by compile_app and
+        prepare_app.
+        """
+        if self.app_diff is None:
+            self.app_diff = self.manifest.diff(
+                self.app_path, self.list_app_files(),
+                inventory=self.get_inventory())
+        return self.app_diff
+
+    @traced
     def config_environment(self):
         """Configure environment based on a .pysealer_config.yml file.
 
@@ -121,77 +546,844 @@ class Sealer():
         in YAML format.
         """
         if not isfile(self.config_path):
-            print ("[MESSAGE] No valid .pysealer_config.yml is found "
-                   "for the project, skip environment configuration.")
+            self.tracer.message("No valid .pysealer_config.yml is found for "
+                                "the project, skip environment "
+                                "configuration.")
+            self.save_env_state()
             return
 
-        with open(self.config_path, mode="r") as f:
-            config_dict = yaml.load(f)
-
-        print ("[MESSAGE] Configuring environment...")
-        # install conda item
-        self.build_conda = join(self.build_bin, "conda")
-        sp.check_call([self.build_conda, "info", "-a"])
-        sp.check_call([self.build_conda, "update", "--yes", "conda"])
-        sp.check_call([self.build_conda, "install", "--yes", "conda-build"])
-        sp.check_call([self.build_conda, "install", "--yes", "pip"])
-        for conda_item in config_dict["conda_install"]:
-            sp.check_call([self.build_conda, "install", "--yes", conda_item])
-        print ("[MESSAGE] Conda dependencies are installed.")
-
-        # install pip items
-        self.build_pip = join(self.build_bin, "pip")
-        sp.check_call([self.build_pip, "--version"])
+        if self.env_reused:
+            shutil.copy2(self.config_path, self.build_path)
+            self.save_env_state()
+            self.tracer.message("Building environment is reused, "
+                                "skip environment configuration.")
+            return
+
+        config_dict = utils.load_config(self.config_path)
+
+        self.tracer.message("Configuring environment...")
+        self.tracer.call([self.build_conda_bin, "info", "-a"])
+        self.tracer.call([self.build_conda_bin, "update", "--yes", "conda"])
+        # install all conda items in a single solve
+        self.tracer.call([self.build_conda_bin, "install", "--yes",
+                          "conda-build", "pip"] +
+                         list(config_dict["conda_install"]))
+        self.tracer.message("Conda dependencies are installed.")
+
+        # install all pip items in a single resolve
+        self.tracer.call([self.build_pip, "--version"])
+        pip_args = []
         for pip_item in config_dict["pip_install"]:
             if pip_item == "requirements.txt":
                 if isfile(join(self.app_path, pip_item)):
-                    sp.check_call([self.build_pip, "install", "-r",
-                                   join(self.app_path, pip_item)])
-            else:
-                #  attempt to do the normal install
-                #  TODO: There may be duplicated install for certain
-                #        package. Right now, it's developer's responsibility
-                #        to do this job.
-                sp.check_call([self.build_pip, "install", pip_item])
-
-        print ("[MESSAGE] PIP dependencies are installed.")
-        sp.check_call([self.build_conda, "list"])
+                    pip_args += ["-r", join(self.app_path, pip_item)]
+            elif pip_item not in pip_args:
+                pip_args.append(pip_item)
+        if pip_args:
+            self.tracer.call([self.build_pip, "install"] + pip_args)
+
+        self.tracer.message("PIP dependencies are installed.")
+        self.tracer.call([self.build_conda_bin, "list"])
         shutil.copy2(self.config_path, self.build_path)
-        print ("[MESSAGE] Building environment is configured.")
+        self.save_env_state()
+        if self.env_cache:
+            envcache.store_env(self.build_conda, self.get_env_key())
+        self.store_folder(join(self.build_conda, "pkgs"), "conda_pkg",
+                          (".tar.bz2", ".conda"))
+        self.tracer.message("Building environment is configured.")
+
+    @traced
+    def prune_environment(self, rules=None, strip=False, dry_run=False,
+                          env_mode="pack"):
+        """Remove the files of build environment that the app never uses.
+
+        Run it between config_environment and seal_app. The rules are
+        taken from the argument, then prune_rules in .pysealer_config.yml,
+        then prune.DEFAULT_RULES.
+
+        Only env_mode="pack" ships the build environment, so pruning only
+        shrinks the installer in that mode. In the other modes the
+        footprint is reported and nothing is removed, env_mode="lock"
+        installs from the package cache that the "pkgs" category removes.
+
+        Parameters
+        ----------
+        rules : dict
+            prune categories to lists of patterns.
+        strip : bool
+            strip the symbols of extension modules and shared libraries.
+        dry_run : bool
+            only write the footprint report, nothing is removed.
+        env_mode : string
+            the environment mode of seal_app().
+
+        Returns
+        -------
+        The footprint report, also saved at pysealer_build/footprint.json.
+        """
+        if env_mode not in ["solve", "lock", "pack"]:
+            raise ValueError("The environment mode %s is not supported."
+                             % (env_mode))
+        if env_mode != "pack" and not dry_run:
+            self.tracer.message("The build environment is not shipped with "
+                                "env_mode=%s, only the footprint is "
+                                "reported." % (env_mode))
+            dry_run = True
+        if rules is None and isfile(self.config_path):
+            rules = utils.load_config(self.config_path).get("prune_rules")
+
+        report = prune.prune(self.build_conda, rules=rules, strip=strip,
+                             dry_run=dry_run)
+        if not dry_run and \
+                report["categories"].get("pkgs", {}).get("removed_files"):
+            self.pkgs_pruned = True
+        with open(join(self.build_path, "footprint.json"), mode="w") as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+
+        for category in sorted(report["categories"]):
+            entry = report["categories"][category]
+            self.tracer.message("%s: %d files, %d bytes"
+                                % (category, entry["files"], entry["bytes"]))
+        for package in sorted(report["packages"],
+                              key=lambda name:
+                              -report["packages"][name]["bytes"])[:10]:
+            entry = report["packages"][package]
+            self.tracer.message("%s: %d files, %d bytes, %d bytes pruned"
+                                % (package, entry["files"], entry["bytes"],
+                                   entry["removed_bytes"]))
+        self.tracer.message("%d of %d bytes are pruned, %d bytes are "
+                            "stripped. The footprint report is at %s"
+                            % (report["total"]["removed_bytes"],
+                               report["total"]["bytes"],
+                               report["total"]["stripped_bytes"],
+                               join(self.build_path, "footprint.json")))
+
+        return report
+
+    @traced
+    def compile_app(self, workers=None):
+        """Build entire app and redirect it to build path.
+
+        The app is walked once and the source files are compiled by a pool
+        of build interpreter processes.
+
+        Parameters
+        ----------
+        workers : int
+            the number of compiling processes, use all CPU cores if None.
+
+        Returns
+        -------
+        A dictionary that maps the files failed to compile to their error
+        messages.
+        """
+        # identify the right python
+        self.build_python = join(self.build_bin, "python")
+        self.tracer.call([self.build_python, "--version"])
+
+        if self.incremental:
+            _, changed, _, unchanged = self.diff_app()
+            compile_list = [rel_path for rel_path in changed
+                            if rel_path.endswith(".py")]
+            # compiled files may be cleaned up in the app folder
+            compiled = self.get_inventory().compiled
+            compile_list += [rel_path for rel_path in unchanged
+                             if rel_path.endswith(".py") and
+                             rel_path+"c" not in compiled]
+        else:
+            compile_list = [rel_path for rel_path in self.list_app_files()
+                            if rel_path.endswith(".py")]
+
+        return self.compile_sources(compile_list, self.app_path,
+                                    workers=workers)
+
+    def compile_sources(self, compile_list, dst_path, workers=None,
+                        optimize=0, strip_list=()):
+        """Compile app sources by the build interpreter.
+
+        Compiled files of unchanged sources are linked from the artifact
+        store, the new ones are stored.
+
+        Parameters
+        ----------
+        compile_list : list
+            the sources relative to the app path.
+        dst_path : string
+            the folder of the compiled files, e.g., the app path.
+        workers : int
+            the number of compiling processes, use all CPU cores if None.
+        optimize : int
+            the optimization level, see compiler.compile_files().
+        strip_list : list
+            the sources whose line tables are dropped.
+
+        Returns
+        -------
+        A dictionary that maps the files failed to compile to their error
+        messages.
+        """
+        compile_list = list(compile_list)
+        strip_list = set(strip_list)
+
+        num_linked = 0
+        if self.artifact_store is not None:
+            python_tag = self.tracer.call(
+                [self.build_python, "-c", "import sys; print(sys.version)"],
+                merge_stderr=False, echo=False)
+            refs = dict((rel_path, self.bytecode_ref(
+                python_tag, rel_path, optimize, rel_path in strip_list))
+                        for rel_path in compile_list)
+            for rel_path in list(compile_list):
+                digest = self.artifact_store.find(refs[rel_path])
+                if digest is not None and self.artifact_store.get(
+                        digest, join(dst_path, rel_path+"c")):
+                    compile_list.remove(rel_path)
+                    num_linked += 1
+
+        errors = compiler.compile_files(
+            self.build_python,
+            [join(self.app_path, rel_path) for rel_path in compile_list],
+            workers=workers,
+            root=self.app_path if self.reproducible else None,
+            optimize=optimize,
+            cfile_list=[join(dst_path, rel_path+"c")
+                        for rel_path in compile_list],
+            strip_list=[join(self.app_path, rel_path)
+                        for rel_path in compile_list
+                        if rel_path in strip_list],
+            tracer=self.tracer)
+
+        if self.artifact_store is not None:
+            for rel_path in compile_list:
+                if join(self.app_path, rel_path) not in errors:
+                    self.artifact_store.put(
+                        join(dst_path, rel_path+"c"), "bytecode",
+                        ref=refs[rel_path])
+            self.commit_store()
+            self.tracer.count("files_linked", num_linked)
+            self.tracer.message("%d compiled files are linked from the "
+                                "artifact store." % (num_linked))
+
+        self.tracer.count("files_compiled", len(compile_list)-len(errors))
+        self.tracer.count("files_failed", len(errors))
+        for file_path in sorted(errors):
+            self.tracer.message("Failed to compile %s:\n%s"
+                                % (file_path, errors[file_path]))
+        self.tracer.message("%d files are compiled, %d files failed."
+                            % (len(compile_list)-len(errors), len(errors)))
+
+        return errors
+
+    def bytecode_ref(self, python_tag, rel_path, optimize=0, strip=False):
+        """Name the compiled file of a source in the artifact store.
+
+        The compiled file depends on the source, the interpreter, the
+        source path, which is recorded in the code objects, and the
+        optimization.
+        """
+        file_path = join(self.app_path, rel_path)
+        key = "\n".join([python_tag, file_path, os.path.abspath(file_path),
+                         self.get_inventory().file_hash(rel_path),
+                         str(compiler.source_date_epoch())
+                         if self.reproducible else "timestamp"])
+        if optimize or strip:
+            key += "\n-O%d%s" % (optimize, " strip" if strip else "")
+        return "bytecode:"+hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    @traced
+    def stage_assets(self):
+        """Copy the data files of the app into builder path.
+
+        The data files don't depend on the build environment, run()
+        stages them while the environment is configured.
+        """
+        if self.incremental:
+            self.update_app(compiled=False)
+        else:
+            for rel_path in self.list_app_files():
+                if not rel_path.endswith(".py"):
+                    self.stage_app_file(rel_path)
 
-    def compile_app(self):
-        """Build entire app and redirect it to build path."""
-        # install all dependencies through conda
+        self.tracer.message("The data files are saved to %s"
+                            % (self.build_src))
 
-        # identify the right python
+    @traced
+    def prepare_app(self, assets=True):
+        """Replicate the app structure and copy the file into builder path.
+
+        Parameters
+        ----------
+        assets : bool
+            stage the data files as well, False if stage_assets() did.
+        """
+        if self.incremental:
+            self.update_app(assets=assets)
+        else:
+            for rel_path in self.list_app_files():
+                if assets or rel_path.endswith(".py"):
+                    self.stage_app_file(rel_path)
+        self.save_inventory()
+
+        self.tracer.message("The project is saved to %s" % (self.build_src))
+        self.tracer.message("Staging: %s" % (self.stage_stats.report()))
+
+    @traced
+    def analyze_dependencies(self, remove_unreachable=False):
+        """Derive the dependencies of the app from its import graph.
+
+        The compiled app in build path is scanned from the scripts in
+        app_list. The imported modules are mapped to the distributions of
+        the build environment, which gives a proposal of conda_install and
+        pip_install and the declared packages that are never imported.
+
+        Parameters
+        ----------
+        remove_unreachable : bool
+            remove the compiled app modules that no app script reaches
+            from build path.
+
+        Returns
+        -------
+        The analysis as a dictionary, also saved at
+        pysealer_build/dependencies.json.
+        """
+        config_dict = utils.load_config(self.config_path)
+        result = depgraph.run_analysis(
+            join(self.build_bin, "python"), self.build_src,
+            self.app_entries(config_dict), self.build_conda,
+            tracer=self.tracer)
+
+        def dist_name(spec):
+            return re.split(r"[=<>!~\[;\s]", spec)[0].lower().replace(
+                "_", "-")
+
+        used = dict((dist_name(name), info["installer"])
+                    for name, info in result["distributions"].items())
+
+        conda_install = [spec for spec in config_dict["conda_install"]
+                         if dist_name(spec) in used]
+        pip_install = [spec for spec in self.get_pip_requirements(
+            config_dict) if dist_name(spec) in used]
+        declared = set(dist_name(spec) for spec in conda_install+pip_install)
+        for name in sorted(used):
+            if name not in declared:
+                if used[name] == "conda":
+                    conda_install.append(name)
+                else:
+                    pip_install.append(name)
+
+        result["unused"] = sorted(
+            set(dist_name(spec) for spec in config_dict["conda_install"] +
+                self.get_pip_requirements(config_dict)) - set(used))
+        result["proposal"] = {"conda_install": conda_install,
+                              "pip_install": pip_install}
+
+        with open(join(self.build_path, "dependencies.json"),
+                  mode="w") as f:
+            json.dump(result, f, indent=1, sort_keys=True)
+        proposed_config = dict(config_dict)
+        proposed_config.update(result["proposal"])
+        with open(join(self.build_path, ".pysealer_config.proposed.yml"),
+                  mode="w") as f:
+            yaml.safe_dump(proposed_config, f, default_flow_style=False)
+
+        for name in result["unused"]:
+            self.tracer.message("The declared package %s is never imported."
+                                % (name))
+        for name in result["missing"]:
+            self.tracer.message("The imported module %s is not installed."
+                                % (name))
+        self.tracer.message("%d of %d app modules are reachable, the proposed "
+                            "configuration is at %s"
+                            % (len(result["reachable"]),
+                               len(result["reachable"]) +
+                               len(result["unreachable"]),
+                               join(self.build_path,
+                                    ".pysealer_config.proposed.yml")))
+
+        if remove_unreachable:
+            self.remove_modules(result["unreachable"])
+            self.tracer.message("%d unreachable modules are removed."
+                                % (len(result["unreachable"])))
+
+        return result
+
+    @staticmethod
+    def app_entries(config_dict):
+        """The compiled app scripts of app_list, relative to build path."""
+        return [join(app_item, app_script+".pyc")
+                for app_item in config_dict["app_list"]
+                for app_script in config_dict["app_list"][app_item]]
+
+    def remove_modules(self, modules):
+        """Remove compiled app modules from build path.
+
+        Returns
+        -------
+        The removed files relative to build path.
+        """
+        removed = []
+        for module in modules:
+            for rel_path in [join(*module.split("."))+".pyc",
+                             join(*(module.split(".")+["__init__.pyc"]))]:
+                if isfile(join(self.build_src, rel_path)):
+                    os.remove(join(self.build_src, rel_path))
+                    removed.append(rel_path)
+        return removed
+
+    @traced
+    def optimize_app(self, level=1, strip_lines=None, remove_dead=False,
+                     workers=None):
+        """Optimize the compiled app in build path.
+
+        Run it between prepare_app and seal_app. The app modules are
+        compiled again at the optimization level into build path, so the
+        sealed app and every launcher load the optimized code.
+
+        Parameters
+        ----------
+        level : int
+            0, 1 (as python -O, no asserts) or 2 (as python -OO, no
+            docstrings either).
+        strip_lines : list
+            gitignore-style patterns of the modules that don't need to be
+            debugged, their line tables are dropped. The strip_lines list
+            of .pysealer_config.yml if None.
+        remove_dead : bool
+            remove the app modules that no script of app_list imports.
+            Modules that are only imported dynamically, e.g., by
+            importlib, are removed as well.
+        workers : int
+            the number of compiling processes, use all CPU cores if None.
+
+        Returns
+        -------
+        The size report of the modules, also saved at
+        pysealer_build/bytecode.json.
+        """
+        if level not in [0, 1, 2]:
+            raise ValueError("The optimization level %s is not supported."
+                             % (level))
+        config_dict = utils.load_config(self.config_path) \
+            if isfile(self.config_path) else {}
+        if strip_lines is None:
+            strip_lines = config_dict.get("strip_lines", [])
         self.build_python = join(self.build_bin, "python")
-        sp.check_call([self.build_python, "--version"])
 
-        folder_list = os.listdir(self.app_path)
-        folder_list.remove("pysealer_build")
+        modules = [rel_path for rel_path in self.list_app_files()
+                   if rel_path.endswith(".py") and
+                   isfile(join(self.build_src, rel_path+"c"))]
+        report = {"level": level,
+                  "modules": dict(
+                      (rel_path.replace(os.sep, "/"), {
+                          "before": os.path.getsize(
+                              join(self.build_src, rel_path+"c")),
+                          "after": 0, "stripped": False, "removed": False})
+                      for rel_path in modules)}
+
+        if remove_dead:
+            if "app_list" not in config_dict:
+                raise IOError("The dead module removal needs the app_list "
+                              "of the app configuration.")
+            result = depgraph.run_analysis(
+                self.build_python, self.build_src,
+                self.app_entries(config_dict), self.build_conda,
+                tracer=self.tracer)
+            removed = set(self.remove_modules(result["unreachable"]))
+            for rel_path in modules:
+                if rel_path+"c" in removed:
+                    report["modules"][rel_path.replace(os.sep, "/")][
+                        "removed"] = True
+            modules = [rel_path for rel_path in modules
+                       if rel_path+"c" not in removed]
+
+        strip_filter = pathfilter.PathFilter(strip_lines)
+        strip_list = [rel_path for rel_path in modules
+                      if strip_filter.excluded(rel_path.replace(os.sep, "/"))]
+        errors = self.compile_sources(modules, self.build_src,
+                                      workers=workers, optimize=level,
+                                      strip_list=strip_list)
+
+        for rel_path in modules:
+            if join(self.app_path, rel_path) in errors:
+                continue
+            entry = report["modules"][rel_path.replace(os.sep, "/")]
+            entry["after"] = os.path.getsize(
+                join(self.build_src, rel_path+"c"))
+            entry["stripped"] = rel_path in strip_list
+        report["before"] = sum(entry["before"]
+                               for entry in report["modules"].values())
+        report["after"] = sum(entry["after"]
+                              for entry in report["modules"].values())
+        with open(join(self.build_path, "bytecode.json"), mode="w") as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+        self.save_inventory()
+
+        for rel_path in sorted(
+                report["modules"],
+                key=lambda rel_path: report["modules"][rel_path]["after"] -
+                report["modules"][rel_path]["before"])[:10]:
+            entry = report["modules"][rel_path]
+            self.tracer.message("%s: %d -> %d bytes"
+                                % (rel_path, entry["before"], entry["after"]))
+        self.tracer.message("%d modules are optimized at level %d, %d line "
+                            "tables are dropped, %d modules are removed. "
+                            "The bytecode is reduced from %d to %d bytes, "
+                            "the report is at %s"
+                            % (len(modules)-len(errors), level,
+                               len(strip_list),
+                               len(report["modules"])-len(modules),
+                               report["before"], report["after"],
+                               join(self.build_path, "bytecode.json")))
+
+        return report
+
+    @staticmethod
+    def build_file(rel_path):
+        """Source files are shipped as their compiled version."""
+        return rel_path+"c" if rel_path.endswith(".py") else rel_path
+
+    def stage_app_file(self, rel_path):
+        """Stage an app file into build path as it's shipped.
+
+        Symbolic links are recreated. Only the compiled files, which the
+        build replaces instead of writing them in place, may be hard
+        linked, see staging.unlinked_mode().
+
+        Returns
+        -------
+        False if the file to ship doesn't exist, e.g., the source failed
+        to compile.
+        """
+        src_path = join(self.app_path, self.build_file(rel_path))
+        dst_path = join(self.build_src, self.build_file(rel_path))
+        # the compiled files are not in the inventory
+        if rel_path.endswith(".py"):
+            if not os.path.lexists(src_path):
+                return False
+            is_link = os.path.islink(src_path)
+        else:
+            is_link = self.get_inventory().is_link(rel_path)
+        if not isdir(os.path.dirname(dst_path)):
+            os.makedirs(os.path.dirname(dst_path))
+        if is_link:
+            if os.path.lexists(dst_path):
+                os.remove(dst_path)
+            os.symlink(os.readlink(src_path), dst_path)
+        elif rel_path.endswith(".py"):
+            staging.stage_file(src_path, dst_path, mode=self.stage_mode,
+                               stats=self.stage_stats)
+        else:
+            # the data files are sources of the user
+            staging.stage_file(src_path, dst_path,
+                               mode=staging.unlinked_mode(self.stage_mode),
+                               stats=self.stage_stats)
+        return True
+
+    def update_app(self, compiled=True, assets=True):
+        """Only copy and remove the files that are changed in build path.
+
+        The build manifest is saved with the compiled files, so the data
+        files are updated first or together with them.
+
+        Parameters
+        ----------
+        compiled : bool
+            update the compiled files of the sources.
+        assets : bool
+            update the data files.
+        """
+        new_files, changed, removed, unchanged = self.diff_app()
+
+        def selected(rel_path):
+            return compiled if rel_path.endswith(".py") else assets
+
+        # the modules that the last build optimized are staged again
+        optimized = set()
+        report_path = join(self.build_path, "bytecode.json")
+        if compiled and isfile(report_path):
+            with open(report_path, mode="r") as f:
+                optimized = set(rel_path.replace("/", os.sep)
+                                for rel_path in json.load(f)["modules"])
+            os.remove(report_path)
+
+        # the build path is listed once instead of checking every file
+        staged = inventory.list_tree(self.build_src)
+        num_files = num_rebuilt = num_removed = 0
+        for rel_path in changed+unchanged:
+            if not selected(rel_path):
+                continue
+            num_files += 1
+            if rel_path in unchanged and rel_path not in optimized and \
+                    self.build_file(rel_path) in staged:
+                continue
+            if self.stage_app_file(rel_path):
+                num_rebuilt += 1
+
+        for rel_path in removed:
+            if selected(rel_path) and self.build_file(rel_path) in staged:
+                os.remove(join(self.build_src, self.build_file(rel_path)))
+                num_removed += 1
+
+        if compiled:
+            self.manifest.files = new_files
+            self.manifest.save()
+            self.app_diff = None
+
+        self.tracer.message("Incremental build: %d files are reused, "
+                            "%d files are rebuilt, %d files are removed."
+                            % (num_files-num_rebuilt, num_rebuilt,
+                               num_removed))
+
+    def get_pip_requirements(self, config_dict):
+        """Merge the pip_install items and requirements.txt.
+
+        Parameters
+        ----------
+        config_dict : dict
+            the app configuration.
+
+        Returns
+        -------
+        A list of requirement lines without duplicates.
+        """
+        requirements = []
+        for pip_item in config_dict.get("pip_install", []):
+            if pip_item == "requirements.txt":
+                if isfile(join(self.app_path, pip_item)):
+                    with open(join(self.app_path, pip_item), mode="r") as f:
+                        requirements += [line.split(" #")[0].strip()
+                                         for line in f]
+            else:
+                requirements.append(pip_item)
 
-        for f_name in folder_list:
-            f_path = join(self.app_path, f_name)
-            if isdir(f_path):
-                # compile it!
-                sp.check_call([self.build_python, "-m", "compileall",
-                               f_path])
-                print ("[MESSAGE] %s is compiled!" % (f_path))
+        pip_requirements = []
+        for line in requirements:
+            if line and not line.startswith("#") and \
+                    line not in pip_requirements:
+                pip_requirements.append(line)
 
-    def prepare_app(self):
-        """Replicate the app structure and copy the file into builder path."""
-        folder_list = os.listdir(self.app_path)
-        folder_list.remove("pysealer_build")
+        return pip_requirements
 
-        for f_name in folder_list:
-            f_path = join(self.app_path, f_name)
-            if isdir(f_path) and not isdir(join(self.build_src, f_name)):
-                shutil.copytree(f_path, join(self.build_src, f_name),
-                                ignore=shutil.ignore_patterns('*.py'))
+    def build_wheelhouse(self):
+        """Build wheels of the pip requirements from the host environment.
 
-        print ("[MESSAGE] The project is saved to %s" % (self.build_src))
+        The requirements are resolved together from pip_requirements.txt
+        in the sealed app.
 
-    def seal_app(self):
+        Returns
+        -------
+        The wheelhouse path, None if the wheels can't be used at target.
+        """
+        if self.host_platform != self.target_platform or \
+                self.host_arch != self.target_arch:
+            self.tracer.message("The host wheels don't match the target "
+                                "platform, pip dependencies are installed "
+                                "online.")
+            return None
+
+        wheel_path = join(self.seal_path, "wheelhouse")
+        if not isdir(wheel_path):
+            os.makedirs(wheel_path)
+        self.tracer.call([self.build_pip, "wheel", "--wheel-dir", wheel_path,
+                          "-r", join(self.seal_path, "pip_requirements.txt")])
+        self.store_folder(wheel_path, "wheel", (".whl",))
+        self.tracer.message("The wheelhouse is built at %s" % (wheel_path))
+
+        return wheel_path
+
+    def lock_environment(self):
+        """Ship an explicit lockfile and the packages of the build environment.
+
+        The target installs the exact packages offline without solving.
+        """
+        explicit_list = self.tracer.call(
+            [self.build_conda_bin, "list", "--explicit", "--md5",
+             "--prefix", self.build_conda], merge_stderr=False, echo=False)
+        with open(join(self.seal_path, "conda_explicit.txt"), mode="w") as f:
+            f.write(explicit_list)
+
+        seal_pkgs_path = join(self.seal_path, "pkgs")
+        if not isdir(seal_pkgs_path):
+            os.makedirs(seal_pkgs_path)
+        for line in explicit_list.splitlines():
+            if "://" not in line:
+                continue
+            pkg_name = line.split("#")[0].rsplit("/", 1)[-1]
+            pkg_path = join(self.build_conda, "pkgs", pkg_name)
+            if not isfile(pkg_path) and self.artifact_store is not None:
+                digest = self.artifact_store.find("conda_pkg:"+pkg_name)
+                if digest is not None:
+                    if not isdir(os.path.dirname(pkg_path)):
+                        os.makedirs(os.path.dirname(pkg_path))
+                    self.artifact_store.get(digest, pkg_path)
+            if isfile(pkg_path):
+                staging.stage_file(pkg_path, seal_pkgs_path,
+                                   mode=self.stage_mode,
+                                   stats=self.stage_stats)
+            else:
+                self.tracer.message("The package %s is not in the build "
+                                    "cache, the target has to download it."
+                                    % (pkg_name))
+
+        staging.stage_file(self.target_conda,
+                           join(self.seal_path, "miniconda.sh"),
+                           mode=self.stage_mode, stats=self.stage_stats)
+        self.commit_store()
+        self.tracer.message("The environment lockfile is stored at %s"
+                            % (join(self.seal_path, "conda_explicit.txt")))
+
+    def pack_environment(self):
+        """Ship the configured build environment as a relocatable copy.
+
+        The target only rewrites the installation prefix. The files of the
+        environment and its prefix record keep the absolute path of the
+        build environment, which relocate.py replaces, so the packed app
+        depends on the build path even in reproducible mode.
+        """
+        seal_conda = join(self.seal_path, "miniconda")
+        staging.stage_tree(
+            self.build_conda, seal_conda, mode=self.stage_mode,
+            stats=self.stage_stats,
+            ignore=lambda root, names:
+                ["pkgs"] if root == self.build_conda else [])
+        relocate.write_prefix_record(self.build_conda, seal_conda,
+                                     exclude_dirs=("pkgs",))
+        shutil.copy2(os.path.splitext(relocate.__file__)[0]+".py",
+                     join(self.seal_path, "relocate.py"))
+        self.tracer.message("The packed environment is stored at %s"
+                            % (seal_conda))
+
+    def write_conda_install(self, config_dict, env_mode, wheelhouse):
+        """Write the miniconda and dependency installation to build script.
+
+        Parameters
+        ----------
+        config_dict : dict
+            the app configuration.
+        env_mode : string
+            "solve" or "lock", see seal_app().
+        wheelhouse : bool
+            ship the wheels of pip dependencies.
+        """
+        # Install Miniconda
+        commands = []
+        if env_mode == "lock":
+            self.lock_environment()
+        elif self.target_platform == "osx":
+            commands.append('curl -o miniconda.sh %s' % (self.target_downurl))
+        elif self.target_platform == "linux":
+            commands.append('wget -O miniconda.sh %s' % (self.target_downurl))
+        commands += ['chmod +x ${APP_PATH}/miniconda.sh',
+                     'rm -rf ${MINICONDA_PATH}',
+                     '${APP_PATH}/miniconda.sh -b -p ${MINICONDA_PATH}',
+                     'echo "[MESSAGE] The target miniconda is built."']
+        self.write_step("miniconda", "Install miniconda in the current "
+                        "folder, the target platform is %s"
+                        % (self.target_platform), commands)
+
+        # build conda installation
+        commands = ['$CONDA info -a']
+        if env_mode == "lock":
+            # the packages are linked into the cache, not copied
+            commands += [
+                'mkdir -p ${MINICONDA_PATH}/pkgs',
+                'for PKG in ${APP_PATH}/pkgs/*; do',
+                '    [ -f "${PKG}" ] || continue',
+                '    ln -f "${PKG}" ${MINICONDA_PATH}/pkgs/ 2>/dev/null || '
+                'cp -f "${PKG}" ${MINICONDA_PATH}/pkgs/',
+                'done',
+                '$CONDA install --offline --yes '
+                '--file ${APP_PATH}/conda_explicit.txt']
+        else:
+            commands += ['$CONDA update --yes conda',
+                         '$CONDA install --yes conda-build pip %s'
+                         % (" ".join(config_dict["conda_install"]))]
+        self.write_step("conda", "Install Conda Dependencies", commands)
+
+        # build pip installation
+        commands = ['$PIP --version']
+        pip_requirements = self.get_pip_requirements(config_dict)
+        if pip_requirements:
+            with open(join(self.seal_path, "pip_requirements.txt"),
+                      mode="w") as f:
+                f.write("\n".join(pip_requirements)+"\n")
+
+            wheel_path = self.build_wheelhouse() \
+                if wheelhouse else None
+            if wheel_path is not None:
+                commands.append(
+                    '$PIP install --no-index --find-links '
+                    '${APP_PATH}/wheelhouse '
+                    '-r ${APP_PATH}/pip_requirements.txt')
+            else:
+                commands.append(
+                    '$PIP install -r ${APP_PATH}/pip_requirements.txt')
+        self.write_step("pip", "Install pip Dependencies", commands)
+
+        # clean conda
+        self.write_step("cleanup", "Remove the installation files",
+                        ['rm -rf ${APP_PATH}/miniconda.sh ${APP_PATH}/pkgs',
+                         '$CONDA clean --all --yes'])
+
+    def write_step(self, name, comment, commands):
+        """Write an install step to build script.
+
+        The commands of a step stop at the first error, a step that is
+        done is recorded and skipped when an interrupted install runs the
+        build script again.
+
+        Parameters
+        ----------
+        name : string
+            the name of the step in the install state.
+        comment : string
+            the description of the step.
+        commands : list
+            shell command lines.
+        """
+        self.build_script_file.write('# %s\n\n' % (comment))
+        self.build_script_file.write('if step_done %s; then\n' % (name))
+        self.build_script_file.write(
+            '    echo "[MESSAGE] The step %s is done, skipped."\n' % (name))
+        self.build_script_file.write('else\n')
+        self.build_script_file.write('    (\n')
+        self.build_script_file.write('        set -e\n')
+        for command in commands:
+            self.build_script_file.write('        %s\n' % (command))
+        self.build_script_file.write('    ) || exit 1\n')
+        self.build_script_file.write('    mark_done %s\n' % (name))
+        self.build_script_file.write('fi\n\n')
+        self.build_script_file.flush()
+
+    def pack_modules(self, config_dict):
+        """Pack the compiled modules of the sealed app into one archive.
+
+        The scripts in app_list stay in the source tree and are started by
+        the archive importer.
+
+        Parameters
+        ----------
+        config_dict : dict
+            the app configuration.
+        """
+        keep = set()
+        for app_item in config_dict["app_list"]:
+            for app_script in config_dict["app_list"][app_item]:
+                keep.add(join(app_item, app_script+".pyc"))
+
+        num_modules = archive.pack(self.seal_src_path,
+                                   join(self.seal_path, "modules.pysa"),
+                                   keep=keep)
+        shutil.copy2(os.path.splitext(archive.__file__)[0]+".py",
+                     join(self.seal_path, "pysealer_archive.py"))
+        self.tracer.message("%d modules are packed into %s"
+                            % (num_modules,
+                               join(self.seal_path, "modules.pysa")))
+
+    @traced
+    def seal_app(self, wheelhouse=True, env_mode="solve",
+                 module_archive=False, launcher_mode="default"):
         """The final procedures for sealing the app.
 
         1. bash file that set general parameters at client end.
@@ -199,59 +1391,130 @@ class Sealer():
         3. bash file that compile a list of running bash file for compiling as
            app.
         4. Wrap the entire app as an installer.
+
+        Parameters
+        ----------
+        wheelhouse : bool
+            ship the wheels of pip dependencies, so that the target installs
+            them offline.
+        env_mode : string
+            "solve": the target downloads miniconda and solves the
+                     dependencies.
+            "lock" : the target installs the exact packages of the build
+                     environment from a shipped lockfile, offline.
+            "pack" : the build environment is shipped and relocated at
+                     target.
+        module_archive : bool
+            pack the compiled modules into a single memory-mapped archive
+            instead of a tree of .pyc files.
+        launcher_mode : string
+            "default": the app scripts run the interpreter as it is.
+            "fast"   : the app scripts run the interpreter in isolated mode
+                       without the site module and bytecode writes, the
+                       module search path is frozen at install time.
+            "zygote" : as "fast", the scripts fork from a warm
+                       interpreter per user that imported zygote_preload
+                       of .pysealer_config.yml, see pysealer.zygote.
+                       Python 3 only.
         """
+        if env_mode not in ["solve", "lock", "pack"]:
+            raise ValueError("The environment mode %s is not supported."
+                             % (env_mode))
+        if launcher_mode not in ["default", "fast", "zygote"]:
+            raise ValueError("The launcher mode %s is not supported."
+                             % (launcher_mode))
+        if launcher_mode == "zygote" and self.pyver != 3:
+            raise ValueError("The launcher mode zygote is not supported "
+                             "by python %d." % (self.pyver))
+        if env_mode != "solve" and \
+                (self.host_platform != self.target_platform or
+                 self.host_arch != self.target_arch):
+            raise ValueError("The environment mode %s needs the same host "
+                             "and target platform." % (env_mode))
+        if env_mode == "lock" and self.pkgs_pruned:
+            raise ValueError("The environment mode lock needs the package "
+                             "cache of the build environment, which is "
+                             "pruned.")
+
         # Start to write a bash file
-        self.seal_path = join(self.app_path, "sealed_app")
+        self.seal_path = join(self.output_path, "sealed_app")
 
         if not isdir(self.seal_path):
             os.makedirs(self.seal_path)
-            print ("[MESSAGE] The sealed app is stored at %s"
-                   % (self.seal_path))
+            self.tracer.message("The sealed app is stored at %s"
+                                % (self.seal_path))
         else:
             # clean up the sealed app directory
             shutil.rmtree(self.seal_path)
             os.makedirs(self.seal_path)
-            print ("[MESSAGE] The sealed app path is cleaned up!")
+            self.tracer.message("The sealed app path is cleaned up!")
 
         # copy configuration
         # directly embed all the commands to the shell script, not gonna parse
         # YAML in the shell script.
         if isfile(self.config_path):
-            shutil.copy2(self.config_path, self.seal_path)
-            print ("[MESSAGE] The app configuration is stored at %s"
-                   % (join(self.seal_path, ".pysealer_config.yml")))
+            staging.stage_file(self.config_path, self.seal_path,
+                               mode=staging.unlinked_mode(self.stage_mode),
+                               stats=self.stage_stats)
+            self.tracer.message("The app configuration is stored at %s"
+                                % (join(self.seal_path,
+                                        ".pysealer_config.yml")))
             self.seal_config_path = join(self.seal_path,
                                          ".pysealer_config.yml")
 
-            with open(self.seal_config_path, mode="r") as f:
-                config_dict = yaml.load(f)
+            config_dict = utils.load_config(self.seal_config_path)
             self.app_name = config_dict["app_name"][0]
             self.app_version = config_dict["app_version"][0]
             self.app_author = config_dict["app_author"][0]
         else:
-            print ("[MESSAGE] No valid .pysealer_config.yml is found "
-                   "for the project, skip environment configuration.")
+            self.tracer.message("No valid .pysealer_config.yml is found for "
+                                "the project, skip environment "
+                                "configuration.")
             self.app_name = "app"
             self.app_version = "v0.1.0"
             self.app_author = "John Doe"
 
+        # only the output of an earlier seal is replaced
+        app_output = join(self.output_path, self.app_name)
+        if isdir(app_output) and \
+                not isfile(join(app_output, delta.RELEASE_NAME)):
+            raise IOError("%s is not a sealed app, use another app_name or "
+                          "output_path." % (app_output))
+
         # try to copy requirement file
         if isfile(join(self.app_path, "requirements.txt")):
-            shutil.copy2(join(self.app_path, "requirements.txt"),
-                         self.seal_app)
+            staging.stage_file(join(self.app_path, "requirements.txt"),
+                               self.seal_path,
+                               mode=staging.unlinked_mode(self.stage_mode),
+                               stats=self.stage_stats)
 
         # copy compiled source
         self.seal_src_path = join(self.seal_path, "src")
         if not isdir(self.seal_src_path):
-            shutil.copytree(self.build_src, self.seal_src_path)
-            print ("[MESSAGE] The compiled source is stored at %s"
-                   % (self.seal_src_path))
+            staging.stage_tree(self.build_src, self.seal_src_path,
+                               mode=self.stage_mode, stats=self.stage_stats)
+            self.tracer.message("The compiled source is stored at %s"
+                                % (self.seal_src_path))
+        if module_archive:
+            self.pack_modules(config_dict)
+        if launcher_mode in ["fast", "zygote"]:
+            shutil.copy2(os.path.splitext(launcher.__file__)[0]+".py",
+                         join(self.seal_path, "pysealer_launcher.py"))
+        if launcher_mode == "zygote":
+            shutil.copy2(os.path.splitext(zygote.__file__)[0]+".py",
+                         join(self.seal_path, "pysealer_zygote.py"))
+            with open(join(self.seal_path, zygote.ZYGOTE_CONFIG_NAME),
+                      mode="w") as f:
+                json.dump({"preload": config_dict.get("zygote_preload", []),
+                           "timeout": config_dict.get(
+                               "zygote_timeout", zygote.DEFAULT_TIMEOUT)},
+                          f, indent=1, sort_keys=True)
 
         # construct build script
         self.build_script_path = join(self.seal_path, "build.sh")
         if isfile(self.build_script_path):
             os.remove(self.build_script_path)
-            print ("[MESSAGE] Old build script detected, removed.")
+            self.tracer.message("Old build script detected, removed.")
 
         self.build_script_file = open(self.build_script_path, "w")
 
@@ -260,7 +1523,7 @@ class Sealer():
         self.build_script_file.write("# Build script for %s %s by %s\n"
                                      % (self.app_name, self.app_version,
                                         self.app_author))
-        self.build_script_file.write("# "+str(datetime.datetime.now())+"\n\n")
+        self.build_script_file.write("# "+self.build_time()+"\n\n")
         self.build_script_file.flush()
 
         # general path
@@ -306,77 +1569,65 @@ class Sealer():
         self.build_script_file.write('\n')
         self.build_script_file.flush()
 
-        # possible option
-
-        # Install Miniconda
+        # install steps that are done are recorded in the install state
         self.build_script_file.write(
-            '# Install miniconda in the current folder\n\n')
-
+            '# Install state, a resumed install skips the done steps\n\n')
         self.build_script_file.write(
-            '# The target platform is %s\n' % (self.target_platform))
-        if self.target_platform == "osx":
-            self.build_script_file.write(
-                'curl -o miniconda.sh %s\n\n' % (self.target_downurl))
-        elif self.target_platform == "linux":
-            self.build_script_file.write(
-                'wget -O miniconda.sh %s\n\n' % (self.target_downurl))
-
+            'STATE_FILE=${APP_PATH}/.pysealer_install_state\n')
         self.build_script_file.write(
-            'chmod +x ${APP_PATH}/miniconda.sh\n')
+            'NPROC=$(getconf _NPROCESSORS_ONLN 2>/dev/null || echo 1)\n')
+        self.build_script_file.write('export NPROC\n')
         self.build_script_file.write(
-            '${APP_PATH}/miniconda.sh -b -p ${MINICONDA_PATH}\n')
+            'step_done() {\n    grep -qx "$1" "${STATE_FILE}" 2>/dev/null\n'
+            '}\n')
         self.build_script_file.write(
-            'echo "[MESSAGE] The target miniconda is built."\n')
+            'mark_done() {\n    echo "$1" >> "${STATE_FILE}"\n}\n')
+        # conda extracts and links the packages by a thread per core
         self.build_script_file.write(
-            'rm ${APP_PATH}/miniconda.sh')
-
-        self.build_script_file.write('\n')
-        self.build_script_file.flush()
-
-        # build conda installation
-        self.build_script_file.write('# Install Conda Dependencies\n\n')
-
-        self.build_script_file.write('$CONDA info -a\n')
-        self.build_script_file.write('$CONDA update --yes conda\n')
-        self.build_script_file.write('$CONDA install --yes conda-build\n')
-        self.build_script_file.write('$CONDA install --yes pip\n')
-        for conda_item in config_dict["conda_install"]:
-            self.build_script_file.write(
-                '$CONDA install --yes %s\n' % (conda_item))
-
-        self.build_script_file.write('\n')
-        self.build_script_file.flush()
-
-        # build pip installation
-        self.build_script_file.write('# Install pip Dependencies\n\n')
-
-        self.build_script_file.write('$PIP --version\n')
-        for pip_item in config_dict["pip_install"]:
-            if pip_item == "requirements.txt":
-                if isfile(join(self.seal_path, pip_item)):
-                    self.build_script_file.write(
-                        '$PIP install -r %s\n'
-                        % (join(self.seal_path, pip_item)))
-            else:
-                #  attempt to do the normal install
-                #  TODO: There may be duplicated install for certain
-                #        package. Right now, it's developer's responsibility
-                #        to do this job.
-                self.build_script_file.write(
-                        '$PIP install %s\n' % (pip_item))
-
-        # clean conda
+            'CONDA_EXECUTE_THREADS=${NPROC}\n')
         self.build_script_file.write(
-            '$CONDA clean --all --yes')
-        self.build_script_file.write('\n')
+            'CONDA_VERIFY_THREADS=${NPROC}\n')
+        self.build_script_file.write(
+            'export CONDA_EXECUTE_THREADS CONDA_VERIFY_THREADS\n\n')
         self.build_script_file.flush()
 
+        # possible option
+        if env_mode == "pack":
+            self.pack_environment()
+            self.write_step(
+                "relocate", "Relocate the packed miniconda",
+                ['${PYTHON} ${APP_PATH}/relocate.py ${MINICONDA_PATH} '
+                 '${NPROC}',
+                 'echo "[MESSAGE] The target miniconda is relocated."'])
+            self.write_step("cleanup", "Remove the installation files",
+                            ['rm -f ${APP_PATH}/relocate.py'])
+        else:
+            self.write_conda_install(config_dict, env_mode, wheelhouse)
+
+        # the helpers are started as compiled scripts and imported from
+        # the bytecode cache, they aren't compiled again at each launch
+        helper_list = [join("${APP_PATH}", helper) for helper in HELPERS
+                       if isfile(join(self.seal_path, helper))]
+        if helper_list:
+            self.write_step(
+                "helpers", "Compile the launch helpers",
+                ['${PYTHON} -c "import sys, py_compile; '
+                 '[(py_compile.compile(f, doraise=True), '
+                 "py_compile.compile(f, f+'c', doraise=True)) "
+                 'for f in sys.argv[1:]]" '+" ".join(helper_list)])
+
+        if launcher_mode in ["fast", "zygote"]:
+            self.write_step(
+                "freeze", "Freeze the module search path of the launcher",
+                ['${PYTHON} -E -s ${APP_PATH}/pysealer_launcher.pyc '
+                 '--freeze ${APP_PATH}'])
+
         self.build_script_file.write(
             '# [MESSAGE] The build script ends here.')
         self.build_script_file.close()
-        sp.check_call(["chmod", "+x", self.build_script_path])
-        print ("[MESSAGE] The environment build script is prepared at %s"
-               % (self.build_script_path))
+        self.tracer.call(["chmod", "+x", self.build_script_path])
+        self.tracer.message("The environment build script is prepared at %s"
+                            % (self.build_script_path))
 
         # construct optional environment arguments
         opt_env_args = ""
@@ -384,12 +1635,25 @@ class Sealer():
             for arg in config_dict["opt_env_args"]:
                 opt_env_args += arg+" "
 
+        # the archive importer starts the app script in archive mode
+        launch_cmd = "${PYTHON} ${PY_FLAGS}"
+        if launcher_mode in ["fast", "zygote"]:
+            launch_cmd += " ${APP_PATH}/pysealer_%s.pyc %s${APP_PATH}" \
+                % ("launcher" if launcher_mode == "fast" else "zygote",
+                   "--archive " if module_archive else "")
+        elif module_archive:
+            launch_cmd += " ${APP_PATH}/pysealer_archive.pyc " \
+                "${APP_PATH}/modules.pysa"
+        py_flags = ""
+        if launcher_mode in ["fast", "zygote"]:
+            py_flags = "-I -S -B" if self.pyver == 3 else "-E -s -S -B"
+
         # Build application list
         for app_item in config_dict['app_list']:
             app_folder_path = join("./src", app_item)
             for app_script in config_dict['app_list'][app_item]:
                 if isfile(join(self.seal_path, app_script+".sh")):
-                    print ("[MESSAGE] The current app is existed!")
+                    self.tracer.message("The current app is existed!")
                     continue
                 app_script_file = open(
                     join(self.seal_path, app_script+".sh"), "w")
@@ -399,7 +1663,7 @@ class Sealer():
                     "# App script for %s by %s\n"
                     % (app_script, self.app_author))
                 app_script_file.write(
-                    "# "+str(datetime.datetime.now())+"\n\n")
+                    "# "+self.build_time()+"\n\n")
                 app_script_file.flush()
 
                 app_script_file.write(
@@ -419,39 +1683,667 @@ class Sealer():
                 app_script_file.write('PYTHON=${CONDA_BIN}/python\n')
                 app_script_file.write('export PYTHON\n\n')
 
+                app_script_file.write('PY_FLAGS="%s"\n' % (py_flags))
+                if launcher_mode in ["fast", "zygote"]:
+                    app_script_file.write('PYTHONDONTWRITEBYTECODE=1\n')
+                    app_script_file.write('export PYTHONDONTWRITEBYTECODE\n')
+                app_script_file.write('\n')
+
+                command = 'PYTHONPATH=${SRC_PATH}:$PYTHONPATH %s %s %s "$@"' \
+                    % (opt_env_args, launch_cmd,
+                       join(app_folder_path, app_script+".pyc"))
+                if self.pyver == 3:
+                    # PYSEALER_IMPORTTIME=1 records the import time of a run
+                    app_script_file.write(
+                        '# Import time profiling\n')
+                    app_script_file.write(
+                        'if [ -n "${PYSEALER_IMPORTTIME}" ]; then\n')
+                    app_script_file.write(
+                        '    mkdir -p ${APP_PATH}/importtime\n')
+                    app_script_file.write(
+                        '    IMPORTTIME_LOG=${APP_PATH}/importtime/'
+                        '%s-$(date +%%Y%%m%%d%%H%%M%%S)-$$.log\n'
+                        % (app_script))
+                    app_script_file.write(
+                        '    PY_FLAGS="${PY_FLAGS} -X importtime"\n')
+                    if launcher_mode == "zygote":
+                        # a cold start is profiled
+                        app_script_file.write(
+                            '    PYSEALER_ZYGOTE=0\n'
+                            '    export PYSEALER_ZYGOTE\n')
+                    app_script_file.write(
+                        "    %s 2> >(awk -v log_path=\"${IMPORTTIME_LOG}\" "
+                        "'/^import time:/ {print > log_path; next} "
+                        "{print > \"/dev/stderr\"; fflush()}')\n"
+                        % (command))
+                    app_script_file.write('    RET=$?\n')
+                    app_script_file.write('    wait $!\n')
+                    app_script_file.write(
+                        '    echo "[MESSAGE] The import time is recorded at '
+                        '${IMPORTTIME_LOG}" >&2\n')
+                    app_script_file.write('    exit ${RET}\n')
+                    app_script_file.write('fi\n\n')
+
                 app_script_file.write('# Running command\n')
-                app_script_file.write(
-                    'PYTHONPATH=${SRC_PATH}:$PYTHONPATH %s ${PYTHON} %s "$@"'
-                    % (opt_env_args, join(app_folder_path, app_script+".pyc")))
+                app_script_file.write(command)
 
                 app_script_file.close()
 
-                sp.check_call(["chmod", "+x",
-                               join(self.seal_path, app_script+".sh")])
-
-                print ("[MESSAGE] The app running script is prepared at %s"
-                       % (join(self.app_path, app_script+".sh")))
-
-        if not isdir(join(self.app_path, self.app_name)):
-            os.rename(join(self.app_path, "sealed_app"),
-                      join(self.app_path, self.app_name))
-        print ("[MESSAGE] The pre-sealed package is prepared.")
-
+                self.tracer.call(["chmod", "+x",
+                                  join(self.seal_path, app_script+".sh")])
+
+                self.tracer.message("The app running script is prepared at %s"
+                                    % (join(self.seal_path, app_script+".sh")))
+
+        # the release manifest is the base of later delta packages
+        delta.write_release(self.seal_path, self.app_name, self.app_version)
+        record_path = self.release_record(self.app_name, self.app_version)
+        if not isdir(os.path.dirname(record_path)):
+            os.makedirs(os.path.dirname(record_path))
+        shutil.copy2(join(self.seal_path, delta.RELEASE_NAME), record_path)
+        self.tracer.message("The release manifest of %s %s is stored at %s"
+                            % (self.app_name, self.app_version,
+                               record_path))
+
+        if isdir(app_output):
+            shutil.rmtree(app_output)
+        os.rename(self.seal_path, app_output)
+        self.tracer.message("Staging: %s" % (self.stage_stats.report()))
+        self.tracer.message("The pre-sealed package is prepared.")
+
+    def target_name(self):
+        """The target as <platform>-<arch>-py<version>, see matrix."""
+        return "%s-%d-py%d" % (self.target_platform, self.target_arch,
+                               self.pyver)
+
+    def release_record(self, app_name, app_version, target=None):
+        """The recorded release manifest of an app version.
+
+        Releases are recorded per target, so that the targets of a matrix
+        don't replace the records of each other.
+
+        Parameters
+        ----------
+        app_name : string
+            the name of the app.
+        app_version : string
+            the version of the app.
+        target : string
+            the target of the release, the target of the sealer if None.
+
+        Returns
+        -------
+        The path of the release manifest under PYSEALER_RELEASE_PATH.
+        """
+        if target is None:
+            target = self.target_name()
+        return join(pysealer.PYSEALER_RELEASE_PATH, app_name, target,
+                    app_version+".json")
+
+    def build_time(self):
+        """The time stamp of the generated scripts."""
+        if self.reproducible:
+            # the UTC time without a time zone, as in python 2
+            return str(datetime.datetime(1970, 1, 1)+datetime.timedelta(
+                seconds=compiler.source_date_epoch()))
+        return str(datetime.datetime.now())
+
+    @traced
     def makeself(self, makeself=None):
         """Use Makeself for building up installer."""
         if makeself is None:
             # Assume you have a environment value as makeself
             makeself = os.environ["makeself"]
 
-        with open(self.config_path, mode="r") as f:
-            config_dict = yaml.load(f)
+        config_dict = utils.load_config(self.config_path)
+
+        app_name = config_dict["app_name"][0]
+        app_version = config_dict["app_version"][0]
+        app_author = config_dict["app_author"][0]
+        self.tracer.call([makeself, "--notemp",
+                          join(self.output_path, app_name),
+                          join(self.output_path, app_name+".run"),
+                          app_name+" "+app_version+" by "+app_author,
+                          "./build.sh"])
+        self.tracer.message("The installer is built.")
+
+    @traced
+    def build_installer(self, codec="gzip", level=6, workers=None):
+        """Build the installer by the native self-extracting builder.
+
+        Parameters
+        ----------
+        codec : string
+            "gzip", "bzip2", "xz" or "none".
+        level : int
+            the compression level of the codec.
+        workers : int
+            the number of compressing threads, use all CPU cores if None.
+        """
+        config_dict = utils.load_config(self.config_path)
 
         app_name = config_dict["app_name"][0]
         app_version = config_dict["app_version"][0]
         app_author = config_dict["app_author"][0]
-        sp.check_call([makeself, "--notemp",
-                       join(self.app_path, app_name),
-                       join(self.app_path, app_name+".run"),
-                       app_name+" "+app_version+" by "+app_author,
-                       "./build.sh"])
-        print ("[MESSAGE] The installer is built.")
+        installer.build_installer(
+            join(self.output_path, app_name),
+            join(self.output_path, app_name+".run"),
+            label=app_name+" "+app_version+" by "+app_author,
+            app_name=app_name, startup="./build.sh",
+            codec=codec, level=level, workers=workers,
+            mtime=compiler.source_date_epoch() if self.reproducible
+            else None)
+        self.tracer.message("The installer is built.")
+
+    @traced
+    def measure_codecs(self, codec_list=None, workers=None):
+        """Measure installer size and decompression time of codecs.
+
+        Parameters
+        ----------
+        codec_list : list
+            (codec, level) tuples, all available codecs at level 6 if None.
+        workers : int
+            the number of compressing threads, use all CPU cores if None.
+
+        Returns
+        -------
+        A list of measurements from installer.measure_codecs().
+        """
+        config_dict = utils.load_config(self.config_path)
+
+        results = installer.measure_codecs(
+            join(self.output_path, config_dict["app_name"][0]),
+            codec_list=codec_list, workers=workers)
+        for result in results:
+            self.tracer.message("%s level %d: %d bytes, compressed in %.2fs, "
+                                "decompressed in %.2fs"
+                                % (result["codec"], result["level"],
+                                   result["size"], result["compress_time"],
+                                   result["decompress_time"]))
+
+        return results
+
+    @traced
+    def build_delta(self, from_version, codec="gzip", level=6,
+                    workers=None, target=None):
+        """Build a delta package from an earlier version of the sealed app.
+
+        The earlier release manifest is taken from PYSEALER_RELEASE_PATH,
+        the delta installer is written next to the full installer and
+        is run in the installed app folder. Run it after seal_app of the
+        current app_version.
+
+        Parameters
+        ----------
+        from_version : string
+            the app_version of the earlier release.
+        codec : string
+            "gzip", "bzip2", "xz" or "none".
+        level : int
+            the compression level of the codec.
+        workers : int
+            the number of compressing threads, use all CPU cores if None.
+        target : string
+            the target of the earlier release as
+            <platform>-<arch>-py<version>, the target of the sealer if
+            None.
+
+        Returns
+        -------
+        The path of the delta installer.
+        """
+        config_dict = utils.load_config(self.config_path)
+        app_name = config_dict["app_name"][0]
+        app_version = config_dict["app_version"][0]
+        if target is None:
+            target = self.target_name()
+
+        old_release_path = self.release_record(app_name, from_version,
+                                               target)
+        if not isfile(old_release_path):
+            raise IOError("The release %s of %s for %s is not recorded."
+                          % (from_version, app_name, target))
+        old_release = delta.load_release(old_release_path)
+        if old_release.get("app_version") != from_version:
+            raise IOError("The release record %s is not of %s."
+                          % (old_release_path, from_version))
+        new_release_path = join(self.output_path, app_name,
+                                delta.RELEASE_NAME)
+        if not isfile(new_release_path) or delta.load_release(
+                new_release_path).get("app_version") != app_version:
+            raise IOError("The sealed app at %s is not of %s, run seal_app "
+                          "first." % (join(self.output_path, app_name),
+                                      app_version))
+
+        delta_name = "%s-%s-to-%s" % (app_name, from_version, app_version)
+        delta_path = join(self.output_path, delta_name+".delta")
+        if isdir(delta_path):
+            shutil.rmtree(delta_path)
+        try:
+            delta_dict = delta.build_delta(
+                old_release, join(self.output_path, app_name), delta_path)
+            installer.build_installer(
+                delta_path, join(self.output_path, delta_name+".run"),
+                label="%s %s to %s update" % (app_name, from_version,
+                                              app_version),
+                app_name=delta.DELTA_FOLDER, startup="./apply.sh",
+                codec=codec, level=level, workers=workers,
+                mtime=compiler.source_date_epoch() if self.reproducible
+                else None)
+        finally:
+            if isdir(delta_path):
+                shutil.rmtree(delta_path)
+
+        self.tracer.message("The delta package is built at %s: %d files "
+                            "added, %d files changed, %d files removed, "
+                            "%d bytes."
+                            % (join(self.output_path, delta_name+".run"),
+                               len(delta_dict["added"]),
+                               len(delta_dict["changed"]),
+                               len(delta_dict["removed"]),
+                               os.path.getsize(join(self.output_path,
+                                                    delta_name+".run"))))
+
+        return join(self.output_path, delta_name+".run")
+
+    @traced
+    def verify_app(self, installer_mode="native", runs=None, budgets=None,
+                   commands=None, keep=False):
+        """Install the sealed app into a scratch folder and run its scripts.
+
+        Every script of app_list is run several times, the cold and warm
+        start latency, the peak RSS and the import count are measured and
+        checked against the budgets, see pysealer.verify. The arguments
+        default to the verify section of .pysealer_config.yml.
+
+        Parameters
+        ----------
+        installer_mode : string
+            "native" or "makeself": install by the installer of the app.
+            "none": copy the sealed app and run its build script.
+        runs : int
+            the runs per script, the first one is the cold start.
+        budgets : dict
+            metric to budget, and script name to its own budgets.
+        commands : dict
+            script name to its arguments as a string.
+        keep : bool
+            keep the scratch install at pysealer_build/verify, it's kept
+            anyway if the verification fails.
+
+        Returns
+        -------
+        The summary of the scripts, also saved at
+        pysealer_build/verify.json.
+        """
+        if installer_mode not in ["native", "makeself", "none"]:
+            raise ValueError("The installer mode %s is not supported."
+                             % (installer_mode))
+        config_dict = utils.load_config(self.config_path)
+        verify_config = config_dict.get("verify") or {}
+        if runs is None:
+            runs = verify_config.get("runs", verify.DEFAULT_RUNS)
+        if budgets is None:
+            budgets = verify_config.get("budgets")
+        if commands is None:
+            commands = verify_config.get("commands") or {}
+        timeout = verify_config.get("timeout", verify.DEFAULT_TIMEOUT)
+        app_name = config_dict["app_name"][0]
+
+        install_path = join(self.build_path, "verify")
+        if isdir(install_path):
+            shutil.rmtree(install_path)
+        installer_path = join(self.output_path, app_name+".run")
+        if installer_mode == "native":
+            self.tracer.call(["sh", installer_path, install_path])
+        elif installer_mode == "makeself":
+            self.tracer.call(["sh", installer_path, "--target",
+                              install_path])
+        else:
+            # the build script may modify the files in place
+            staging.stage_tree(join(self.output_path, app_name),
+                               install_path, mode="reflink")
+            self.tracer.call(["./build.sh"], cwd=install_path)
+        self.tracer.message("The sealed app is installed at %s"
+                            % (install_path))
+
+        env = dict(os.environ)
+        env.pop("PYSEALER_IMPORTTIME", None)
+        report = {}
+        failures = []
+        log_path = join(self.build_path, "verify.log")
+        with open(log_path, mode="wb") as log_file:
+            for app_item in config_dict["app_list"]:
+                for app_script in config_dict["app_list"][app_item]:
+                    command = [join(install_path, app_script+".sh")] + \
+                        shlex.split(str(commands.get(app_script) or ""))
+                    results = []
+                    for _ in range(runs):
+                        with self.tracer.span("verify_run",
+                                              script=app_script):
+                            results.append(verify.run_measured(
+                                command, install_path, env=env,
+                                timeout=timeout, log_file=log_file))
+                    summary = verify.summarize(results)
+                    summary["imports"] = self.count_imports(
+                        command, install_path, app_script, env, timeout,
+                        log_file)
+                    report[app_script] = summary
+
+                    for index, result in enumerate(results):
+                        if result["timed_out"]:
+                            failures.append("%s timed out in run %d."
+                                            % (app_script, index+1))
+                        elif result["exit_code"] != 0:
+                            failures.append("%s exited with %d in run %d."
+                                            % (app_script,
+                                               result["exit_code"],
+                                               index+1))
+                    failures += [
+                        "%s: %s." % (app_script, violation)
+                        for violation in verify.check_budgets(
+                            summary, verify.script_budgets(budgets,
+                                                           app_script))]
+                    self.tracer.message(
+                        "%s: cold start %s, warm start %s, peak RSS %s, "
+                        "%s imports"
+                        % (app_script,
+                           verify.format_metric("cold_start",
+                                                summary["cold_start"]),
+                           verify.format_metric("warm_start",
+                                                summary["warm_start"])
+                           if summary["warm_start"] is not None else "-",
+                           verify.format_metric("peak_rss",
+                                                summary["peak_rss"]),
+                           summary["imports"]
+                           if summary["imports"] is not None else "-"))
+
+        with open(join(self.build_path, "verify.json"), mode="w") as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+        if failures:
+            raise RuntimeError(
+                "The sealed app failed the verification, the install is "
+                "kept at %s and the output is at %s:\n%s"
+                % (install_path, log_path, "\n".join(failures)))
+        if not keep:
+            shutil.rmtree(install_path)
+        self.tracer.message("The sealed app is verified, the report is at "
+                            "%s" % (join(self.build_path, "verify.json")))
+
+        return report
+
+    def count_imports(self, command, install_path, app_script, env,
+                      timeout, log_file):
+        """Count the modules that a run of an app script imports.
+
+        The run records its import time log, see the app scripts.
+
+        Returns
+        -------
+        The number of imported modules, None for python 2.
+        """
+        if self.pyver != 3:
+            return None
+        env = dict(env, PYSEALER_IMPORTTIME="1")
+        log_folder = join(install_path, "importtime")
+        before = set(os.listdir(log_folder)) if isdir(log_folder) else set()
+        verify.run_measured(command, install_path, env=env, timeout=timeout,
+                            log_file=log_file)
+        logs = [name for name in (os.listdir(log_folder)
+                                  if isdir(log_folder) else [])
+                if name.startswith(app_script+"-") and name not in before]
+        if not logs:
+            return None
+        return launcher.importtime_report(join(log_folder, logs[0]))[
+            "modules"]
+
+    def build_key(self, options):
+        """Hash the inputs of a build for the build cache.
+
+        The inputs are the PySealer version, the host and target, the
+        host installer, the app files after the ignore rules, the
+        configuration and the sealing options. The packages that conda
+        and pip resolve are not inputs, pin their versions in the
+        configuration or use env_mode="lock" to share builds safely.
+        The app files are hashed by the inventory of the build, which the
+        stages reuse.
+
+        Parameters
+        ----------
+        options : dict
+            the options of seal_app() and the installer.
+
+        Returns
+        -------
+        The SHA-256 checksum of the inputs.
+        """
+        if not isfile(self.config_path):
+            raise IOError("The build cache needs the app configuration.")
+
+        sha = hashlib.sha256()
+
+        def update(*items):
+            for item in items:
+                sha.update((str(item)+"\n").encode("utf-8"))
+
+        update(__about__.__version__, self.host_platform, self.host_arch,
+               self.target_platform, self.target_arch, self.pyver,
+               self.reproducible, json.dumps(options, sort_keys=True),
+               manifest.file_hash(self.host_conda, algorithm="sha256"))
+        if self._target_conda is not None:
+            update(manifest.file_hash(self._target_conda,
+                                      algorithm="sha256"))
+        else:
+            update(self.target_downurl)
+        if self.reproducible:
+            update(compiler.source_date_epoch())
+        for file_path in [self.config_path,
+                          join(self.app_path, "requirements.txt")]:
+            update(manifest.file_hash(file_path, algorithm="sha256")
+                   if isfile(file_path) else None)
+
+        app_inventory = self.get_inventory()
+        for rel_path in self.list_app_files():
+            update(rel_path.replace(os.sep, "/"),
+                   app_inventory.file_hash(rel_path))
+
+        return sha.hexdigest()
+
+    def cached_artifacts(self):
+        """The installer, its manifest and the release manifest."""
+        config_dict = utils.load_config(self.config_path)
+        app_name = config_dict["app_name"][0]
+        app_version = config_dict["app_version"][0]
+        return [join(self.output_path, app_name+".run"),
+                join(self.output_path, app_name+".run.manifest.json"),
+                self.release_record(app_name, app_version)]
+
+    def pull_build(self, cache, key):
+        """Fetch the artifacts of a build from the build cache.
+
+        Returns
+        -------
+        True if the build is cached.
+        """
+        if not isdir(self.output_path):
+            os.makedirs(self.output_path)
+        tmp_path = tempfile.mkdtemp(dir=self.output_path)
+        try:
+            with self.tracer.span("pull_build", key=key):
+                names = cache.get(key, tmp_path)
+            if names is None:
+                self.tracer.message("The build %s is not cached." % (key))
+                return False
+            for path in self.cached_artifacts():
+                if not isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                shutil.move(join(tmp_path, os.path.basename(path)), path)
+        finally:
+            shutil.rmtree(tmp_path)
+
+        os.chmod(self.cached_artifacts()[0], 0o755)
+        self.tracer.message("The installer is pulled from the build cache "
+                            "by the key %s." % (key))
+        return True
+
+    def push_build(self, cache, key):
+        """Store the artifacts of a build in the build cache."""
+        with self.tracer.span("push_build", key=key):
+            cache.put(key, self.cached_artifacts())
+        self.tracer.message("The installer is pushed to the build cache by "
+                            "the key %s." % (key))
+
+    def run(self, workers=None, wheelhouse=True, env_mode="solve",
+            module_archive=False, launcher_mode="default",
+            installer_mode="native", makeself=None, codec="gzip",
+            compile_workers=None, build_cache=None, optimize=None,
+            remove_dead=False, verify_app=False):
+        """Seal the app by running the independent stages concurrently.
+
+        The stages and their dependencies:
+
+            fetch_host   -> init_build -> config_environment -> seal_app
+            init_build   -> stage_assets -> prepare_app
+            config_environment -> compile_app -> prepare_app
+            prepare_app  -> optimize_app -> seal_app (if enabled)
+            prepare_app  -> seal_app (otherwise)
+            fetch_target -> seal_app (only with env_mode="lock")
+            seal_app     -> installer -> verify_app (if enabled)
+
+        The data files are staged while the environment is configured,
+        prepare_app only stages the compiled files. The target installer
+        is fetched alongside in every mode.
+
+        When a stage fails no new stage starts, the running subprocesses
+        are terminated and the error is raised.
+
+        With a build cache, the installer of the same inputs is pulled
+        from the cache instead of sealing the app, see build_key().
+
+        Parameters
+        ----------
+        workers : int
+            the maximum number of concurrent stages, no limit if None.
+        wheelhouse, env_mode, module_archive, launcher_mode :
+            see seal_app().
+        installer_mode : string
+            "native": build the installer by build_installer().
+            "makeself": build the installer by makeself().
+            "none": only prepare the sealed app.
+        makeself : string
+            the makeself script, see makeself().
+        codec : string
+            the codec of the native installer.
+        compile_workers : int
+            the number of compiling processes, see compile_app().
+        build_cache : string
+            a folder or an http(s) url of a build cache, only with the
+            native installer.
+        optimize : int
+            the optimization level of the app modules, see
+            optimize_app(). The modules are not optimized if None.
+        remove_dead : bool
+            remove the app modules that no app script reaches, see
+            optimize_app().
+        verify_app : bool
+            install the sealed app into a scratch folder and check its
+            scripts against the budgets, see verify_app(). It fails the
+            build if a script fails or exceeds a budget.
+
+        Returns
+        -------
+        A dictionary of stage name to its duration in seconds, empty if
+        the installer is pulled from the build cache.
+        """
+        if installer_mode not in ["native", "makeself", "none"]:
+            raise ValueError("The installer mode %s is not supported."
+                             % (installer_mode))
+        if build_cache is not None and installer_mode != "native":
+            raise ValueError("The build cache needs the native installer.")
+
+        # the app is walked once for the build key and the stages
+        self.reset_inventory()
+
+        # a shared installer is downloaded once by the host fetch
+        same_conda = self.host_downurl == self.target_downurl
+
+        if build_cache is not None:
+            cache = buildcache.open_cache(build_cache)
+            self.fetch_conda(host=True, target=True)
+            cache_key = self.build_key(
+                {"wheelhouse": wheelhouse, "env_mode": env_mode,
+                 "module_archive": module_archive,
+                 "launcher_mode": launcher_mode, "codec": codec,
+                 "optimize": optimize, "remove_dead": remove_dead})
+            if self.pull_build(cache, cache_key):
+                return {}
+
+        tasks = [pipeline.Task(
+            "fetch_host", lambda: self.fetch_conda(
+                host=True, target=same_conda))]
+        seal_deps = ["config_environment", "prepare_app"]
+        if not same_conda:
+            tasks.append(pipeline.Task(
+                "fetch_target",
+                lambda: self.fetch_conda(host=False, target=True)))
+            # only the lockfile mode ships the target installer
+            if env_mode == "lock":
+                seal_deps.append("fetch_target")
+        tasks += [
+            pipeline.Task("init_build",
+                          lambda: self.init_build(rescan=False),
+                          ["fetch_host"]),
+            pipeline.Task("config_environment", self.config_environment,
+                          ["init_build"]),
+            pipeline.Task("stage_assets", self.stage_assets,
+                          ["init_build"]),
+            # conda install may replace the interpreter that compiles
+            pipeline.Task("compile_app",
+                          lambda: self.compile_app(workers=compile_workers),
+                          ["config_environment"]),
+            pipeline.Task("prepare_app",
+                          lambda: self.prepare_app(assets=False),
+                          ["compile_app", "stage_assets"])]
+        if optimize is not None or remove_dead:
+            tasks.append(pipeline.Task(
+                "optimize_app", lambda: self.optimize_app(
+                    level=optimize or 0, remove_dead=remove_dead,
+                    workers=compile_workers), ["prepare_app"]))
+            seal_deps[seal_deps.index("prepare_app")] = "optimize_app"
+        tasks.append(pipeline.Task("seal_app", lambda: self.seal_app(
+            wheelhouse=wheelhouse, env_mode=env_mode,
+            module_archive=module_archive,
+            launcher_mode=launcher_mode), seal_deps))
+        if installer_mode == "native":
+            tasks.append(pipeline.Task(
+                "installer", lambda: self.build_installer(codec=codec),
+                ["seal_app"]))
+        elif installer_mode == "makeself":
+            tasks.append(pipeline.Task(
+                "installer", lambda: self.makeself(makeself), ["seal_app"]))
+        if verify_app:
+            tasks.append(pipeline.Task(
+                "verify_app",
+                lambda: self.verify_app(installer_mode=installer_mode),
+                ["installer" if installer_mode != "none" else "seal_app"]))
+
+        self.tracer.reset()
+        with self.tracer.span("pipeline"):
+            start_time = time.time()
+            durations = pipeline.run_tasks(tasks, workers=workers,
+                                           on_cancel=self.tracer.cancel)
+            total_time = time.time()-start_time
+
+        if build_cache is not None:
+            self.push_build(cache, cache_key)
+
+        length, path = pipeline.critical_path(tasks, durations)
+        for task in tasks:
+            self.tracer.message("Stage %s took %.2fs"
+                                % (task.name, durations[task.name]))
+        self.tracer.message("The app is sealed in %.2fs, the critical path "
+                            "%s takes %.2fs."
+                            % (total_time, " -> ".join(path), length))
+
+        return durations
@@ -0,0 +1,201 @@
+"""Zero-copy staging of files and folders.
+
+Files are materialized by a reflink (copy-on-write clone) where the file
+system supports it, then by a hard link, and are only copied as the last
+resort.
+
+A hard link shares the file with its source, so only files that are never
+written in place are hard linked: the outputs of the build and read-only
+inputs. Their writers replace them by a new file and a rename. Sources of
+the user, e.g., the data files of the app, may be edited in place and are
+staged by unlinked_mode().
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+from __future__ import print_function
+import os
+from os.path import isdir, islink, join
+import shutil
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ioctl request of Linux to clone a file, _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+STAGE_MODES = ["auto", "reflink", "hardlink", "copy"]
+
+# devices that are known to not support reflink
+NO_REFLINK_DEVICES = set()
+
+
+class StageStats(object):
+    """Counters of the staged files."""
+
+    def __init__(self, tracer=None):
+        """Init all counters to zero.
+
+        Parameters
+        ----------
+        tracer : instrument.Tracer
+            the tracer that aggregates the counters as well.
+        """
+        self.tracer = tracer
+        self.num_files = 0
+        self.bytes_copied = 0
+        self.bytes_linked = 0
+        self.bytes_reflinked = 0
+
+    def add(self, method, num_bytes):
+        """Count a staged file by the method that materialized it."""
+        self.num_files += 1
+        if method == "copy":
+            self.bytes_copied += num_bytes
+        elif method == "hardlink":
+            self.bytes_linked += num_bytes
+        else:
+            self.bytes_reflinked += num_bytes
+
+        if self.tracer is not None:
+            self.tracer.count("files_staged")
+            self.tracer.count({"copy": "bytes_copied",
+                               "hardlink": "bytes_linked"}.get(
+                                   method, "bytes_reflinked"), num_bytes)
+
+    def report(self):
+        """Summary of the counters."""
+        return ("%d files are staged, %d bytes copied, %d bytes hard linked, "
+                "%d bytes reflinked." % (self.num_files, self.bytes_copied,
+                                         self.bytes_linked,
+                                         self.bytes_reflinked))
+
+
+def unlinked_mode(mode):
+    """The staging mode of a file that must not be hard linked.
+
+    "auto" falls back to a copy instead of a hard link, "hardlink" copies.
+    """
+    if mode not in STAGE_MODES:
+        raise ValueError("The staging mode %s is not supported." % (mode))
+    return {"auto": "reflink", "hardlink": "copy"}.get(mode, mode)
+
+
+def reflink(src_path, dst_path):
+    """Clone a file by the FICLONE ioctl.
+
+    Returns
+    -------
+    True if the file is cloned, False if it's not supported.
+    """
+    src_dev = os.stat(src_path).st_dev
+    if fcntl is None or src_dev in NO_REFLINK_DEVICES:
+        return False
+
+    with open(src_path, mode="rb") as src_file:
+        with open(dst_path, mode="wb") as dst_file:
+            try:
+                fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+            except (IOError, OSError):
+                cloned = False
+            else:
+                cloned = True
+    if not cloned:
+        os.remove(dst_path)
+        NO_REFLINK_DEVICES.add(src_dev)
+        return False
+
+    shutil.copystat(src_path, dst_path)
+    return True
+
+
+def stage_file(src_path, dst_path, mode="auto", stats=None):
+    """Materialize a file at the destination.
+
+    Parameters
+    ----------
+    src_path : string
+        the source file.
+    dst_path : string
+        the destination file or folder, an existing file is replaced.
+    mode : string
+        "auto"    : reflink, hard link and copy, the first that works.
+        "reflink" : reflink or copy.
+        "hardlink": hard link or copy.
+        "copy"    : copy.
+    stats : StageStats
+        the counters to update.
+
+    Returns
+    -------
+    The method that materializes the file.
+    """
+    if mode not in STAGE_MODES:
+        raise ValueError("The staging mode %s is not supported." % (mode))
+
+    if isdir(dst_path):
+        dst_path = join(dst_path, os.path.basename(src_path))
+    if os.path.lexists(dst_path):
+        os.remove(dst_path)
+
+    method = "copy"
+    if mode in ["auto", "reflink"] and reflink(src_path, dst_path):
+        method = "reflink"
+    elif mode in ["auto", "hardlink"]:
+        try:
+            os.link(src_path, dst_path)
+            method = "hardlink"
+        except OSError:
+            pass
+    if method == "copy":
+        shutil.copy2(src_path, dst_path)
+
+    if stats is not None:
+        stats.add(method, os.path.getsize(dst_path))
+
+    return method
+
+
+def stage_tree(src_path, dst_path, mode="auto", stats=None, ignore=None,
+               exclude=()):
+    """Materialize a folder at the destination.
+
+    Symbolic links are recreated, the rest works like shutil.copytree.
+
+    Parameters
+    ----------
+    src_path : string
+        the source folder.
+    dst_path : string
+        the destination folder, must not exist.
+    mode : string
+        see stage_file().
+    stats : StageStats
+        the counters to update.
+    ignore : callable
+        a shutil.copytree style ignore function.
+    exclude : set
+        relative file paths that are not staged.
+    """
+    os.makedirs(dst_path)
+    for root, dirs, files in os.walk(src_path):
+        rel_root = os.path.relpath(root, src_path)
+        ignored = ignore(root, dirs+files) if ignore is not None else ()
+        dirs[:] = [name for name in dirs if name not in ignored]
+        for name in dirs+files:
+            if name in ignored:
+                continue
+            rel_path = os.path.normpath(join(rel_root, name))
+            src_file = join(src_path, rel_path)
+            dst_file = join(dst_path, rel_path)
+            if islink(src_file):
+                os.symlink(os.readlink(src_file), dst_file)
+            elif isdir(src_file):
+                os.makedirs(dst_file)
+            elif rel_path not in exclude:
+                stage_file(src_file, dst_file, mode=mode, stats=stats)
+        # do not walk into linked folders
+        dirs[:] = [name for name in dirs if not islink(join(root, name))]
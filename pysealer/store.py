@@ -0,0 +1,342 @@
+"""Content-addressed artifact store shared by all builds of a host.
+
+Installers, conda packages, wheels and compiled bytecode are stored once
+under PYSEALER_STORE_PATH by their SHA-256 checksum:
+
+    store/objects/<sha[:2]>/<sha>      read-only content
+    store/index.json                   sizes, last use and named refs
+
+Builds hard link the objects instead of copying them. A ref names an
+object by what produced it, e.g., the url of an installer or the source
+checksum and interpreter of a compiled file. The store is kept under a
+size cap by evicting the least recently used objects:
+
+    python -m pysealer.store gc [--max-size 20G]
+    python -m pysealer.store stats
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+from __future__ import print_function
+import os
+from os.path import isdir, isfile, join
+import sys
+import json
+import time
+import argparse
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import pysealer
+from pysealer import manifest
+from pysealer import staging
+
+INDEX_NAME = "index.json"
+LOCK_NAME = "lock"
+# the default size cap, overridden by PYSEALER_STORE_MAX, e.g., "50G"
+DEFAULT_MAX_SIZE = "20G"
+
+
+def parse_size(size):
+    """Parse a size like 512M or 20G to bytes."""
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+    size = str(size).strip().upper().rstrip("B")
+    try:
+        if size and size[-1] in units:
+            return int(float(size[:-1])*units[size[-1]])
+        return int(size)
+    except ValueError:
+        raise ValueError("The size %s is not supported." % (size))
+
+
+class ArtifactStore(object):
+    """A content-addressed store with LRU eviction.
+
+    Changes of the index are kept in memory and merged into the index on
+    disk by commit(), so that several builds can share the store.
+    """
+
+    def __init__(self, store_path=None, max_size=None):
+        """Init the store.
+
+        Parameters
+        ----------
+        store_path : string
+            the store folder, PYSEALER_STORE_PATH if None.
+        max_size : int or string
+            the size cap in bytes or with a unit, PYSEALER_STORE_MAX or
+            DEFAULT_MAX_SIZE if None.
+        """
+        self.store_path = store_path if store_path is not None else \
+            pysealer.PYSEALER_STORE_PATH
+        self.object_path = join(self.store_path, "objects")
+        if not isdir(self.object_path):
+            os.makedirs(self.object_path)
+        if max_size is None:
+            max_size = os.environ.get("PYSEALER_STORE_MAX",
+                                      DEFAULT_MAX_SIZE)
+        self.max_size = parse_size(max_size)
+
+        self.index = self.load_index()
+        self.touched = set()
+        self.new_refs = {}
+
+    def load_index(self):
+        """Read the index on disk."""
+        index_path = join(self.store_path, INDEX_NAME)
+        if isfile(index_path):
+            try:
+                with open(index_path, mode="r") as f:
+                    return json.load(f)
+            except ValueError:
+                print ("[MESSAGE] The store index at %s is corrupted, "
+                       "rebuilt by gc." % (index_path))
+        return {"objects": {}, "refs": {}}
+
+    def lock(self):
+        """Take the exclusive lock of the store, returns the lock file."""
+        lock_file = open(join(self.store_path, LOCK_NAME), mode="a")
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        return lock_file
+
+    def object_file(self, digest):
+        """The path of an object."""
+        return join(self.object_path, digest[:2], digest)
+
+    def has(self, digest):
+        """Check if an object is stored."""
+        return digest in self.index["objects"] and \
+            isfile(self.object_file(digest))
+
+    def touch(self, digest):
+        """Mark an object as used now."""
+        self.index["objects"][digest]["last_used"] = time.time()
+        self.touched.add(digest)
+
+    def find(self, ref):
+        """Get the object of a ref, None if it's not stored."""
+        digest = self.index["refs"].get(ref)
+        if digest is None or not self.has(digest):
+            return None
+        self.touch(digest)
+        return digest
+
+    def put(self, file_path, kind, ref=None, link=True):
+        """Store a file.
+
+        Parameters
+        ----------
+        file_path : string
+            the file to store.
+        kind : string
+            "installer", "conda_pkg", "wheel" or "bytecode".
+        ref : string
+            a name of the object.
+        link : bool
+            replace the file by a hard link to the object, so that the
+            content is only once on disk. The linked file is read-only.
+
+        Returns
+        -------
+        The checksum of the file.
+        """
+        digest = manifest.file_hash(file_path, algorithm="sha256")
+        object_file = self.object_file(digest)
+        if not isfile(object_file):
+            if not isdir(os.path.dirname(object_file)):
+                os.makedirs(os.path.dirname(object_file))
+            # a private copy that no build can modify through a hard link
+            tmp_file = object_file+".%d.tmp" % (os.getpid())
+            staging.stage_file(file_path, tmp_file, mode="reflink")
+            os.chmod(tmp_file, 0o444)
+            os.rename(tmp_file, object_file)
+        self.index["objects"][digest] = {
+            "size": os.path.getsize(object_file), "kind": kind,
+            "last_used": time.time()}
+        self.touched.add(digest)
+        if ref is not None:
+            self.index["refs"][ref] = digest
+            self.new_refs[ref] = digest
+
+        if link and not os.path.samefile(file_path, object_file):
+            tmp_file = file_path+".store"
+            try:
+                os.link(object_file, tmp_file)
+            except OSError:
+                # the store is on another file system
+                pass
+            else:
+                os.rename(tmp_file, file_path)
+
+        return digest
+
+    def get(self, digest, dst_path):
+        """Hard link an object to the destination.
+
+        Returns
+        -------
+        True if the object is stored and linked.
+        """
+        if not self.has(digest):
+            return False
+        staging.stage_file(self.object_file(digest), dst_path,
+                           mode="hardlink")
+        self.touch(digest)
+        return True
+
+    def total_size(self):
+        """The size of all stored objects."""
+        return sum(entry["size"]
+                   for entry in self.index["objects"].values())
+
+    def evict(self, max_size=None):
+        """Remove the least recently used objects until the cap is met.
+
+        Returns
+        -------
+        The number of bytes removed.
+        """
+        if max_size is None:
+            max_size = self.max_size
+        objects = self.index["objects"]
+        total = self.total_size()
+        removed = 0
+        for digest in sorted(objects,
+                             key=lambda digest: objects[digest]["last_used"]):
+            if total <= max_size:
+                break
+            size = objects.pop(digest)["size"]
+            if isfile(self.object_file(digest)):
+                os.remove(self.object_file(digest))
+            total -= size
+            removed += size
+        self.index["refs"] = dict(
+            (ref, digest) for ref, digest in self.index["refs"].items()
+            if digest in objects)
+        return removed
+
+    def commit(self):
+        """Merge the changes into the index on disk and apply the cap.
+
+        Returns
+        -------
+        The number of bytes evicted.
+        """
+        lock_file = self.lock()
+        try:
+            disk_index = self.load_index()
+            for digest in self.touched:
+                entry = self.index["objects"].get(digest)
+                if entry is None or not isfile(self.object_file(digest)):
+                    continue
+                disk_entry = disk_index["objects"].get(digest)
+                if disk_entry is None or \
+                        disk_entry["last_used"] < entry["last_used"]:
+                    disk_index["objects"][digest] = entry
+            disk_index["refs"].update(self.new_refs)
+            self.index = disk_index
+            evicted = self.evict()
+            self.save_index()
+        finally:
+            lock_file.close()
+        self.touched = set()
+        self.new_refs = {}
+        return evicted
+
+    def save_index(self):
+        """Write the index, the caller holds the lock."""
+        index_path = join(self.store_path, INDEX_NAME)
+        with open(index_path+".tmp", mode="w") as f:
+            json.dump(self.index, f, sort_keys=True)
+        os.rename(index_path+".tmp", index_path)
+
+    def gc(self, max_size=None):
+        """Repair the index and evict to the size cap.
+
+        Objects that are not indexed, index entries without an object and
+        left over temporary files are removed.
+
+        Returns
+        -------
+        A dictionary of the removed and remaining bytes and objects.
+        """
+        lock_file = self.lock()
+        try:
+            self.index = self.load_index()
+            objects = self.index["objects"]
+            removed = 0
+            num_removed = 0
+            on_disk = set()
+            for root, dirs, files in os.walk(self.object_path):
+                for file_name in files:
+                    file_path = join(root, file_name)
+                    if file_name.endswith(".tmp") or \
+                            file_name not in objects:
+                        removed += os.path.getsize(file_path)
+                        num_removed += 1
+                        os.remove(file_path)
+                    else:
+                        on_disk.add(file_name)
+            for digest in list(objects):
+                if digest not in on_disk:
+                    del objects[digest]
+            num_objects = len(objects)
+            removed += self.evict(
+                self.max_size if max_size is None else max_size)
+            num_removed += num_objects-len(objects)
+            self.save_index()
+        finally:
+            lock_file.close()
+
+        return {"removed_bytes": removed,
+                "removed_objects": num_removed,
+                "total_bytes": self.total_size(),
+                "total_objects": len(self.index["objects"])}
+
+    def stats(self):
+        """The number and size of objects per kind."""
+        kinds = {}
+        for entry in self.index["objects"].values():
+            kind = kinds.setdefault(entry["kind"], {"objects": 0,
+                                                    "bytes": 0})
+            kind["objects"] += 1
+            kind["bytes"] += entry["size"]
+        return kinds
+
+
+def main():
+    """Maintain the store from the command line."""
+    parser = argparse.ArgumentParser(
+        description="The PySealer artifact store.")
+    parser.add_argument("command", choices=["gc", "stats"])
+    parser.add_argument("--max-size",
+                        help="the size cap, e.g., 20G, PYSEALER_STORE_MAX "
+                             "if not given.")
+    parser.add_argument("--store-path",
+                        help="the store folder, ~/.pysealer/store if not "
+                             "given.")
+    args = parser.parse_args()
+
+    artifact_store = ArtifactStore(args.store_path, args.max_size)
+    if args.command == "gc":
+        result = artifact_store.gc()
+        print ("[MESSAGE] %d objects, %d bytes are removed, %d objects, "
+               "%d bytes remain."
+               % (result["removed_objects"], result["removed_bytes"],
+                  result["total_objects"], result["total_bytes"]))
+    else:
+        kinds = artifact_store.stats()
+        for kind in sorted(kinds):
+            print ("[MESSAGE] %s: %d objects, %d bytes"
+                   % (kind, kinds[kind]["objects"], kinds[kind]["bytes"]))
+        print ("[MESSAGE] %d of %d bytes are used."
+               % (artifact_store.total_size(), artifact_store.max_size))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,14 @@
+"""Shared setup of the PySealer tests.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+import os
+import tempfile
+
+# pysealer creates its folders under HOME when it's imported
+os.environ["HOME"] = tempfile.mkdtemp(prefix="pysealer-test-")
+
+# a manual end-to-end script, see make io-test
+collect_ignore = ["io_test.py"]
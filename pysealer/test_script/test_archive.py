@@ -0,0 +1,130 @@
+"""Testing the module archive of sealed apps.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+import os
+import sys
+import shutil
+import subprocess
+
+import pysealer
+from pysealer import archive
+from pysealer import compiler
+from pysealer import sealer
+from pysealer import benchmark
+
+SOURCES = {
+    os.path.join("pkg", "__init__.py"): "",
+    os.path.join("pkg", "mod.py"): "VALUE = 'pkg'\n",
+    os.path.join("ns", "mod.py"): "VALUE = 'ns'\n",
+    os.path.join("data", "__init__.py"): "",
+    os.path.join("data", "table.csv"): "a,b\n",
+}
+
+IMPORT_SCRIPT = """
+import sys
+from pysealer import archive
+archive.install(sys.argv[1], sys.argv[2])
+sys.path.insert(0, sys.argv[2])
+import pkg.mod, ns.mod, data
+print(pkg.mod.VALUE+ns.mod.VALUE)
+"""
+
+MAIN_SCRIPT = """
+import sys
+import pkg.mod
+print(pkg.mod.VALUE, "json" in sys.modules)
+"""
+
+
+def make_tree(src_path):
+    file_list = []
+    for rel_path, source in SOURCES.items():
+        file_path = os.path.join(src_path, rel_path)
+        if not os.path.isdir(os.path.dirname(file_path)):
+            os.makedirs(os.path.dirname(file_path))
+        with open(file_path, mode="w") as f:
+            f.write(source)
+        if rel_path.endswith(".py"):
+            file_list.append(file_path)
+    assert compiler.compile_files(sys.executable, file_list, workers=1) == {}
+    for file_path in file_list:
+        os.remove(file_path)
+
+
+def test_pack_keeps_namespace_and_data_folders(tmp_path):
+    src_path = str(tmp_path/"src")
+    make_tree(src_path)
+    assert archive.pack(src_path, str(tmp_path/"app.pysa")) == 4
+
+    # the emptied regular package is removed
+    assert not os.path.exists(os.path.join(src_path, "pkg"))
+    assert os.path.isdir(os.path.join(src_path, "ns"))
+    assert os.listdir(os.path.join(src_path, "data")) == ["table.csv"]
+
+
+def test_archived_modules_are_importable(tmp_path):
+    src_path = str(tmp_path/"src")
+    make_tree(src_path)
+    archive.pack(src_path, str(tmp_path/"app.pysa"))
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.path.dirname(os.path.dirname(
+        os.path.abspath(archive.__file__)))
+    out = subprocess.check_output(
+        [sys.executable, "-c", IMPORT_SCRIPT, str(tmp_path/"app.pysa"),
+         src_path], env=env)
+    assert out.decode("utf-8").strip() == "pkgns"
+
+
+def test_importer_does_not_import_json(tmp_path):
+    src_path = str(tmp_path/"src")
+    make_tree(src_path)
+    with open(os.path.join(src_path, "main.py"), mode="w") as f:
+        f.write(MAIN_SCRIPT)
+    assert compiler.compile_files(
+        sys.executable, [os.path.join(src_path, "main.py")],
+        workers=1) == {}
+    archive.pack(src_path, str(tmp_path/"app.pysa"), keep=set(["main.pyc"]))
+
+    # the shipped importer runs without the pysealer package and site
+    shutil.copy2(os.path.splitext(archive.__file__)[0]+".py",
+                 str(tmp_path/"pysealer_archive.py"))
+    out = subprocess.check_output(
+        [sys.executable, "-I", "-S", str(tmp_path/"pysealer_archive.py"),
+         str(tmp_path/"app.pysa"), os.path.join(src_path, "main.pyc")])
+    assert out.decode("utf-8").split() == ["pkg", "False"]
+
+
+def test_installed_helpers_are_compiled(tmp_path, monkeypatch):
+    monkeypatch.setattr(pysealer, "PYSEALER_RELEASE_PATH",
+                        str(tmp_path/"releases"))
+    conda_path, _ = benchmark.make_stubs(str(tmp_path/"stubs"))
+    app_path = str(tmp_path/"app")
+    benchmark.make_app(app_path, 2, 128, 0, 0)
+    app_sealer = sealer.Sealer(app_path, "linux", "linux", 3)
+    app_sealer._host_conda = conda_path
+    app_sealer._target_conda = conda_path
+    app_sealer.init_build()
+    app_sealer.config_environment()
+    app_sealer.compile_app()
+    app_sealer.prepare_app()
+    app_sealer.seal_app(wheelhouse=False, env_mode="pack",
+                        module_archive=True, launcher_mode="fast")
+
+    sealed_path = os.path.join(app_path, benchmark.APP_NAME)
+    with open(os.devnull, "w") as null:
+        subprocess.check_call(["bash", "build.sh"], cwd=sealed_path,
+                              stdout=null)
+    for helper in ["pysealer_archive", "pysealer_launcher"]:
+        assert os.path.isfile(os.path.join(sealed_path, helper+".pyc"))
+        assert any(name.startswith(helper+".") for name in os.listdir(
+            os.path.join(sealed_path, "__pycache__")))
+    with open(os.path.join(sealed_path, "main.sh"), mode="r") as f:
+        assert "${APP_PATH}/pysealer_launcher.pyc --archive" in f.read()
+
+    out = subprocess.check_output(["bash", "main.sh"], cwd=sealed_path)
+    assert out == subprocess.check_output(
+        [sys.executable, "-m", "benchapp.main"], cwd=app_path)
@@ -0,0 +1,63 @@
+"""Testing the stage benchmark.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+import os
+import sys
+import tarfile
+
+import pytest
+
+from pysealer import benchmark
+
+
+def test_scenario_packs_the_sealed_app(tmp_path):
+    results = benchmark.run_scenario(
+        str(tmp_path), {"num_files": 5, "module_size": 512,
+                        "num_assets": 1, "asset_size": 1024})
+
+    assert sorted(results) == sorted(benchmark.STAGES)
+    for metrics in results.values():
+        assert sorted(metrics) == sorted(benchmark.TOLERANCES)
+    app_path = tmp_path/"app"
+    assert (app_path/benchmark.APP_NAME/"build.sh").is_file()
+    # the source package is not packed
+    with open(str(app_path/"benchapp"/"main.py"), mode="r") as f:
+        assert "module_0000" in f.read()
+
+
+def test_installer_without_sealed_app_fails(tmp_path):
+    (tmp_path/"src").mkdir()
+    (tmp_path/"src"/"main.py").write_text(u"print(1)\n")
+    installer_path = str(tmp_path/"app.run")
+    with tarfile.open(installer_path, mode="w:gz") as tar:
+        tar.add(str(tmp_path/"src"), arcname=".")
+
+    with pytest.raises(RuntimeError):
+        benchmark.check_installer(installer_path)
+
+
+def test_compare_needs_both_tolerances():
+    baseline = {"small": {"seal_app": {"wall_time": 1.0,
+                                       "bytes_written": 10 << 20}}}
+    results = {"small": {"seal_app": {"wall_time": 1.2,
+                                      "bytes_written": 20 << 20}}}
+
+    regressions = benchmark.compare(results, baseline)
+    assert [regression["metric"] for regression in regressions] == \
+        ["bytes_written"]
+    assert benchmark.compare(results, {}) == []
+
+
+def test_missing_baseline_fails(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(benchmark, "run_scenario", None)
+    monkeypatch.setattr(sys, "argv", [
+        "benchmark", "--output", str(tmp_path/"results.json"),
+        "--baseline", str(tmp_path/"baseline.json")])
+    with pytest.raises(SystemExit) as error:
+        benchmark.main()
+    assert error.value.code == 2
+    assert "--save-baseline" in capsys.readouterr().err
+    assert not os.path.exists(str(tmp_path/"results.json"))
@@ -0,0 +1,170 @@
+"""Testing the build cache and the reproducible build mode.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+import os
+import shutil
+import threading
+
+import pytest
+
+import pysealer
+from pysealer import buildcache
+from pysealer import sealer
+from pysealer import benchmark
+
+try:
+    from http.server import HTTPServer
+except ImportError:
+    from BaseHTTPServer import HTTPServer
+
+
+def write(path, content):
+    with open(str(path), mode="w") as f:
+        f.write(content)
+
+
+def read(path):
+    with open(str(path), mode="rb") as f:
+        return f.read()
+
+
+def make_artifacts(path):
+    os.makedirs(str(path))
+    write(path/"app.run", "installer")
+    write(path/"app.json", "release")
+    return [str(path/"app.run"), str(path/"app.json")]
+
+
+@pytest.fixture
+def cache_server(tmp_path):
+    handler = type("Handler", (buildcache.CacheRequestHandler,),
+                   {"cache_path": str(tmp_path/"served"),
+                    "log_message": lambda self, *args: None})
+    server = HTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield "http://127.0.0.1:%d" % (server.server_port)
+    server.shutdown()
+    server.server_close()
+
+
+def test_directory_cache(tmp_path):
+    paths = make_artifacts(tmp_path/"build")
+    cache = buildcache.open_cache(str(tmp_path/"cache"))
+    assert isinstance(cache, buildcache.DirectoryCache)
+    os.makedirs(str(tmp_path/"pulled"))
+    assert cache.get("key", str(tmp_path/"pulled")) is None
+
+    cache.put("key", paths)
+    assert cache.get("key", str(tmp_path/"pulled")) == ["app.json",
+                                                        "app.run"]
+    assert read(tmp_path/"pulled"/"app.run") == b"installer"
+
+    # corrupted artifacts are not used
+    write(tmp_path/"cache"/"key"/"app.run", "corrupted")
+    os.makedirs(str(tmp_path/"again"))
+    assert cache.get("key", str(tmp_path/"again")) is None
+    assert os.listdir(str(tmp_path/"again")) == []
+
+
+def test_http_cache(tmp_path, cache_server):
+    paths = make_artifacts(tmp_path/"build")
+    cache = buildcache.open_cache(cache_server)
+    assert isinstance(cache, buildcache.HTTPCache)
+    os.makedirs(str(tmp_path/"pulled"))
+    assert cache.get("key", str(tmp_path/"pulled")) is None
+
+    cache.put("key", paths)
+    assert cache.get("key", str(tmp_path/"pulled")) == ["app.json",
+                                                        "app.run"]
+    assert read(tmp_path/"pulled"/"app.json") == b"release"
+
+
+def make_sealer(app_path, conda_path):
+    app_sealer = sealer.Sealer(app_path, "linux", "linux", 3,
+                               reproducible=True)
+    app_sealer._host_conda = conda_path
+    app_sealer._target_conda = conda_path
+    return app_sealer
+
+
+def test_reproducible_build_is_pulled_from_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(pysealer, "PYSEALER_RELEASE_PATH",
+                        str(tmp_path/"releases"))
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1500000000")
+    conda_path, _ = benchmark.make_stubs(str(tmp_path/"stubs"))
+    app_path = str(tmp_path/"app")
+    benchmark.make_app(app_path, 3, 256, 1, 1024)
+    installer_path = os.path.join(app_path, benchmark.APP_NAME+".run")
+    cache_path = str(tmp_path/"cache")
+    options = {"wheelhouse": False, "env_mode": "pack"}
+
+    make_sealer(app_path, conda_path).run(**options)
+    installer = read(installer_path)
+    # the same inputs give the same installer
+    make_sealer(app_path, conda_path).run(**options)
+    assert read(installer_path) == installer
+
+    assert make_sealer(app_path, conda_path).run(
+        build_cache=cache_path, **options) != {}
+    os.remove(installer_path)
+    shutil.rmtree(str(tmp_path/"releases"))
+    assert make_sealer(app_path, conda_path).run(
+        build_cache=cache_path, **options) == {}
+    assert read(installer_path) == installer
+    assert os.listdir(str(tmp_path/"releases"))
+
+    # a changed source is a new key
+    write(os.path.join(app_path, "benchapp", "main.py"), "print(2)\n")
+    assert make_sealer(app_path, conda_path).run(
+        build_cache=cache_path, **options) != {}
+    assert read(installer_path) != installer
+
+
+def sealed_files(sealed_path):
+    files = {}
+    for root, dirs, names in os.walk(sealed_path):
+        for name in names:
+            file_path = os.path.join(root, name)
+            if not os.path.islink(file_path):
+                files[os.path.relpath(file_path, sealed_path)] = \
+                    read(file_path)
+    return files
+
+
+def test_packed_environment_depends_on_the_build_path(tmp_path,
+                                                      monkeypatch):
+    monkeypatch.setattr(pysealer, "PYSEALER_RELEASE_PATH",
+                        str(tmp_path/"releases"))
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1500000000")
+    conda_path, _ = benchmark.make_stubs(str(tmp_path/"stubs"))
+    app_path = str(tmp_path/"app")
+    benchmark.make_app(app_path, 3, 256, 0, 0)
+    sealed_path = os.path.join(app_path, benchmark.APP_NAME)
+
+    outputs = []
+    for build_name in ["build_a", "build_b"]:
+        app_sealer = sealer.Sealer(app_path, "linux", "linux", 3,
+                                   reproducible=True,
+                                   build_path=str(tmp_path/build_name))
+        app_sealer._host_conda = conda_path
+        app_sealer._target_conda = conda_path
+        app_sealer.run(wheelhouse=False, env_mode="pack",
+                       installer_mode="none")
+        outputs.append(sealed_files(sealed_path))
+
+    # only the prefix record of the packed environment differs, and the
+    # release manifest that lists its checksum
+    record_path = os.path.join("miniconda", ".pysealer_prefix.json")
+    assert sorted(outputs[0]) == sorted(outputs[1])
+    assert [rel_path for rel_path in sorted(outputs[0])
+            if outputs[0][rel_path] != outputs[1][rel_path]] == \
+        [record_path, "pysealer_release.json"]
+    assert str(tmp_path/"build_b"/"miniconda").encode("utf-8") in \
+        outputs[1][record_path]
+    with open(os.path.join(sealed_path, "build.sh"), mode="r") as f:
+        assert "# 2017-07-14 02:40:00\n" in f.read()
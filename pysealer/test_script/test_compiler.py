@@ -0,0 +1,83 @@
+"""Testing the parallel bytecode compiler.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+import os
+import sys
+import marshal
+import subprocess
+
+from pysealer import compiler
+
+
+def write_sources(path, sources):
+    file_list = []
+    for name, source in sorted(sources.items()):
+        file_path = os.path.join(str(path), name)
+        with open(file_path, mode="w") as f:
+            f.write(source)
+        file_list.append(file_path)
+    return file_list
+
+
+def load_code(cfile):
+    with open(cfile, mode="rb") as f:
+        return marshal.loads(f.read()[compiler.pyc_header_size():])
+
+
+def test_compile_files_reports_errors(tmp_path):
+    file_list = write_sources(tmp_path, {"good.py": "x = 1\n",
+                                         "bad.py": "def f(:\n"})
+    errors = compiler.compile_files(sys.executable, file_list, workers=2)
+    assert list(errors) == [str(tmp_path/"bad.py")]
+    assert os.path.isfile(str(tmp_path/"good.pyc"))
+    assert not os.path.isfile(str(tmp_path/"bad.pyc"))
+
+
+def test_compiled_file_replaces_hard_link(tmp_path):
+    file_list = write_sources(tmp_path, {"mod.py": "x = 1\n"})
+    with open(str(tmp_path/"shared"), mode="wb") as f:
+        f.write(b"user data")
+    os.link(str(tmp_path/"shared"), str(tmp_path/"mod.pyc"))
+    assert compiler.compile_files(sys.executable, file_list, workers=1) == {}
+    with open(str(tmp_path/"shared"), mode="rb") as f:
+        assert f.read() == b"user data"
+
+
+def test_reproducible_output_is_independent_of_location(tmp_path):
+    outputs = []
+    for name in ["a", "b"]:
+        root = tmp_path/name
+        root.mkdir()
+        file_list = write_sources(root, {"mod.py": "def f():\n    pass\n"})
+        compiler.compile_files(sys.executable, file_list, workers=1,
+                               root=str(root))
+        with open(str(root/"mod.pyc"), mode="rb") as f:
+            outputs.append(f.read())
+    assert outputs[0] == outputs[1]
+
+
+def test_optimize_removes_docstrings(tmp_path):
+    file_list = write_sources(tmp_path,
+                              {"mod.py": '"""Doc."""\nassert False\n'})
+    compiler.compile_files(sys.executable, file_list, workers=1,
+                           optimize=2, cfile_list=[str(tmp_path/"opt.pyc")])
+    code = load_code(str(tmp_path/"opt.pyc"))
+    assert "Doc." not in code.co_consts
+    assert subprocess.call([sys.executable, str(tmp_path/"opt.pyc")]) == 0
+
+
+def test_stripped_module_keeps_tracebacks_working(tmp_path):
+    file_list = write_sources(
+        tmp_path, {"mod.py": "def f():\n    raise ValueError('boom')\n"
+                             "f()\n"})
+    compiler.compile_files(sys.executable, file_list, workers=1,
+                           strip_list=file_list)
+    proc = subprocess.Popen([sys.executable, str(tmp_path/"mod.pyc")],
+                            stderr=subprocess.PIPE)
+    _, err = proc.communicate()
+    assert proc.returncode == 1
+    assert b"ValueError: boom" in err
+    assert b"line 2" not in err
@@ -0,0 +1,149 @@
+"""Testing the environment installation in the build script of each mode.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+import os
+import subprocess
+
+import pysealer
+from pysealer import sealer
+from pysealer import benchmark
+from pysealer import relocate
+
+
+def write(path, content, mode=0o644):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, mode="w") as f:
+        f.write(content)
+    os.chmod(path, mode)
+
+
+def read(path):
+    with open(path, mode="r") as f:
+        return f.read()
+
+
+def seal(tmp_path, monkeypatch, env_mode, prepare_env=None):
+    monkeypatch.setattr(pysealer, "PYSEALER_RELEASE_PATH",
+                        str(tmp_path/"releases"))
+    conda_path, _ = benchmark.make_stubs(str(tmp_path/"stubs"))
+    app_path = str(tmp_path/"app")
+    benchmark.make_app(app_path, 2, 128, 0, 0)
+
+    app_sealer = sealer.Sealer(app_path, "linux", "linux", 3)
+    app_sealer._host_conda = conda_path
+    app_sealer._target_conda = conda_path
+    app_sealer.init_build()
+    app_sealer.config_environment()
+    if prepare_env is not None:
+        prepare_env(app_sealer.build_conda)
+    app_sealer.compile_app()
+    app_sealer.prepare_app()
+    app_sealer.seal_app(wheelhouse=False, env_mode=env_mode)
+
+    return app_sealer, os.path.join(app_path, benchmark.APP_NAME)
+
+
+def run_build(sealed_path):
+    with open(os.devnull, "w") as null:
+        subprocess.check_call(["bash", "build.sh"], cwd=sealed_path,
+                              stdout=null)
+    return read(os.path.join(sealed_path, ".pysealer_install_state"))
+
+
+def test_solve_mode_installs_online(tmp_path, monkeypatch):
+    app_sealer, sealed_path = seal(tmp_path, monkeypatch, "solve")
+    build_script = read(os.path.join(sealed_path, "build.sh"))
+
+    assert "wget -O miniconda.sh %s" % (app_sealer.target_downurl) \
+        in build_script
+    conda_step = build_script.split("# Install Conda Dependencies")[1]
+    assert conda_step.index("$CONDA info -a") < \
+        conda_step.index("$CONDA update --yes conda") < \
+        conda_step.index("$CONDA install --yes conda-build pip")
+    assert "--offline" not in build_script
+    assert not os.path.exists(os.path.join(sealed_path, "miniconda.sh"))
+    assert not os.path.exists(os.path.join(sealed_path, "miniconda"))
+
+
+def test_lock_mode_installs_offline(tmp_path, monkeypatch):
+    _, sealed_path = seal(tmp_path, monkeypatch, "lock")
+    build_script = read(os.path.join(sealed_path, "build.sh"))
+
+    assert "wget" not in build_script
+    assert "$CONDA update" not in build_script
+    assert "$CONDA install --offline --yes " \
+        "--file ${APP_PATH}/conda_explicit.txt" in build_script
+    assert read(os.path.join(sealed_path, "conda_explicit.txt")) == \
+        "@EXPLICIT\n"
+
+    # the shipped stub installer builds the target environment
+    assert run_build(sealed_path).split() == [
+        "miniconda", "conda", "pip", "cleanup"]
+    assert os.path.isfile(os.path.join(sealed_path, "miniconda", "bin",
+                                       "conda"))
+    assert not os.path.exists(os.path.join(sealed_path, "miniconda.sh"))
+
+
+def test_pack_mode_relocates_the_environment(tmp_path, monkeypatch):
+    def prepare_env(build_conda):
+        write(os.path.join(build_conda, "bin", "tool"),
+              "#!%s/bin/python\n" % (build_conda), 0o755)
+        os.symlink(os.path.join(build_conda, "bin", "tool"),
+                   os.path.join(build_conda, "bin", "tool-link"))
+
+    app_sealer, sealed_path = seal(tmp_path, monkeypatch, "pack",
+                                   prepare_env)
+    build_script = read(os.path.join(sealed_path, "build.sh"))
+    assert "$CONDA" not in build_script.split("# Relocate")[1]
+    assert "${PYTHON} ${APP_PATH}/relocate.py ${MINICONDA_PATH}" \
+        in build_script
+
+    assert run_build(sealed_path).split() == ["relocate", "cleanup"]
+    seal_conda = os.path.join(sealed_path, "miniconda")
+    assert read(os.path.join(seal_conda, "bin", "tool")) == \
+        "#!%s/bin/python\n" % (seal_conda)
+    assert os.readlink(os.path.join(seal_conda, "bin", "tool-link")) == \
+        os.path.join(seal_conda, "bin", "tool")
+    assert not os.path.exists(os.path.join(sealed_path, "relocate.py"))
+
+
+def test_relocate_round_trip(tmp_path):
+    old_prefix = str(tmp_path/"build"/"long_prefix")
+    write(os.path.join(old_prefix, "bin", "script"),
+          "#!%s/bin/python\nPREFIX = '%s'\n" % (old_prefix, old_prefix))
+    os.makedirs(os.path.join(old_prefix, "lib"))
+    with open(os.path.join(old_prefix, "lib", "libx.so"), mode="wb") as f:
+        f.write(b"\x7fELF\x00"+old_prefix.encode("utf-8")+b"/lib\x00end")
+    write(os.path.join(old_prefix, "pkgs", "cached"), old_prefix)
+    write(os.path.join(old_prefix, "share", "plain"), "no prefix")
+
+    assert relocate.find_prefix_files(old_prefix, ("pkgs",)) == {
+        os.path.join("bin", "script"): "text",
+        os.path.join("lib", "libx.so"): "binary"}
+
+    # relocate to a shorter prefix and back to the original one
+    new_prefix = str(tmp_path/"env")
+    relocate.write_prefix_record(old_prefix, old_prefix, ("pkgs",))
+    os.rename(old_prefix, new_prefix)
+    assert relocate.relocate(new_prefix) == []
+    assert read(os.path.join(new_prefix, "bin", "script")) == \
+        "#!%s/bin/python\nPREFIX = '%s'\n" % (new_prefix, new_prefix)
+    with open(os.path.join(new_prefix, "lib", "libx.so"), mode="rb") as f:
+        binary = f.read()
+    assert len(binary) == len(old_prefix)+13
+    assert binary.startswith(b"\x7fELF\x00"+new_prefix.encode("utf-8") +
+                             b"/lib\x00")
+    assert binary.endswith(b"\x00end")
+    assert read(os.path.join(new_prefix, "pkgs", "cached")) == old_prefix
+
+    relocate.write_prefix_record(new_prefix, new_prefix, ("pkgs",))
+    os.rename(new_prefix, old_prefix)
+    # the binary file can't grow, only the text file is relocated
+    assert relocate.relocate(old_prefix) == [
+        os.path.join("lib", "libx.so")]
+    assert read(os.path.join(old_prefix, "bin", "script")) == \
+        "#!%s/bin/python\nPREFIX = '%s'\n" % (old_prefix, old_prefix)
@@ -0,0 +1,151 @@
+"""Testing the delta update packages.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+import os
+import shutil
+
+import pytest
+
+import pysealer
+from pysealer import delta
+from pysealer import sealer
+from pysealer import benchmark
+
+
+def write(path, content):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, mode="w") as f:
+        f.write(content)
+
+
+def read(path):
+    with open(path, mode="r") as f:
+        return f.read()
+
+
+def make_release(app_path, version, files):
+    for rel_path, content in files.items():
+        write(os.path.join(app_path, rel_path), content)
+    return delta.write_release(app_path, "app", version)
+
+
+def test_delta_round_trip(tmp_path):
+    old_path = str(tmp_path/"old")
+    new_path = str(tmp_path/"new")
+    old_release = make_release(old_path, "v1", {
+        "build.sh": "#!/bin/sh\n", "src/a.pyc": "a1", "src/b.pyc": "b1"})
+    make_release(new_path, "v2", {
+        "build.sh": "#!/bin/sh\n", "src/a.pyc": "a2", "src/c.pyc": "c2"})
+
+    delta_path = str(tmp_path/"delta")
+    delta_dict = delta.build_delta(old_release, new_path, delta_path)
+    assert delta_dict["added"] == ["src/c.pyc"]
+    assert delta_dict["changed"] == ["src/a.pyc"]
+    assert delta_dict["removed"] == ["src/b.pyc"]
+
+    delta.apply_delta(old_path, delta_path)
+    assert read(os.path.join(old_path, "src", "a.pyc")) == "a2"
+    assert read(os.path.join(old_path, "src", "c.pyc")) == "c2"
+    assert not os.path.exists(os.path.join(old_path, "src", "b.pyc"))
+    assert delta.load_release(os.path.join(
+        old_path, delta.RELEASE_NAME))["app_version"] == "v2"
+
+
+def test_modified_install_is_not_updated(tmp_path):
+    old_path = str(tmp_path/"old")
+    new_path = str(tmp_path/"new")
+    old_release = make_release(old_path, "v1", {"src/a.pyc": "a1"})
+    make_release(new_path, "v2", {"src/a.pyc": "a2"})
+    delta_path = str(tmp_path/"delta")
+    delta.build_delta(old_release, new_path, delta_path)
+
+    write(os.path.join(old_path, "src", "a.pyc"), "patched")
+    with pytest.raises(IOError):
+        delta.apply_delta(old_path, delta_path)
+    assert read(os.path.join(old_path, "src", "a.pyc")) == "patched"
+
+
+def test_environment_change_needs_full_installer(tmp_path):
+    old_release = make_release(str(tmp_path/"old"), "v1",
+                               {"requirements.txt": "six\n"})
+    make_release(str(tmp_path/"new"), "v2", {"requirements.txt": "numpy\n"})
+    with pytest.raises(ValueError):
+        delta.build_delta(old_release, str(tmp_path/"new"),
+                          str(tmp_path/"delta"))
+
+
+def seal(app_path, conda_path):
+    app_sealer = sealer.Sealer(app_path, "linux", "linux", 3)
+    app_sealer._host_conda = conda_path
+    app_sealer._target_conda = conda_path
+    app_sealer.init_build()
+    app_sealer.config_environment()
+    app_sealer.compile_app()
+    app_sealer.prepare_app()
+    app_sealer.seal_app(wheelhouse=False, env_mode="pack")
+    return app_sealer
+
+
+def set_version(app_path, version):
+    config_path = os.path.join(app_path, ".pysealer_config.yml")
+    config = read(config_path).replace("v0.1.0", version)
+    write(config_path, config)
+
+
+def test_reseal_and_delta(tmp_path, monkeypatch):
+    monkeypatch.setattr(pysealer, "PYSEALER_RELEASE_PATH",
+                        str(tmp_path/"releases"))
+    conda_path, _ = benchmark.make_stubs(str(tmp_path/"stubs"))
+    app_path = str(tmp_path/"app")
+    benchmark.make_app(app_path, 3, 256, 0, 0)
+    write(os.path.join(app_path, "benchapp", "old.py"), "x = 1\n")
+    seal(app_path, conda_path)
+
+    os.remove(os.path.join(app_path, "benchapp", "old.py"))
+    write(os.path.join(app_path, "benchapp", "new.py"), "y = 2\n")
+    set_version(app_path, "v0.2.0")
+    app_sealer = seal(app_path, conda_path)
+
+    # the second seal replaces the output of the first one
+    output = os.path.join(app_path, benchmark.APP_NAME)
+    release = delta.load_release(os.path.join(output, delta.RELEASE_NAME))
+    assert release["app_version"] == "v0.2.0"
+    assert "src/benchapp/new.pyc" in release["files"]
+    assert "src/benchapp/old.pyc" not in release["files"]
+    assert not os.path.exists(os.path.join(output, "src", "benchapp",
+                                           "old.pyc"))
+
+    # the releases are recorded per target
+    record_path = os.path.join(str(tmp_path/"releases"), benchmark.APP_NAME,
+                               "linux-64-py3", "v0.1.0.json")
+    assert os.path.isfile(record_path)
+    with pytest.raises(IOError):
+        app_sealer.build_delta("v0.1.0", target="osx-64-py3")
+
+    delta_installer = app_sealer.build_delta("v0.1.0")
+    assert os.path.isfile(delta_installer)
+
+    # a record of another version is refused
+    shutil.copy2(os.path.join(os.path.dirname(record_path), "v0.2.0.json"),
+                 record_path)
+    with pytest.raises(IOError):
+        app_sealer.build_delta("v0.1.0")
+
+
+def test_sources_are_not_replaced_by_the_output(tmp_path, monkeypatch):
+    monkeypatch.setattr(pysealer, "PYSEALER_RELEASE_PATH",
+                        str(tmp_path/"releases"))
+    conda_path, _ = benchmark.make_stubs(str(tmp_path/"stubs"))
+    app_path = str(tmp_path/"app")
+    benchmark.make_app(app_path, 3, 256, 0, 0)
+    config_path = os.path.join(app_path, ".pysealer_config.yml")
+    write(config_path, read(config_path).replace(benchmark.APP_NAME,
+                                                 "benchapp"))
+
+    with pytest.raises(IOError):
+        seal(app_path, conda_path)
+    assert os.path.isfile(os.path.join(app_path, "benchapp", "main.py"))
@@ -0,0 +1,59 @@
+"""Testing the static import graph of compiled apps.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+import os
+import sys
+
+from pysealer import compiler
+from pysealer import depgraph
+
+SOURCES = {
+    os.path.join("app", "__init__.py"): "",
+    os.path.join("app", "main.py"): "import json\nfrom . import core\n"
+                                    "import helpers\nimport manifest\n",
+    os.path.join("app", "core.py"): "from .sub import tool\n",
+    os.path.join("app", "sub", "__init__.py"): "",
+    os.path.join("app", "sub", "tool.py"): "import os\n",
+    os.path.join("app", "unused.py"): "import xml\n",
+    "helpers.py": "import utils_missing_in_app\n",
+}
+
+
+def make_app(src_path):
+    file_list = []
+    for rel_path, source in SOURCES.items():
+        file_path = os.path.join(src_path, rel_path)
+        if not os.path.isdir(os.path.dirname(file_path)):
+            os.makedirs(os.path.dirname(file_path))
+        with open(file_path, mode="w") as f:
+            f.write(source)
+        file_list.append(file_path)
+    assert compiler.compile_files(sys.executable, file_list, workers=1) == {}
+    for file_path in file_list:
+        os.remove(file_path)
+
+
+def test_scan_imports_finds_relative_and_nested_imports():
+    code = compile("from . import a\ndef f():\n    import b.c\n",
+                   "mod.py", "exec")
+    imports = depgraph.scan_imports(code)
+    assert ("", ("a",), 1) in imports
+    assert ("b.c", (), 0) in imports
+
+
+def test_analysis_of_app(tmp_path):
+    src_path = str(tmp_path/"src")
+    make_app(src_path)
+    result = depgraph.run_analysis(
+        sys.executable, src_path, [os.path.join("app", "main.pyc")],
+        str(tmp_path/"env"))
+
+    assert result["reachable"] == ["app", "app.core", "app.main",
+                                   "app.sub", "app.sub.tool", "helpers"]
+    assert result["unreachable"] == ["app.unused"]
+    assert "app.core" in result["graph"]["app.main"]
+    # the modules of pysealer don't hide the missing app modules
+    assert result["missing"] == ["manifest", "utils_missing_in_app"]
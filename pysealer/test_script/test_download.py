@@ -0,0 +1,183 @@
+"""Testing the resumable download against a local HTTP server.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+import os
+import hashlib
+import threading
+
+import pytest
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from urllib.error import HTTPError
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from urllib2 import HTTPError
+
+from pysealer import utils
+from pysealer import sealer
+from pysealer import instrument
+
+PAYLOAD = os.urandom(100000)
+
+
+class InstallerHandler(BaseHTTPRequestHandler):
+    """Serve PAYLOAD, the server attributes select the range support."""
+
+    def do_GET(self):
+        byte_range = self.headers.get("Range")
+        self.server.ranges.append(byte_range)
+        if self.server.reject == "all" or \
+                (byte_range and self.server.reject == "range"):
+            self.send_error(416)
+            return
+        data = PAYLOAD
+        if byte_range and self.server.resume:
+            data = PAYLOAD[int(byte_range[len("bytes="):-1]):]
+            self.send_response(206)
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = HTTPServer(("127.0.0.1", 0), InstallerHandler)
+    httpd.ranges = []
+    httpd.resume = True
+    httpd.reject = None
+    httpd.url = "http://127.0.0.1:%d/miniconda.sh" % (httpd.server_port)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def write_part(file_path, data):
+    with open(file_path+".part", mode="wb") as f:
+        f.write(data)
+
+
+def read(file_path):
+    with open(file_path, mode="rb") as f:
+        return f.read()
+
+
+def test_download_verifies_checksum(server, tmp_path):
+    file_path = str(tmp_path/"miniconda.sh")
+    sha = hashlib.sha256(PAYLOAD).hexdigest()
+    assert utils.download(server.url, file_path, sha256=sha) == sha
+    assert read(file_path) == PAYLOAD
+    assert not os.path.exists(file_path+".part")
+
+
+def test_download_resumes_partial_file(server, tmp_path):
+    file_path = str(tmp_path/"miniconda.sh")
+    write_part(file_path, PAYLOAD[:1000])
+    utils.download(server.url, file_path)
+    assert server.ranges == ["bytes=1000-"]
+    assert read(file_path) == PAYLOAD
+
+
+def test_download_restarts_without_range_support(server, tmp_path):
+    server.resume = False
+    file_path = str(tmp_path/"miniconda.sh")
+    write_part(file_path, b"x"*1000)
+    utils.download(server.url, file_path)
+    assert read(file_path) == PAYLOAD
+
+
+def test_download_restarts_once_on_rejected_range(server, tmp_path):
+    server.reject = "range"
+    file_path = str(tmp_path/"miniconda.sh")
+    write_part(file_path, b"x"*1000)
+    tracer = instrument.Tracer(echo=False)
+    events = []
+    tracer.add_sink(events.append)
+    utils.download(server.url, file_path, tracer=tracer)
+    assert server.ranges == ["bytes=1000-", None]
+    assert read(file_path) == PAYLOAD
+    assert any("restart" in event["args"].get("text", "")
+               for event in events)
+
+
+def test_download_gives_up_after_one_restart(server, tmp_path):
+    server.reject = "all"
+    file_path = str(tmp_path/"miniconda.sh")
+    write_part(file_path, b"x"*1000)
+    with pytest.raises(HTTPError):
+        utils.download(server.url, file_path)
+    assert len(server.ranges) == 2
+
+
+def test_download_removes_corrupted_file(server, tmp_path):
+    file_path = str(tmp_path/"miniconda.sh")
+    with pytest.raises(IOError):
+        utils.download(server.url, file_path, sha256="0"*64)
+    assert not os.path.exists(file_path)
+    assert not os.path.exists(file_path+".part")
+
+
+def get_conda(server, target_path, sha256=None):
+    return utils.get_conda(target_path=target_path, platform="linux",
+                           pyver=3, arch=64,
+                           base_url=server.url.rsplit("/", 1)[0],
+                           sha256=sha256)
+
+
+def test_cache_is_checked_against_expected_checksum(server, tmp_path):
+    sha = hashlib.sha256(PAYLOAD).hexdigest()
+    with pytest.raises(IOError):
+        get_conda(server, str(tmp_path), sha256="0"*64)
+    conda_path = str(tmp_path/"linux"/"64"/"miniconda.sh")
+    assert not os.path.exists(conda_path)
+
+    # a download without an expected checksum only records its own
+    get_conda(server, str(tmp_path))
+    with open(conda_path, mode="ab") as f:
+        f.write(b"tampered")
+    with open(conda_path+".sha256", mode="w") as f:
+        f.write(utils.manifest.file_hash(conda_path, algorithm="sha256"))
+    assert utils.is_cached(conda_path)
+    assert not utils.is_cached(conda_path, sha)
+
+    num_requests = len(server.ranges)
+    get_conda(server, str(tmp_path), sha256=sha)
+    assert len(server.ranges) == num_requests+1
+    assert read(conda_path) == PAYLOAD
+    get_conda(server, str(tmp_path), sha256=sha)
+    assert len(server.ranges) == num_requests+1
+
+
+def test_sealer_passes_expected_checksums(server, tmp_path):
+    app_path = tmp_path/"app"
+    app_path.mkdir()
+    with open(str(app_path/".pysealer_config.yml"), mode="w") as f:
+        f.write("app_name:\n  - app\n"
+                "conda_sha256:\n  linux-64-py3: '%s'\n" % ("0"*64))
+    base_url = server.url.rsplit("/", 1)[0]
+
+    app_sealer = sealer.Sealer(str(app_path), "linux", "linux", 3,
+                               conda_url=base_url)
+    assert app_sealer.conda_checksum("linux", 64) == "0"*64
+    assert app_sealer.conda_checksum("osx", 64) is None
+    with pytest.raises(IOError):
+        app_sealer.fetch_conda(host=True, target=False)
+    assert app_sealer._host_conda is None
+
+    sha = hashlib.sha256(PAYLOAD).hexdigest()
+    app_sealer = sealer.Sealer(str(app_path), "linux", "linux", 3,
+                               conda_url=base_url,
+                               conda_sha256={"linux-64-py3": sha})
+    app_sealer.fetch_conda(host=True, target=False)
+    assert read(app_sealer._host_conda) == PAYLOAD
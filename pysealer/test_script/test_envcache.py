@@ -0,0 +1,54 @@
+"""Testing the cache of configured build environments.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+import os
+
+import pysealer
+from pysealer import envcache
+
+
+def make_env(prefix):
+    os.makedirs(os.path.join(prefix, "bin"))
+    with open(os.path.join(prefix, "bin", "pip"), mode="w") as f:
+        f.write("#!%s/bin/python\nimport pip\n" % (prefix))
+    os.chmod(os.path.join(prefix, "bin", "pip"), 0o755)
+    with open(os.path.join(prefix, "bin", "data.txt"), mode="w") as f:
+        f.write("no prefix here\n")
+
+
+def test_env_key_depends_on_all_inputs():
+    key = envcache.env_key("host", ["numpy"], ["six"], "six==1.0\n")
+    assert key == envcache.env_key("host", ["numpy"], ["six"], "six==1.0\n")
+    assert key != envcache.env_key("other", ["numpy"], ["six"], "six==1.0\n")
+    assert key != envcache.env_key("host", ["scipy"], ["six"], "six==1.0\n")
+    assert key != envcache.env_key("host", ["numpy"], [], "six==1.0\n")
+    assert key != envcache.env_key("host", ["numpy"], ["six"], "six==2.0\n")
+
+
+def test_clone_relocates_prefix_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(pysealer, "PYSEALER_ENV_PATH", str(tmp_path/"envs"))
+    prefix = str(tmp_path/"build"/"miniconda")
+    make_env(prefix)
+    envcache.store_env(prefix, "key")
+
+    clone = str(tmp_path/"b"/"miniconda")
+    assert envcache.clone_env("key", clone)
+    with open(os.path.join(clone, "bin", "pip"), mode="r") as f:
+        assert f.read().startswith("#!%s/bin/python" % (clone))
+    assert os.access(os.path.join(clone, "bin", "pip"), os.X_OK)
+
+    # the cached environment keeps its own prefix
+    cached = os.path.join(envcache.cache_path("key"), "env", "bin", "pip")
+    with open(cached, mode="r") as f:
+        assert f.read().startswith("#!%s/bin/python" % (prefix))
+    with open(os.path.join(clone, "bin", "data.txt"), mode="r") as f:
+        assert f.read() == "no prefix here\n"
+
+
+def test_clone_of_missing_key_fails(tmp_path, monkeypatch):
+    monkeypatch.setattr(pysealer, "PYSEALER_ENV_PATH", str(tmp_path))
+    assert not envcache.clone_env("missing", str(tmp_path/"env"))
+    assert not os.path.exists(str(tmp_path/"env"))
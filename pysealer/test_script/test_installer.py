@@ -0,0 +1,203 @@
+"""Testing the native self-extracting installer.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+import os
+import io
+import sys
+import tarfile
+import subprocess
+
+import pytest
+
+import pysealer
+from pysealer import installer
+from pysealer import sealer
+from pysealer import benchmark
+
+# the interpreter of the build environment logs its calls, compiling
+# fails while the interrupt file exists
+PYTHON_WRAPPER = """#!/bin/sh
+echo "$*" >> %(log)s
+case "$*" in
+    *py_compile*) [ -f %(interrupt)s ] && exit 1 ;;
+esac
+exec %(python)s "$@"
+"""
+
+
+def make_app(src_path):
+    os.makedirs(os.path.join(src_path, "src", "pkg"))
+    for index in range(20):
+        with open(os.path.join(src_path, "src", "pkg", "mod_%d.pyc" % index),
+                  mode="wb") as f:
+            f.write(os.urandom(4096))
+    with open(os.path.join(src_path, "build.sh"), mode="w") as f:
+        f.write("#!/bin/sh\necho built > built.txt\n")
+    os.chmod(os.path.join(src_path, "build.sh"), 0o755)
+    os.symlink("pkg", os.path.join(src_path, "src", "linked"))
+
+
+def run_installer(installer_path, target_path):
+    proc = subprocess.Popen(["sh", installer_path, target_path],
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    out, _ = proc.communicate()
+    return proc.returncode, out.decode("utf-8")
+
+
+@pytest.mark.parametrize("codec", sorted(installer.CODECS))
+def test_payload_round_trip(tmp_path, codec):
+    src_path = str(tmp_path/"app")
+    make_app(src_path)
+    installer_path = str(tmp_path/"app.run")
+    manifest = installer.build_installer(src_path, installer_path,
+                                         codec=codec, chunk_size=16 << 10,
+                                         workers=2)
+    assert len(manifest["chunks"]) > 1
+    tar = tarfile.open(fileobj=io.BytesIO(
+        installer.read_payload(installer_path, manifest)))
+    names = set(tar.getnames())
+    assert "build.sh" in names and installer.CHECKSUM_NAME in names
+    assert tar.getmember("src/linked").issym()
+
+
+def test_installer_extracts_verifies_and_runs(tmp_path):
+    src_path = str(tmp_path/"app")
+    make_app(src_path)
+    installer_path = str(tmp_path/"app.run")
+    installer.build_installer(src_path, installer_path, chunk_size=16 << 10)
+
+    target_path = str(tmp_path/"target")
+    returncode, out = run_installer(installer_path, target_path)
+    assert returncode == 0, out
+    assert os.path.isfile(os.path.join(target_path, "built.txt"))
+    assert os.path.isfile(os.path.join(target_path, installer.EXTRACTED_NAME))
+    assert not os.path.exists(os.path.join(target_path, ".pysealer_chunks"))
+
+    # a second run skips the extraction
+    returncode, out = run_installer(installer_path, target_path)
+    assert returncode == 0 and "already extracted" in out
+
+
+def test_installer_rejects_corrupted_chunk(tmp_path):
+    src_path = str(tmp_path/"app")
+    make_app(src_path)
+    installer_path = str(tmp_path/"app.run")
+    manifest = installer.build_installer(src_path, installer_path,
+                                         chunk_size=16 << 10)
+    with open(installer_path, mode="r+b") as f:
+        f.seek(manifest["payload_offset"]+100)
+        byte = bytearray(f.read(1))
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytearray([byte[0] ^ 0xff]))
+
+    returncode, out = run_installer(installer_path, str(tmp_path/"target"))
+    assert returncode != 0
+    assert "corrupted" in out
+    assert not os.path.isfile(str(tmp_path/"target"/"built.txt"))
+
+
+def test_reproducible_installer(tmp_path):
+    src_path = str(tmp_path/"app")
+    make_app(src_path)
+    outputs = []
+    for name in ["a.run", "b.run"]:
+        installer.build_installer(src_path, str(tmp_path/name),
+                                  mtime=0, workers=2)
+        with open(str(tmp_path/name), mode="rb") as f:
+            outputs.append(f.read())
+    assert outputs[0] == outputs[1]
+
+
+def test_interrupted_install_resumes(tmp_path, monkeypatch):
+    monkeypatch.setattr(pysealer, "PYSEALER_RELEASE_PATH",
+                        str(tmp_path/"releases"))
+    conda_path, _ = benchmark.make_stubs(str(tmp_path/"stubs"))
+    app_path = str(tmp_path/"app")
+    benchmark.make_app(app_path, 2, 128, 1, 1024)
+    app_sealer = sealer.Sealer(app_path, "linux", "linux", 3)
+    app_sealer._host_conda = conda_path
+    app_sealer._target_conda = conda_path
+    app_sealer.init_build()
+    app_sealer.config_environment()
+    python_path = os.path.join(app_sealer.build_bin, "python")
+    os.remove(python_path)
+    with open(python_path, mode="w") as f:
+        f.write(PYTHON_WRAPPER % {
+            "log": str(tmp_path/"python.log"),
+            "interrupt": str(tmp_path/"interrupt"),
+            "python": os.path.realpath(sys.executable)})
+    os.chmod(python_path, 0o755)
+    app_sealer.compile_app()
+    app_sealer.prepare_app()
+    app_sealer.seal_app(wheelhouse=False, env_mode="pack",
+                        launcher_mode="fast")
+    app_sealer.build_installer()
+    installer_path = os.path.join(app_path, benchmark.APP_NAME+".run")
+
+    # the install stops after the extraction and the first steps
+    (tmp_path/"interrupt").write_text(u"")
+    target_path = str(tmp_path/"target")
+    returncode, out = run_installer(installer_path, target_path)
+    assert returncode != 0
+    assert "Extracting" in out
+    state_path = os.path.join(target_path, ".pysealer_install_state")
+    with open(state_path, mode="r") as f:
+        assert f.read().split() == ["relocate", "cleanup"]
+    asset_path = os.path.join(target_path, "src", "benchapp", "data",
+                              "asset_000.bin")
+    asset_stat = os.stat(asset_path)
+
+    os.remove(str(tmp_path/"interrupt"))
+    returncode, out = run_installer(installer_path, target_path)
+    assert returncode == 0, out
+    assert "already extracted" in out and "Extracting" not in out
+    assert os.stat(asset_path).st_ino == asset_stat.st_ino
+    assert os.stat(asset_path).st_mtime == asset_stat.st_mtime
+    assert "The step relocate is done, skipped." in out
+    with open(state_path, mode="r") as f:
+        assert f.read().split() == ["relocate", "cleanup", "helpers",
+                                    "freeze"]
+    with open(str(tmp_path/"python.log"), mode="r") as f:
+        calls = f.read().splitlines()
+    assert len([call for call in calls if "relocate.py" in call]) == 1
+    assert len([call for call in calls if "py_compile" in call]) == 2
+
+
+def flip_byte(file_path, position):
+    with open(file_path, mode="r+b") as f:
+        f.seek(position)
+        byte = bytearray(f.read(1))
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytearray([byte[0] ^ 0xff]))
+
+
+def test_install_resumes_after_a_corrupted_chunk(tmp_path):
+    src_path = str(tmp_path/"app")
+    make_app(src_path)
+    installer_path = str(tmp_path/"app.run")
+    manifest = installer.build_installer(src_path, installer_path,
+                                         chunk_size=16 << 10, workers=2)
+    chunks = manifest["chunks"]
+    # the last chunk is corrupted
+    position = manifest["payload_offset"]-1 + \
+        sum(chunk["size"] for chunk in chunks[:-1])+chunks[-1]["size"]//2
+    flip_byte(installer_path, position)
+
+    target_path = str(tmp_path/"target")
+    returncode, out = run_installer(installer_path, target_path)
+    assert returncode != 0
+    assert "The chunk %08d of the installer is corrupted." \
+        % (len(chunks)-1) in out
+    # nothing is unpacked, the verified chunks are kept
+    assert os.listdir(target_path) == [".pysealer_chunks"]
+    chunk_path = os.path.join(target_path, ".pysealer_chunks", "%08d" % 0)
+    assert os.path.isfile(chunk_path)
+
+    flip_byte(installer_path, position)
+    returncode, out = run_installer(installer_path, target_path)
+    assert returncode == 0, out
+    assert os.path.isfile(os.path.join(target_path, "built.txt"))
+    assert not os.path.exists(os.path.join(target_path, ".pysealer_chunks"))
@@ -0,0 +1,116 @@
+"""Testing the tracer of the sealing stages.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+from pysealer import compiler
+from pysealer import instrument
+
+SLEEP_SCRIPT = """
+import os, signal, sys, time
+signal.signal(signal.SIGINT, lambda *args: sys.exit(3))
+print(os.getpgid(0) == os.getpid())
+sys.stdout.flush()
+if len(sys.argv) > 1:
+    open(sys.argv[1], "w").close()
+time.sleep(30)
+"""
+
+
+def wait_for_proc(tracer):
+    for _ in range(500):
+        with tracer.lock:
+            if tracer.procs:
+                return list(tracer.procs)[0]
+        time.sleep(0.01)
+    raise AssertionError("The subprocess is not started.")
+
+
+def test_call_records_events_and_input():
+    events = []
+    tracer = instrument.Tracer(sinks=[events.append], echo=False)
+    output = tracer.call([sys.executable, "-c",
+                          "import sys; print(sys.stdin.read().upper())"],
+                         input=b"x"*(1 << 20))
+    assert output.strip() == "X"*(1 << 20)
+    assert [event["ph"] for event in events
+            if event["cat"] == "subprocess"] == ["B", "E"]
+    assert not tracer.procs
+
+
+@pytest.mark.skipif(not hasattr(os, "killpg"), reason="needs POSIX")
+def test_cancel_stops_the_process_group():
+    tracer = instrument.Tracer(echo=False)
+    errors = []
+
+    def call():
+        try:
+            tracer.call([sys.executable, "-c", SLEEP_SCRIPT])
+        except Exception as e:
+            errors.append(e)
+    thread = threading.Thread(target=call)
+    thread.start()
+    wait_for_proc(tracer)
+    tracer.cancel()
+    thread.join(10)
+
+    assert not thread.is_alive()
+    assert isinstance(errors[0], instrument.CancelledError)
+    with pytest.raises(instrument.CancelledError):
+        tracer.call([sys.executable, "-c", "pass"])
+
+
+@pytest.mark.skipif(not hasattr(os, "killpg"), reason="needs POSIX")
+def test_interrupt_reaches_the_subprocess(tmp_path):
+    tracer = instrument.Tracer(echo=False)
+    results = []
+    ready_path = tmp_path/"ready"
+
+    def call():
+        results.append(tracer.call([sys.executable, "-c", SLEEP_SCRIPT,
+                                    str(ready_path)], check=False))
+    thread = threading.Thread(target=call)
+    thread.start()
+    proc = wait_for_proc(tracer)
+    for _ in range(500):
+        if ready_path.exists():
+            break
+        time.sleep(0.01)
+    tracer.interrupt()
+    thread.join(10)
+
+    assert proc.returncode == 3
+    # the subprocess leads its own process group
+    assert results[0].strip() == "True"
+
+
+def test_compile_files_by_tracer(tmp_path):
+    events = []
+    tracer = instrument.Tracer(sinks=[events.append], echo=False)
+    source = tmp_path/"mod.py"
+    source.write_text(u"x = 1\n")
+    broken = tmp_path/"broken.py"
+    broken.write_text(u"x = \n")
+
+    errors = compiler.compile_files(sys.executable,
+                                    [str(source), str(broken)],
+                                    workers=1, tracer=tracer)
+    assert list(errors) == [str(broken)]
+    assert (tmp_path/"mod.pyc").is_file()
+    assert any(event["cat"] == "subprocess" for event in events)
+
+
+def test_signal_of_finished_process_is_ignored():
+    tracer = instrument.Tracer(echo=False)
+    tracer.call([sys.executable, "-c", "pass"])
+    tracer.interrupt()
+    tracer.cancel()
+    assert not tracer.procs
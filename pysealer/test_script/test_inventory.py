@@ -0,0 +1,89 @@
+"""Testing the single-pass inventory of the app files.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+import os
+
+from pysealer import inventory
+from pysealer import pathfilter
+
+
+def write(path, content):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, mode="w") as f:
+        f.write(content)
+
+
+def make_app(app_path):
+    write(os.path.join(app_path, "main.py"), "import pkg\n")
+    write(os.path.join(app_path, "pkg", "__init__.py"), "")
+    write(os.path.join(app_path, "pkg", "__init__.pyc"), "compiled")
+    write(os.path.join(app_path, "pkg", "data.csv"), "a,b\n")
+    write(os.path.join(app_path, ".git", "HEAD"), "ref")
+    os.symlink("main.py", os.path.join(app_path, "linked.py"))
+
+
+def test_scan_lists_files_and_links(tmp_path):
+    app_path = str(tmp_path)
+    make_app(app_path)
+    path_filter = pathfilter.PathFilter([".git/", "*.pyc"])
+    app_inventory = inventory.Inventory.scan(app_path, path_filter)
+
+    assert app_inventory.paths == [
+        "linked.py", "main.py", os.path.join("pkg", "__init__.py"),
+        os.path.join("pkg", "data.csv")]
+    assert app_inventory.is_link("linked.py")
+    assert not app_inventory.is_link("main.py")
+    assert app_inventory.stat("main.py")[0] == len("import pkg\n")
+    assert app_inventory.compiled == set(
+        [os.path.join("pkg", "__init__.pyc")])
+    assert app_inventory.hashes == [None]*4
+    assert app_inventory.file_hash("linked.py") == \
+        app_inventory.file_hash("main.py")
+
+
+def test_diff_and_hash_reuse(tmp_path):
+    app_path = str(tmp_path/"app")
+    make_app(app_path)
+    previous = inventory.Inventory.scan(app_path)
+    main_hash = previous.file_hash("main.py")
+    data_hash = previous.file_hash(os.path.join("pkg", "data.csv"))
+    inventory_path = str(tmp_path/"inventory.json")
+    previous.save(inventory_path)
+    previous = inventory.Inventory.load(inventory_path)
+
+    write(os.path.join(app_path, "pkg", "data.csv"), "a,b,c\n")
+    write(os.path.join(app_path, "new.py"), "")
+    os.remove(os.path.join(app_path, "pkg", "__init__.py"))
+    current = inventory.Inventory.scan(app_path, previous=previous)
+
+    added, changed, removed = current.diff(previous)
+    assert added == ["new.py"]
+    assert changed == [os.path.join("pkg", "data.csv")]
+    assert removed == [os.path.join("pkg", "__init__.py")]
+    # the unchanged file is not hashed again
+    assert current.hashes[current.find("main.py")] == main_hash
+    assert current.hashes[current.find(
+        os.path.join("pkg", "data.csv"))] is None
+    assert current.file_hash(os.path.join("pkg", "data.csv")) != data_hash
+
+
+def test_load_ignores_corrupted_and_old_inventories(tmp_path):
+    inventory_path = str(tmp_path/"inventory.json")
+    assert inventory.Inventory.load(inventory_path) is None
+    write(inventory_path, "{")
+    assert inventory.Inventory.load(inventory_path) is None
+    write(inventory_path, '{"version": 0}')
+    assert inventory.Inventory.load(inventory_path) is None
+
+
+def test_list_entries_without_scandir(tmp_path, monkeypatch):
+    app_path = str(tmp_path)
+    make_app(app_path)
+    expected = inventory.Inventory.scan(app_path).paths
+    monkeypatch.setattr(inventory, "scandir", None)
+    assert inventory.Inventory.scan(app_path).paths == expected
+    assert inventory.list_tree(str(tmp_path/"missing")) == set()
@@ -0,0 +1,106 @@
+"""Testing the fast-start launcher of sealed app scripts.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+import os
+import sys
+import shutil
+import subprocess
+
+import pytest
+
+from pysealer import launcher
+from pysealer import compiler
+
+SCRIPT = """
+import os
+import sys
+import mod
+print(sys.argv[1:], mod.__file__ == os.path.join(sys.argv[1], "mod.py"))
+print(sys.flags.isolated, sys.flags.no_site,
+      int(sys.flags.dont_write_bytecode))
+print("site" in sys.modules, __name__)
+"""
+
+IMPORTTIME_LOG = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:        80 |        200 | io
+import time:       500 |        500 |     json.decoder
+import time:        40 |        540 |   json.scanner
+import time:       300 |        840 | json
+garbage line
+import time:      bad |          1 | broken
+"""
+
+
+def write(path, content):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, mode="w") as f:
+        f.write(content)
+
+
+def test_freeze_and_load_path(tmp_path, monkeypatch):
+    app_path = str(tmp_path/"app")
+    os.makedirs(app_path)
+    monkeypatch.setattr(sys, "path", [
+        app_path, os.path.join(app_path, "miniconda", "lib"), "/usr/lib",
+        "/usr/lib", app_path])
+    launcher.freeze(app_path)
+    with open(os.path.join(app_path, launcher.LAUNCH_CONFIG_NAME),
+              mode="r") as f:
+        assert f.read().splitlines() == [
+            launcher.python_version(), "{APP_PATH}/miniconda/lib",
+            "/usr/lib", "{APP_PATH}"]
+
+    # the frozen path follows a moved app
+    moved_path = str(tmp_path/"moved")
+    shutil.move(app_path, moved_path)
+    assert launcher.load_path(moved_path) == [
+        os.path.join(moved_path, "miniconda", "lib"), "/usr/lib", moved_path]
+
+    write(os.path.join(moved_path, launcher.LAUNCH_CONFIG_NAME),
+          "2.7.18\n/usr/lib\n")
+    with pytest.raises(RuntimeError):
+        launcher.load_path(moved_path)
+
+
+def test_run_isolated_script(tmp_path):
+    app_path = str(tmp_path/"app")
+    src_path = os.path.join(app_path, "src")
+    write(os.path.join(src_path, "main.py"), SCRIPT)
+    write(os.path.join(src_path, "mod.py"), "")
+    assert compiler.compile_files(
+        sys.executable, [os.path.join(src_path, "main.py")],
+        workers=1) == {}
+    launcher_path = os.path.join(app_path, "pysealer_launcher.py")
+    shutil.copy2(os.path.splitext(launcher.__file__)[0]+".py",
+                 launcher_path)
+
+    subprocess.check_call([sys.executable, "-E", "-s", launcher_path,
+                           "--freeze", app_path], stdout=subprocess.PIPE)
+    out = subprocess.check_output(
+        [sys.executable, "-I", "-S", "-B", launcher_path, app_path,
+         os.path.join("src", "main.pyc"), src_path, "--flag"],
+        cwd=str(tmp_path))
+    assert out.decode("utf-8").splitlines() == [
+        "['%s', '--flag'] True" % (src_path), "1 1 1", "False __main__"]
+    # the imported module isn't cached
+    assert not os.path.exists(os.path.join(src_path, "__pycache__"))
+
+
+def test_importtime_report(tmp_path):
+    write(str(tmp_path/"import.log"), IMPORTTIME_LOG)
+    report = launcher.importtime_report(str(tmp_path/"import.log"), top=2)
+
+    assert report["modules"] == 5
+    assert report["total_us"] == 200+840
+    assert [module["module"] for module in report["self"]] == \
+        ["json.decoder", "json"]
+    assert [module["module"] for module in report["cumulative"]] == \
+        ["json", "json.scanner"]
+    levels = dict((module["module"], module["level"])
+                  for module in report["self"]+report["cumulative"])
+    assert levels == {"json.decoder": 2, "json": 0, "json.scanner": 1}
@@ -0,0 +1,69 @@
+"""Testing the build manifest and the incremental environment state.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+import os
+
+from pysealer import manifest
+from pysealer import sealer
+
+
+def write(path, content):
+    with open(str(path), mode="w") as f:
+        f.write(content)
+
+
+def test_diff_reports_changed_removed_and_unchanged(tmp_path):
+    root = str(tmp_path)
+    write(tmp_path/"a.py", "a = 1\n")
+    write(tmp_path/"b.py", "b = 1\n")
+    build_manifest = manifest.BuildManifest(str(tmp_path/"manifest.json"))
+    new_files, changed, removed, unchanged = build_manifest.diff(
+        root, ["a.py", "b.py"])
+    assert changed == ["a.py", "b.py"]
+    assert removed == [] and unchanged == []
+
+    build_manifest.files = new_files
+    build_manifest.save()
+    write(tmp_path/"a.py", "a = 2\n")
+    os.remove(str(tmp_path/"b.py"))
+    write(tmp_path/"c.py", "c = 1\n")
+
+    build_manifest = manifest.BuildManifest(str(tmp_path/"manifest.json"))
+    _, changed, removed, unchanged = build_manifest.diff(
+        root, ["a.py", "c.py"])
+    assert changed == ["a.py", "c.py"]
+    assert removed == ["b.py"]
+    assert unchanged == []
+
+
+def test_diff_ignores_touched_files(tmp_path):
+    write(tmp_path/"a.py", "a = 1\n")
+    build_manifest = manifest.BuildManifest(str(tmp_path/"manifest.json"))
+    build_manifest.files, _, _, _ = build_manifest.diff(str(tmp_path),
+                                                        ["a.py"])
+    os.utime(str(tmp_path/"a.py"), (1, 1))
+    _, changed, _, unchanged = build_manifest.diff(str(tmp_path), ["a.py"])
+    assert changed == [] and unchanged == ["a.py"]
+
+
+def test_corrupted_manifest_is_ignored(tmp_path):
+    write(tmp_path/"manifest.json", "{not json")
+    build_manifest = manifest.BuildManifest(str(tmp_path/"manifest.json"))
+    assert build_manifest.files == {} and build_manifest.env == {}
+
+
+def test_env_state_tracks_requirements(tmp_path):
+    write(tmp_path/"conda.sh", "#!/bin/sh\n")
+    write(tmp_path/".pysealer_config.yml",
+          "conda_install: []\npip_install:\n  - requirements.txt\n")
+    write(tmp_path/"requirements.txt", "six==1.15.0\n")
+    app_sealer = sealer.Sealer(str(tmp_path), "linux", "linux", 3)
+    app_sealer._host_conda = str(tmp_path/"conda.sh")
+
+    env_state = app_sealer.get_env_state()
+    assert env_state == app_sealer.get_env_state()
+    write(tmp_path/"requirements.txt", "six==1.16.0\n")
+    assert env_state != app_sealer.get_env_state()
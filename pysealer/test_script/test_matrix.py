@@ -0,0 +1,92 @@
+"""Testing the sealing of one app for several targets.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+import os
+import json
+
+import pytest
+
+import pysealer
+from pysealer import utils
+from pysealer import sealer
+from pysealer import matrix
+from pysealer import benchmark
+
+
+@pytest.fixture
+def app_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(pysealer, "PYSEALER_RELEASE_PATH",
+                        str(tmp_path/"releases"))
+    conda_path, _ = benchmark.make_stubs(str(tmp_path/"stubs"))
+    # every installer is the stub
+    monkeypatch.setattr(utils, "get_condas", lambda conda_specs, **kwargs:
+                        [(None, conda_path)]*len(conda_specs))
+    benchmark.make_app(str(tmp_path/"app"), 2, 128, 1, 1024)
+    return str(tmp_path/"app")
+
+
+def test_parse_target():
+    assert matrix.parse_target("linux-64-py3") == {
+        "platform": "linux", "arch": 64, "pyver": 3}
+    for target in ["linux-64", "linux-64-3", "solaris-64-py3",
+                   "linux-16-py3", "linux-64-py4"]:
+        with pytest.raises(ValueError):
+            matrix.parse_target(target)
+
+
+def test_targets_share_the_build(app_path, monkeypatch):
+    builds = []
+    init_build = sealer.Sealer.init_build
+
+    def count_init_build(self, *args, **kwargs):
+        builds.append((self.pyver, self.build_path))
+        return init_build(self, *args, **kwargs)
+    monkeypatch.setattr(sealer.Sealer, "init_build", count_init_build)
+
+    targets = ["linux-64-py3", "osx-64-py3"]
+    summary = matrix.seal_matrix(app_path, targets, host_platform="linux",
+                                 seal_args={"wheelhouse": False})
+
+    dist_path = os.path.join(app_path, "pysealer_build", "dist")
+    assert builds == [(3, os.path.join(app_path, "pysealer_build", "py3"))]
+    for target in targets:
+        output_path = os.path.join(dist_path, target)
+        assert summary[target]["output_path"] == output_path
+        assert os.path.isfile(os.path.join(
+            output_path, benchmark.APP_NAME, "build.sh"))
+        assert summary[target]["installer_size"] == os.path.getsize(
+            os.path.join(output_path, benchmark.APP_NAME+".run"))
+    with open(os.path.join(dist_path, "osx-64-py3", benchmark.APP_NAME,
+                           "build.sh"), mode="r") as f:
+        assert "curl -o miniconda.sh" in f.read()
+
+    with open(os.path.join(dist_path, "matrix.json"), mode="r") as f:
+        assert json.load(f) == summary
+    assert sorted(summary["linux-64-py3"]) == [
+        "app_size", "build_time", "installer_size", "output_path",
+        "seal_time"]
+
+
+def test_targets_keep_the_build_state(app_path, monkeypatch):
+    config_environment = sealer.Sealer.config_environment
+
+    def prune(self):
+        config_environment(self)
+        self.pkgs_pruned = True
+    monkeypatch.setattr(sealer.Sealer, "config_environment", prune)
+
+    # the lockfile needs the package cache that the build pruned
+    with pytest.raises(ValueError, match="pruned"):
+        matrix.seal_matrix(app_path, ["linux-64-py3"],
+                           host_platform="linux", installer_mode="none",
+                           seal_args={"env_mode": "lock"})
+
+
+def test_unsupported_target(app_path):
+    with pytest.raises(ValueError):
+        matrix.seal_matrix(app_path, ["linux-64-py3", "solaris-64-py3"],
+                           host_platform="linux")
+    assert not os.path.exists(os.path.join(app_path, "pysealer_build"))
@@ -0,0 +1,146 @@
+"""Testing the bytecode optimization of the compiled app.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+import os
+import sys
+import json
+import marshal
+import subprocess
+
+import pysealer
+from pysealer import sealer
+from pysealer import compiler
+from pysealer import benchmark
+
+TOOLS = """
+class Tool(object):
+    def run(self, value):
+        def check(value):
+            if value < 0:
+                raise ValueError("negative %d" % value)
+            return [item*2 for item in range(value)]
+        return check(value)
+"""
+
+MAIN = """from benchapp.pkg_000 import module_0000
+from benchapp import tools
+
+print(module_0000.func_0(1))
+print(tools.Tool().run(3))
+"""
+
+# the traceback of a failure in the tools module
+FAIL = """
+import sys
+import traceback
+try:
+    tools.Tool().run(-1)
+except ValueError:
+    entries = traceback.extract_tb(sys.exc_info()[2])
+    print([entry.name for entry in entries], entries[-1].lineno)
+    traceback.print_exc()
+"""
+
+
+def write(path, content):
+    with open(path, mode="w") as f:
+        f.write(content)
+
+
+def nested_code(code):
+    yield code
+    for const in code.co_consts:
+        if hasattr(const, "co_code"):
+            for nested in nested_code(const):
+                yield nested
+
+
+def test_strip_file_keeps_the_module_working(tmp_path):
+    write(str(tmp_path/"tools.py"), TOOLS)
+    assert compiler.compile_files(
+        sys.executable, [str(tmp_path/"tools.py")], workers=1) == {}
+    os.remove(str(tmp_path/"tools.py"))
+    compiler.strip_file(str(tmp_path/"tools.pyc"))
+
+    with open(str(tmp_path/"tools.pyc"), mode="rb") as f:
+        code = marshal.loads(f.read()[compiler.pyc_header_size():])
+    codes = list(nested_code(code))
+    # the module, the class, the method and the closure at least
+    assert len(codes) >= 4
+    for code in codes:
+        if sys.version_info >= (3, 10):
+            assert set(line for _, _, line in code.co_lines()) == \
+                set([None])
+        if sys.version_info >= (3, 11):
+            assert set(code.co_positions()) == set([(None,)*4])
+
+    out = subprocess.check_output(
+        [sys.executable, "-c",
+         "import tools\nprint(tools.Tool().run(3))\n"+FAIL],
+        cwd=str(tmp_path), stderr=subprocess.STDOUT)
+    lines = out.decode("utf-8").splitlines()
+    assert lines[0] == "[0, 2, 4]"
+    assert lines[1] == "['<module>', 'run', 'check'] None"
+    assert lines[-1] == "ValueError: negative -1"
+
+
+def test_optimize_app_report(tmp_path, monkeypatch):
+    monkeypatch.setattr(pysealer, "PYSEALER_RELEASE_PATH",
+                        str(tmp_path/"releases"))
+    conda_path, _ = benchmark.make_stubs(str(tmp_path/"stubs"))
+    app_path = str(tmp_path/"app")
+    benchmark.make_app(app_path, 3, 256, 0, 0)
+    write(os.path.join(app_path, "benchapp", "tools.py"), TOOLS)
+    write(os.path.join(app_path, "benchapp", "main.py"), MAIN)
+    with open(os.path.join(app_path, ".pysealer_config.yml"),
+              mode="a") as f:
+        f.write("strip_lines:\n  - benchapp/tools.py\n")
+
+    app_sealer = sealer.Sealer(app_path, "linux", "linux", 3)
+    app_sealer._host_conda = conda_path
+    app_sealer._target_conda = conda_path
+    app_sealer.init_build()
+    app_sealer.config_environment()
+    app_sealer.compile_app()
+    app_sealer.prepare_app()
+    report = app_sealer.optimize_app(level=2, remove_dead=True)
+
+    with open(os.path.join(app_sealer.build_path, "bytecode.json"),
+              mode="r") as f:
+        assert json.load(f) == report
+    stripped = sorted(rel_path for rel_path in report["modules"]
+                      if report["modules"][rel_path]["stripped"])
+    removed = sorted(rel_path for rel_path in report["modules"]
+                     if report["modules"][rel_path]["removed"])
+    assert stripped == ["benchapp/tools.py"]
+    assert removed == ["benchapp/pkg_000/module_0001.py",
+                       "benchapp/pkg_000/module_0002.py"]
+    for rel_path in removed:
+        assert report["modules"][rel_path]["after"] == 0
+        assert not os.path.exists(os.path.join(
+            app_sealer.build_src, *(rel_path+"c").split("/")))
+    assert report["after"] < report["before"]
+
+    # the optimized build runs as the sources
+    build_src = app_sealer.build_src
+    out = subprocess.check_output(
+        [sys.executable, os.path.join("benchapp", "main.pyc")],
+        cwd=build_src, env=dict(os.environ, PYTHONPATH=build_src))
+    assert out == subprocess.check_output(
+        [sys.executable, "-m", "benchapp.main"], cwd=app_path)
+
+    proc = subprocess.Popen(
+        [sys.executable, "-c", "from benchapp import tools\n"+FAIL],
+        cwd=build_src,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    out, _ = proc.communicate()
+    lines = out.decode("utf-8").splitlines()
+    assert proc.returncode == 0
+    assert lines[0] == "['<module>', 'run', 'check'] None"
+    # the frames of the stripped module have no line
+    assert 'File "%s", line None, in check' % (os.path.join(
+        app_path, "benchapp", "tools.py")) in out.decode("utf-8")
+    assert lines[-1] == "ValueError: negative -1"
@@ -0,0 +1,97 @@
+"""Testing the gitignore-style filtering of the app files.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+import os
+
+import pysealer
+from pysealer import pathfilter
+from pysealer import sealer
+from pysealer import benchmark
+
+
+def write(path, content=""):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, mode="w") as f:
+        f.write(content)
+
+
+def test_rules():
+    path_filter = pathfilter.PathFilter([
+        "# a comment", "data/", "/notebooks", "*.ipynb", "docs/**/*.png",
+        "!docs/logo.png"])
+
+    assert path_filter.excluded("data", is_dir=True)
+    assert path_filter.excluded("pkg/data", is_dir=True)
+    assert not path_filter.excluded("data")
+    assert path_filter.excluded("notebooks", is_dir=True)
+    assert not path_filter.excluded("pkg/notebooks", is_dir=True)
+    assert path_filter.excluded("pkg/run.ipynb")
+    assert path_filter.excluded("docs/a/b/figure.png")
+    assert path_filter.excluded("docs/figure.png")
+    assert not path_filter.excluded("docs/logo.png")
+    assert not path_filter.excluded("main.py")
+
+
+def test_walk_prunes_excluded_folders(tmp_path):
+    app_path = str(tmp_path)
+    write(os.path.join(app_path, "main.py"))
+    write(os.path.join(app_path, "pkg", "mod.py"))
+    write(os.path.join(app_path, "pkg", "cache", "blob"))
+    write(os.path.join(app_path, "cache", "keep.txt"))
+    path_filter = pathfilter.PathFilter(["cache/", "!cache/keep.txt"])
+
+    assert path_filter.walk(app_path) == [
+        "main.py", os.path.join("pkg", "mod.py")]
+
+
+def test_outputs_at_the_app_root_are_excluded(tmp_path):
+    app_path = str(tmp_path)
+    benchmark.make_app(app_path, 1, 64, 0, 0)
+    name = benchmark.APP_NAME
+    write(os.path.join(app_path, name, "build.sh"))
+    write(os.path.join(app_path, name, "pysealer_release.json"), "{}")
+    write(os.path.join(app_path, name+".run"))
+    write(os.path.join(app_path, name+".run.manifest.json"))
+    write(os.path.join(app_path, name+"-v0.1.0-to-v0.2.0.run"))
+    write(os.path.join(app_path, name+"-v0.1.0-to-v0.2.0.delta", "apply.sh"))
+
+    app_sealer = sealer.Sealer(app_path, "linux", "linux", 3)
+    files = app_sealer.get_path_filter().walk(app_path)
+    assert files == [".pysealer_config.yml",
+                     os.path.join("benchapp", "__init__.py"),
+                     os.path.join("benchapp", "main.py"),
+                     os.path.join("benchapp", "pkg_000", "__init__.py"),
+                     os.path.join("benchapp", "pkg_000", "module_0000.py")]
+
+    # a source folder of the app name is not an output
+    os.remove(os.path.join(app_path, name, "pysealer_release.json"))
+    files = app_sealer.get_path_filter().walk(app_path)
+    assert os.path.join(name, "build.sh") in files
+
+
+def test_second_build_seals_the_same_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(pysealer, "PYSEALER_RELEASE_PATH",
+                        str(tmp_path/"releases"))
+    conda_path, _ = benchmark.make_stubs(str(tmp_path/"stubs"))
+    app_path = str(tmp_path/"app")
+    benchmark.make_app(app_path, 3, 256, 0, 0)
+    output = os.path.join(app_path, benchmark.APP_NAME)
+
+    sealed_files = []
+    for _ in range(2):
+        app_sealer = sealer.Sealer(app_path, "linux", "linux", 3)
+        app_sealer._host_conda = conda_path
+        app_sealer._target_conda = conda_path
+        app_sealer.run(wheelhouse=False, env_mode="pack")
+        assert os.path.isfile(output+".run")
+        sealed_files.append(sorted(
+            os.path.relpath(os.path.join(root, name), output)
+            for root, dirs, files in os.walk(output) for name in files))
+
+    assert sealed_files[0] == sealed_files[1]
+    assert not any(benchmark.APP_NAME in rel_path
+                   for rel_path in sealed_files[1])
@@ -0,0 +1,114 @@
+"""Testing the concurrent scheduler of the sealing stages.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+import os
+import threading
+
+import pytest
+
+import pysealer
+from pysealer import pipeline
+from pysealer import sealer
+from pysealer import benchmark
+
+
+def test_check_tasks_orders_and_rejects_cycles():
+    tasks = [pipeline.Task("c", None, ["b"]), pipeline.Task("a", None),
+             pipeline.Task("b", None, ["a"])]
+    assert pipeline.check_tasks(tasks) == ["a", "b", "c"]
+
+    with pytest.raises(ValueError):
+        pipeline.check_tasks([pipeline.Task("a", None, ["b"]),
+                              pipeline.Task("b", None, ["a"])])
+    with pytest.raises(ValueError):
+        pipeline.check_tasks([pipeline.Task("a", None, ["missing"])])
+
+
+def test_critical_path():
+    tasks = [pipeline.Task("a", None), pipeline.Task("b", None, ["a"]),
+             pipeline.Task("c", None, ["a"]),
+             pipeline.Task("d", None, ["b", "c"])]
+    length, path = pipeline.critical_path(
+        tasks, {"a": 1., "b": 3., "c": 2., "d": 1.})
+    assert length == 5.
+    assert path == ["a", "b", "d"]
+
+
+def test_failure_cancels_and_skips_dependents():
+    started = []
+    cancelled = threading.Event()
+
+    def fail():
+        raise RuntimeError("failed")
+
+    tasks = [pipeline.Task("fail", fail),
+             pipeline.Task("after", lambda: started.append("after"),
+                           ["fail"])]
+    with pytest.raises(RuntimeError):
+        pipeline.run_tasks(tasks, on_cancel=cancelled.set)
+    assert cancelled.is_set()
+    assert started == []
+
+
+def test_compile_waits_for_the_environment(tmp_path, monkeypatch):
+    scheduled = {}
+
+    def run_tasks(tasks, workers=None, on_cancel=None):
+        scheduled.update((task.name, task.deps) for task in tasks)
+        return dict((task.name, 0.) for task in tasks)
+    monkeypatch.setattr(pipeline, "run_tasks", run_tasks)
+
+    app_sealer = sealer.Sealer(str(tmp_path), "linux", "linux", 3)
+    app_sealer.run(installer_mode="none")
+    assert scheduled["compile_app"] == ["config_environment"]
+    assert "init_build" in scheduled["config_environment"]
+
+
+def test_staging_and_fetching_overlap_the_environment(tmp_path,
+                                                      monkeypatch):
+    monkeypatch.setattr(pysealer, "PYSEALER_RELEASE_PATH",
+                        str(tmp_path/"releases"))
+    conda_path, _ = benchmark.make_stubs(str(tmp_path/"stubs"))
+    app_path = str(tmp_path/"app")
+    benchmark.make_app(app_path, 2, 128, 1, 1024)
+    # the target installer is another download than the host one
+    app_sealer = sealer.Sealer(app_path, "linux", "osx", 3)
+    app_sealer._host_conda = conda_path
+
+    started = {"stage_assets": threading.Event(),
+               "fetch_target": threading.Event()}
+    overlapped = []
+    fetch_conda = app_sealer.fetch_conda
+    stage_assets = app_sealer.stage_assets
+    config_environment = app_sealer.config_environment
+
+    def fetch_target(host=True, target=True):
+        if target and not host:
+            started["fetch_target"].set()
+            app_sealer._target_conda = conda_path
+        fetch_conda(host=host, target=target)
+
+    def stage_assets_started():
+        started["stage_assets"].set()
+        stage_assets()
+
+    def config_environment_waits():
+        # both stages start before the environment is configured
+        overlapped.extend(name for name in sorted(started)
+                          if started[name].wait(10))
+        config_environment()
+
+    app_sealer.fetch_conda = fetch_target
+    app_sealer.stage_assets = stage_assets_started
+    app_sealer.config_environment = config_environment_waits
+    durations = app_sealer.run(wheelhouse=False, installer_mode="none")
+
+    assert overlapped == ["fetch_target", "stage_assets"]
+    assert "stage_assets" in durations
+    sealed_src = os.path.join(app_path, benchmark.APP_NAME, "src",
+                              "benchapp")
+    assert os.path.isfile(os.path.join(sealed_src, "data", "asset_000.bin"))
+    assert os.path.isfile(os.path.join(sealed_src, "main.pyc"))
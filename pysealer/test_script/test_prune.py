@@ -0,0 +1,109 @@
+"""Testing the pruning of build environments.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+import os
+import json
+
+import pytest
+
+from pysealer import prune
+from pysealer import sealer
+
+
+def write(path, content):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, mode="w") as f:
+        f.write(content)
+
+
+def make_env(prefix):
+    write(os.path.join(prefix, "bin", "python"), "python")
+    write(os.path.join(prefix, "include", "Python.h"), "header")
+    write(os.path.join(prefix, "share", "doc", "README"), "docs")
+    write(os.path.join(prefix, "pkgs", "numpy.tar.bz2"), "package")
+    write(os.path.join(prefix, "lib", "libfoo.a"), "static")
+    write(os.path.join(prefix, "conda-meta", "python-3.6.json"),
+          json.dumps({"name": "python",
+                      "files": ["bin/python", "include/Python.h"]}))
+
+
+def test_prune_reports_categories_and_packages(tmp_path):
+    prefix = str(tmp_path/"env")
+    make_env(prefix)
+    report = prune.prune(prefix)
+
+    assert report["categories"]["headers"]["removed_files"] == 1
+    assert report["categories"]["docs"]["removed_files"] == 1
+    assert report["categories"]["pkgs"]["removed_files"] == 1
+    assert report["categories"]["static_libs"]["removed_files"] == 1
+    assert report["packages"]["python"]["files"] == 3
+    assert report["packages"]["python"]["removed_files"] == 1
+    assert os.path.isfile(os.path.join(prefix, "bin", "python"))
+    assert not os.path.exists(os.path.join(prefix, "include"))
+    assert not os.path.exists(os.path.join(prefix, "share"))
+    assert not os.path.exists(os.path.join(prefix, "pkgs"))
+
+
+def test_dry_run_removes_nothing(tmp_path):
+    prefix = str(tmp_path/"env")
+    make_env(prefix)
+    report = prune.prune(prefix, dry_run=True)
+
+    assert report["total"]["removed_files"] == 4
+    assert os.path.isfile(os.path.join(prefix, "include", "Python.h"))
+    assert os.path.isfile(os.path.join(prefix, "pkgs", "numpy.tar.bz2"))
+
+
+def test_package_patterns(tmp_path):
+    prefix = str(tmp_path/"env")
+    make_env(prefix)
+    report = prune.prune(prefix, rules={"python": ["python:*"]})
+
+    assert report["categories"]["python"]["removed_files"] == 3
+    assert os.path.isfile(os.path.join(prefix, "pkgs", "numpy.tar.bz2"))
+    assert not os.path.exists(os.path.join(prefix, "bin"))
+
+
+def test_strip_replaces_hard_links(tmp_path, monkeypatch):
+    prefix = str(tmp_path/"env")
+    lib_path = os.path.join(prefix, "lib", "libbar.so")
+    write(lib_path, "unstripped library")
+    os.link(lib_path, str(tmp_path/"cached.so"))
+
+    def fake_call(cmd, **kwargs):
+        write(cmd[-2], "stripped")
+        return 0
+    monkeypatch.setattr(prune.sp, "call", fake_call)
+
+    assert prune.strip_file("strip", lib_path) == 10
+    with open(str(tmp_path/"cached.so"), mode="r") as f:
+        assert f.read() == "unstripped library"
+
+
+def test_other_env_modes_keep_the_environment(tmp_path):
+    app_sealer = sealer.Sealer(str(tmp_path), "linux", "linux", 3)
+    make_env(app_sealer.build_conda)
+
+    app_sealer.prune_environment(env_mode="lock")
+    assert os.path.isfile(
+        os.path.join(app_sealer.build_conda, "pkgs", "numpy.tar.bz2"))
+    assert os.path.isfile(
+        os.path.join(app_sealer.build_path, "footprint.json"))
+    assert not app_sealer.pkgs_pruned
+
+    with pytest.raises(ValueError):
+        app_sealer.prune_environment(env_mode="unknown")
+
+
+def test_lock_mode_needs_the_package_cache(tmp_path):
+    app_sealer = sealer.Sealer(str(tmp_path), "linux", "linux", 3)
+    make_env(app_sealer.build_conda)
+
+    app_sealer.prune_environment(env_mode="pack")
+    assert not os.path.exists(os.path.join(app_sealer.build_conda, "pkgs"))
+    with pytest.raises(ValueError):
+        app_sealer.seal_app(env_mode="lock")
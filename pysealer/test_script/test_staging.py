@@ -0,0 +1,65 @@
+"""Testing the staging of files and folders.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+import os
+
+import pytest
+
+from pysealer import staging
+from pysealer import sealer
+
+
+def write(path, content):
+    with open(str(path), mode="w") as f:
+        f.write(content)
+
+
+def same_file(path_a, path_b):
+    return os.stat(str(path_a)).st_ino == os.stat(str(path_b)).st_ino
+
+
+def test_unlinked_mode_never_hard_links():
+    assert staging.unlinked_mode("auto") == "reflink"
+    assert staging.unlinked_mode("hardlink") == "copy"
+    assert staging.unlinked_mode("copy") == "copy"
+    with pytest.raises(ValueError):
+        staging.unlinked_mode("symlink")
+
+
+def test_stage_tree_recreates_links(tmp_path):
+    (tmp_path/"src"/"pkg").mkdir(parents=True)
+    write(tmp_path/"src"/"pkg"/"a.txt", "a")
+    os.symlink("pkg", str(tmp_path/"src"/"linked"))
+    stats = staging.StageStats()
+    staging.stage_tree(str(tmp_path/"src"), str(tmp_path/"dst"),
+                       mode="hardlink", stats=stats)
+    assert os.readlink(str(tmp_path/"dst"/"linked")) == "pkg"
+    assert same_file(tmp_path/"src"/"pkg"/"a.txt",
+                     tmp_path/"dst"/"pkg"/"a.txt")
+    assert stats.num_files == 1 and stats.bytes_linked == 1
+
+
+def test_user_files_are_not_hard_linked(tmp_path):
+    app_path = tmp_path/"app"
+    (app_path/"pkg").mkdir(parents=True)
+    write(app_path/"pkg"/"mod.py", "x = 1\n")
+    write(app_path/"pkg"/"mod.pyc", "compiled")
+    write(app_path/"pkg"/"data.txt", "user data")
+    app_sealer = sealer.Sealer(str(app_path), "linux", "linux", 3,
+                               stage_mode="hardlink")
+    os.makedirs(app_sealer.build_src)
+
+    assert app_sealer.stage_app_file(os.path.join("pkg", "mod.py"))
+    assert app_sealer.stage_app_file(os.path.join("pkg", "data.txt"))
+    build_pkg = tmp_path/"app"/"pysealer_build"/"src"/"pkg"
+    assert same_file(app_path/"pkg"/"mod.pyc", build_pkg/"mod.pyc")
+    assert not same_file(app_path/"pkg"/"data.txt", build_pkg/"data.txt")
+
+    # an in-place write to the staged file keeps the source intact
+    with open(str(build_pkg/"data.txt"), mode="r+") as f:
+        f.write("patched")
+    with open(str(app_path/"pkg"/"data.txt"), mode="r") as f:
+        assert f.read() == "user data"
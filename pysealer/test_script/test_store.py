@@ -0,0 +1,86 @@
+"""Testing the content-addressed artifact store.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+import os
+import stat
+
+import pytest
+
+from pysealer import store
+
+
+def write(path, content):
+    with open(str(path), mode="w") as f:
+        f.write(content)
+
+
+def read(path):
+    with open(str(path), mode="r") as f:
+        return f.read()
+
+
+def test_parse_size():
+    assert store.parse_size("512") == 512
+    assert store.parse_size("2K") == 2048
+    assert store.parse_size("1.5G") == 3 << 29
+    assert store.parse_size("20gb") == 20 << 30
+    with pytest.raises(ValueError):
+        store.parse_size("big")
+
+
+def test_put_links_a_read_only_object(tmp_path):
+    artifact_store = store.ArtifactStore(str(tmp_path/"store"))
+    write(tmp_path/"pkg.tar.bz2", "package")
+    digest = artifact_store.put(str(tmp_path/"pkg.tar.bz2"), "conda_pkg",
+                                ref="pkg-1.0")
+
+    object_file = artifact_store.object_file(digest)
+    assert os.path.samefile(str(tmp_path/"pkg.tar.bz2"), object_file)
+    assert not os.stat(object_file).st_mode & stat.S_IWUSR
+    assert artifact_store.find("pkg-1.0") == digest
+    assert artifact_store.find("missing") is None
+
+    assert artifact_store.get(digest, str(tmp_path/"copy"))
+    assert read(tmp_path/"copy") == "package"
+    assert not artifact_store.get("0"*64, str(tmp_path/"other"))
+
+
+def test_commit_merges_and_evicts_least_recently_used(tmp_path):
+    store_path = str(tmp_path/"store")
+    first = store.ArtifactStore(store_path, max_size=10)
+    write(tmp_path/"a", "a"*6)
+    digest_a = first.put(str(tmp_path/"a"), "wheel", link=False)
+    first.commit()
+
+    second = store.ArtifactStore(store_path, max_size=10)
+    write(tmp_path/"b", "b"*6)
+    digest_b = second.put(str(tmp_path/"b"), "wheel", ref="b", link=False)
+    assert second.commit() == 6
+
+    reloaded = store.ArtifactStore(store_path)
+    assert not reloaded.has(digest_a)
+    assert reloaded.has(digest_b)
+    assert reloaded.find("b") == digest_b
+    assert reloaded.stats() == {"wheel": {"objects": 1, "bytes": 6}}
+
+
+def test_gc_repairs_the_index(tmp_path):
+    artifact_store = store.ArtifactStore(str(tmp_path/"store"))
+    write(tmp_path/"a", "content")
+    digest = artifact_store.put(str(tmp_path/"a"), "bytecode", link=False)
+    artifact_store.commit()
+
+    # an object without an entry and a left over temporary file
+    stray = os.path.join(artifact_store.object_path, "ff", "f"*64)
+    os.makedirs(os.path.dirname(stray))
+    write(stray, "stray")
+    write(artifact_store.object_file(digest)+".1.tmp", "partial")
+
+    result = store.ArtifactStore(str(tmp_path/"store")).gc()
+    assert result["removed_objects"] == 2
+    assert result["total_objects"] == 1
+    assert not os.path.exists(stray)
+    assert os.path.isfile(artifact_store.object_file(digest))
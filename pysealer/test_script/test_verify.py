@@ -0,0 +1,77 @@
+"""Testing the smoke test and startup benchmark of installed apps.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+import os
+import sys
+
+import pytest
+
+from pysealer import verify
+
+needs_fork = pytest.mark.skipif(not hasattr(os, "fork"),
+                                reason="needs os.fork")
+
+
+def test_summarize_cold_and_warm_runs():
+    runs = [{"wall_time": 2., "peak_rss": 10, "exit_code": 0,
+             "timed_out": False},
+            {"wall_time": 0.3, "peak_rss": 30, "exit_code": 0,
+             "timed_out": False},
+            {"wall_time": 0.5, "peak_rss": 20, "exit_code": 1,
+             "timed_out": False},
+            {"wall_time": 0.4, "peak_rss": 20, "exit_code": 0,
+             "timed_out": True}]
+    summary = verify.summarize(runs)
+    assert summary["cold_start"] == 2.
+    assert summary["warm_start"] == 0.4
+    assert summary["warm_max"] == 0.5
+    assert summary["peak_rss"] == 30
+    assert summary["failed_runs"] == 2
+    assert verify.median([]) is None
+    assert verify.median([1, 4]) == 2.5
+
+
+def test_budgets_of_a_script():
+    budgets = {"cold_start": 3., "peak_rss": "1M",
+               "main": {"cold_start": 5.}}
+    assert verify.script_budgets(budgets, "main") == {
+        "cold_start": 5., "peak_rss": 1 << 20}
+    assert verify.script_budgets(budgets, "other")["cold_start"] == 3.
+    assert verify.script_budgets(None, "main") == {}
+    with pytest.raises(ValueError):
+        verify.script_budgets({"main": {"latency": 1.}}, "main")
+
+    violations = verify.check_budgets(
+        {"cold_start": 4., "warm_start": None, "peak_rss": 2 << 20},
+        {"cold_start": 5., "warm_start": 0.1, "peak_rss": 1 << 20})
+    assert violations == ["peak_rss is 2.0MB, the budget is 1.0MB"]
+
+
+@needs_fork
+def test_run_measured(tmp_path):
+    result = verify.run_measured(
+        [sys.executable, "-c", "x = bytearray(64 << 20); print(len(x))"],
+        str(tmp_path))
+    assert result["exit_code"] == 0
+    assert not result["timed_out"]
+    assert result["peak_rss"] >= 64 << 20
+
+    result = verify.run_measured([sys.executable, "-c", "exit(3)"],
+                                 str(tmp_path))
+    assert result["exit_code"] == 3
+
+
+@needs_fork
+def test_run_measured_kills_on_timeout(tmp_path):
+    with open(str(tmp_path/"log.txt"), mode="w") as log_file:
+        result = verify.run_measured(
+            [sys.executable, "-c",
+             "import time; print('started', flush=True); time.sleep(30)"],
+            str(tmp_path), timeout=0.5, log_file=log_file)
+    assert result["timed_out"]
+    assert result["wall_time"] < 10
+    with open(str(tmp_path/"log.txt"), mode="r") as f:
+        assert "started" in f.read()
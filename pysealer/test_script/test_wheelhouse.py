@@ -0,0 +1,86 @@
+"""Testing the offline install of pip dependencies from the wheelhouse.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+import os
+import subprocess
+
+import pysealer
+from pysealer import sealer
+from pysealer import benchmark
+
+# builds an empty wheel of every requirement: pip wheel --wheel-dir D -r F
+HOST_PIP = """#!/bin/sh
+if [ "$1" = "wheel" ]; then
+    while read -r REQ; do
+        [ -n "${REQ}" ] && touch "$3/$(echo "${REQ}" | tr '=' '_').whl"
+    done < "$5"
+fi
+exit 0
+"""
+
+# records the calls of the target pip
+TARGET_PIP = """#!/bin/sh
+echo "$@" >> "${APP_PATH}/pip_calls.txt"
+exit 0
+"""
+
+
+def write(path, content, mode=0o644):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, mode="w") as f:
+        f.write(content)
+    os.chmod(path, mode)
+
+
+def test_build_installs_from_the_wheelhouse(tmp_path, monkeypatch):
+    monkeypatch.setattr(pysealer, "PYSEALER_RELEASE_PATH",
+                        str(tmp_path/"releases"))
+    conda_path, _ = benchmark.make_stubs(str(tmp_path/"stubs"))
+    app_path = str(tmp_path/"app")
+    benchmark.make_app(app_path, 2, 128, 0, 0)
+    config_path = os.path.join(app_path, ".pysealer_config.yml")
+    with open(config_path, mode="r") as f:
+        config = f.read()
+    write(config_path, config.replace(
+        "pip_install: []", "pip_install:\n  - six==1.0\n"
+        "  - requirements.txt"))
+    write(os.path.join(app_path, "requirements.txt"),
+          "attrs\nsix==1.0  # pinned\n")
+
+    app_sealer = sealer.Sealer(app_path, "linux", "linux", 3)
+    app_sealer._host_conda = conda_path
+    app_sealer._target_conda = conda_path
+    app_sealer.init_build()
+    app_sealer.config_environment()
+    write(app_sealer.build_pip, HOST_PIP, 0o755)
+    app_sealer.compile_app()
+    app_sealer.prepare_app()
+    app_sealer.seal_app(wheelhouse=True, env_mode="solve")
+
+    sealed_path = os.path.join(app_path, benchmark.APP_NAME)
+    with open(os.path.join(sealed_path, "pip_requirements.txt"),
+              mode="r") as f:
+        assert f.read() == "six==1.0\nattrs\n"
+    assert sorted(os.listdir(os.path.join(sealed_path, "wheelhouse"))) == \
+        ["attrs.whl", "six__1.0.whl"]
+
+    # the environment steps are done, the target pip is a stub
+    bin_path = os.path.join(sealed_path, "miniconda", "bin")
+    write(os.path.join(bin_path, "pip"), TARGET_PIP, 0o755)
+    write(os.path.join(bin_path, "conda"), "#!/bin/sh\nexit 0\n", 0o755)
+    write(os.path.join(sealed_path, ".pysealer_install_state"),
+          "miniconda\nconda\n")
+    with open(os.devnull, "w") as null:
+        subprocess.check_call(["bash", "build.sh"], cwd=sealed_path,
+                              stdout=null)
+
+    with open(os.path.join(sealed_path, "pip_calls.txt"), mode="r") as f:
+        calls = f.read().splitlines()
+    assert calls == [
+        "--version",
+        "install --no-index --find-links %s/wheelhouse -r "
+        "%s/pip_requirements.txt" % (sealed_path, sealed_path)]
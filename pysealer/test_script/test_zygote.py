@@ -0,0 +1,200 @@
+"""Testing the warm interpreter (zygote) launcher.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+
+import pytest
+
+import pysealer
+from pysealer import sealer
+from pysealer import zygote
+from pysealer import launcher
+from pysealer import compiler
+from pysealer import benchmark
+
+pytestmark = pytest.mark.skipif(not zygote.supported(),
+                                reason="needs UNIX sockets and fcntl")
+
+SCRIPT = """
+import os
+import sys
+print(sys.argv[1:])
+print(os.getcwd())
+print(os.environ.get("GREETING"))
+print(sys.stdin.read().strip())
+print("json" in sys.modules, os.getppid())
+sys.exit(int(os.environ.get("EXIT_CODE", "0")))
+"""
+
+
+@pytest.fixture
+def runtime_path(monkeypatch):
+    # the path of a UNIX socket is short
+    runtime_path = tempfile.mkdtemp(prefix="zy", dir="/tmp")
+    monkeypatch.setenv("XDG_RUNTIME_DIR", runtime_path)
+    monkeypatch.delenv("PYSEALER_ZYGOTE", raising=False)
+    yield runtime_path
+    shutil.rmtree(runtime_path)
+
+
+@pytest.fixture
+def app_path(tmp_path, runtime_path):
+    app_path = str(tmp_path/"app")
+    os.makedirs(os.path.join(app_path, "src"))
+    with open(os.path.join(app_path, "src", "main.py"), mode="w") as f:
+        f.write(SCRIPT)
+    assert compiler.compile_files(
+        sys.executable, [os.path.join(app_path, "src", "main.py")],
+        workers=1) == {}
+    for module in [launcher, zygote]:
+        shutil.copy2(os.path.splitext(module.__file__)[0]+".py",
+                     os.path.join(app_path, "pysealer_%s.py"
+                                  % (module.__name__.split(".")[-1])))
+    write_config(app_path, 60)
+    subprocess.check_call(
+        [sys.executable, "-E", "-s",
+         os.path.join(app_path, "pysealer_launcher.py"), "--freeze",
+         app_path], stdout=subprocess.PIPE)
+    yield app_path
+    stop_zygote(app_path)
+
+
+def write_config(app_path, timeout):
+    with open(os.path.join(app_path, zygote.ZYGOTE_CONFIG_NAME),
+              mode="w") as f:
+        json.dump({"preload": ["json"], "timeout": timeout}, f)
+
+
+def stop_zygote(app_path):
+    subprocess.check_call(
+        [sys.executable, os.path.join(app_path, "pysealer_zygote.py"),
+         "--stop", app_path], stdout=subprocess.PIPE)
+
+
+def run_script(app_path, args=(), stdin="", env=None, cwd=None):
+    """Run the script by the zygote launcher.
+
+    Returns
+    -------
+    The exit code and the output lines.
+    """
+    proc = subprocess.Popen(
+        [sys.executable, "-I", "-S", "-B",
+         os.path.join(app_path, "pysealer_zygote.py"), app_path,
+         os.path.join("src", "main.pyc")]+list(args),
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        env=dict(os.environ, **(env or {})), cwd=cwd)
+    out, _ = proc.communicate(stdin.encode("utf-8"))
+    return proc.returncode, out.decode("utf-8").splitlines()
+
+
+def zygote_running(app_path):
+    return zygote.connect(zygote.socket_path(app_path)) is not None
+
+
+def wait_stopped(app_path, timeout=10.):
+    end_time = time.time()+timeout
+    while time.time() < end_time:
+        if not os.path.exists(zygote.socket_path(app_path)):
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def test_run_by_the_zygote(app_path, tmp_path):
+    code, lines = run_script(app_path, ["a", "b c"], stdin="hello",
+                             env={"GREETING": "hi", "EXIT_CODE": "3"},
+                             cwd=str(tmp_path))
+    assert code == 3
+    assert lines[:4] == ["['a', 'b c']", str(tmp_path), "hi", "hello"]
+    # the script runs in a child of the zygote that preloaded json
+    preloaded, zygote_pid = lines[4].split()
+    assert preloaded == "True"
+    assert int(zygote_pid) != os.getpid()
+    assert zygote_running(app_path)
+
+    code, lines = run_script(app_path)
+    assert code == 0
+    assert lines[:4] == ["[]", os.getcwd(), "None", ""]
+    assert lines[4].split() == ["True", zygote_pid]
+
+
+def test_stale_zygote_is_restarted(app_path):
+    _, lines = run_script(app_path)
+    zygote_pid = lines[4].split()[1]
+
+    # the installed app is changed
+    write_config(app_path, 120)
+    code, lines = run_script(app_path)
+    assert code == 0
+    assert lines[4].split()[0] == "True"
+    assert lines[4].split()[1] != zygote_pid
+
+
+def test_idle_zygote_exits(app_path):
+    write_config(app_path, 1)
+    assert run_script(app_path)[0] == 0
+    assert wait_stopped(app_path)
+    assert not zygote_running(app_path)
+
+
+def test_stop(app_path):
+    assert run_script(app_path)[0] == 0
+    assert zygote_running(app_path)
+    stop_zygote(app_path)
+    assert wait_stopped(app_path)
+
+
+def test_run_without_the_zygote(app_path):
+    code, lines = run_script(app_path, ["a"], stdin="hello",
+                             env={"PYSEALER_ZYGOTE": "0",
+                                  "EXIT_CODE": "2"})
+    assert code == 2
+    assert lines[:4] == ["['a']", os.getcwd(), "None", "hello"]
+    # the script runs in the launched process
+    assert lines[4].split() == ["False", str(os.getpid())]
+    assert not os.path.exists(zygote.socket_path(app_path))
+
+
+def test_sealed_app_runs_by_the_zygote(tmp_path, runtime_path, monkeypatch):
+    monkeypatch.setattr(pysealer, "PYSEALER_RELEASE_PATH",
+                        str(tmp_path/"releases"))
+    conda_path, _ = benchmark.make_stubs(str(tmp_path/"stubs"))
+    app_path = str(tmp_path/"app")
+    benchmark.make_app(app_path, 2, 128, 0, 0)
+    with open(os.path.join(app_path, ".pysealer_config.yml"),
+              mode="a") as f:
+        f.write("zygote_preload:\n  - benchapp.pkg_000.module_0000\n")
+    app_sealer = sealer.Sealer(app_path, "linux", "linux", 3)
+    app_sealer._host_conda = conda_path
+    app_sealer._target_conda = conda_path
+    app_sealer.run(wheelhouse=False, env_mode="pack",
+                   launcher_mode="zygote", installer_mode="none")
+
+    sealed_path = os.path.join(app_path, benchmark.APP_NAME)
+    with open(os.path.join(sealed_path, zygote.ZYGOTE_CONFIG_NAME),
+              mode="r") as f:
+        assert json.load(f)["preload"] == ["benchapp.pkg_000.module_0000"]
+    with open(os.path.join(sealed_path, "main.sh"), mode="r") as f:
+        assert "${APP_PATH}/pysealer_zygote.pyc ${APP_PATH}" in f.read()
+    subprocess.check_call(["bash", "build.sh"], cwd=sealed_path,
+                          stdout=subprocess.PIPE)
+
+    expected = subprocess.check_output(
+        [sys.executable, "-m", "benchapp.main"], cwd=app_path)
+    try:
+        for _ in range(2):
+            assert subprocess.check_output(
+                ["bash", "main.sh"], cwd=sealed_path) == expected
+            assert zygote_running(sealed_path)
+    finally:
+        stop_zygote(sealed_path)
@@ -7,21 +7,46 @@ Email : duguyue100@gmail.com
 from __future__ import print_function
 import os
 from os.path import isdir, isfile, join
-import urllib
+import threading
+import yaml
+
+try:
+    from urllib.request import Request, urlopen
+    from urllib.error import HTTPError
+except ImportError:
+    from urllib2 import Request, urlopen, HTTPError
 
 import pysealer
+from pysealer import manifest
 
+# the miniconda mirror, can be pointed to a local server for testing
+CONDA_URL = os.environ.get("PYSEALER_CONDA_URL",
+                           "https://repo.continuum.io/miniconda/")
 
-def get_conda(target_path=pysealer.PYSEALER_RES_PATH,
-              platform="osx", pyver=2, arch=64):
-    """Get lastest miniconda by given platform.
 
-    WARNING: ONLY DEAL WITH LINUX PLATFORM RIGHT NOW!
+def load_config(config_path):
+    """Load a .pysealer_config.yml file.
+
+    Parameters
+    ----------
+    config_path : string
+        the path of the configuration file.
+
+    Returns
+    -------
+    A dictionary of the configuration.
+    """
+    with open(config_path, mode="r") as f:
+        config_dict = yaml.safe_load(f)
+
+    return config_dict if config_dict is not None else {}
+
+
+def get_conda_url(platform="osx", pyver=2, arch=64, base_url=None):
+    """Get the download url of the lastest miniconda by given platform.
 
     Parameters
     ----------
-    target_path : string
-        The miniconda save path, raise IO error if it's not a valid folder.
     platform : string
         "osx", "linux", or "windows"
     pyver : int
@@ -30,15 +55,19 @@ def get_conda(target_path=pysealer.PYSEALER_RES_PATH,
     arch : int
         32bit : 32
         64bit : 64
+    base_url : string
+        the miniconda mirror, use CONDA_URL if None.
 
     Returns
     -------
-    A miniconda copy and saved to target path
+    down_url : string
+        the download url of the installer.
+    sub_path : string
+        the relative folder that caches the installer.
     """
-    if not isdir(target_path):
-        raise IOError("The target path %s is not existed!" % (target_path))
-
-    down_url = "https://repo.continuum.io/miniconda/"
+    down_url = CONDA_URL if base_url is None else base_url
+    if not down_url.endswith("/"):
+        down_url += "/"
 
     # specify version
     down_url = down_url+"Miniconda2-latest-" \
@@ -47,33 +76,252 @@ def get_conda(target_path=pysealer.PYSEALER_RES_PATH,
     # specify platform
     if platform == "osx":
         down_url += "MacOSX-"
-        target_path = join(target_path, "osx")
+        sub_path = "osx"
     elif platform == "linux":
         down_url += "Linux-"
-        target_path = join(target_path, "linux")
+        sub_path = "linux"
     elif platform == "windows":
         down_url += "Windows-"
-        target_path = join(target_path, "windows")
+        sub_path = "windows"
 
     # specify architecture
     if platform != "osx":
         down_url = down_url+"x86.sh" if arch == 32 else down_url+"x86_64.sh"
-        target_path = join(target_path, "32") \
-            if arch == 32 else join(target_path, "64")
+        sub_path = join(sub_path, "32") \
+            if arch == 32 else join(sub_path, "64")
     else:
         down_url += "x86_64.sh"
-        target_path = join(target_path, "64")
+        sub_path = join(sub_path, "64")
+
+    return down_url, sub_path
+
+
+def report(text, tracer=None):
+    """Report a progress message by the tracer if given."""
+    if tracer is not None:
+        tracer.message(text)
+    else:
+        print ("[MESSAGE] "+text)
+
+
+def download(down_url, file_path, sha256=None, block_size=1 << 16,
+             tracer=None):
+    """Download a file with resume, verification and atomic rename.
+
+    The data is written to file_path.part first, an interrupted download
+    is resumed from there by a ranged request. If the server rejects the
+    range (416), the download starts over once. The file is only moved to
+    file_path when it is complete and its checksum is verified.
+
+    Parameters
+    ----------
+    down_url : string
+        the url of the file.
+    file_path : string
+        the destination of the file.
+    sha256 : string
+        the expected SHA-256 checksum, not checked if None.
+    block_size : int
+        the number of bytes read at a time.
+    tracer : instrument.Tracer
+        counts the downloaded bytes and reports the messages if given.
+
+    Returns
+    -------
+    The SHA-256 checksum of the downloaded file.
+    """
+    part_path = file_path+".part"
+    offset = os.path.getsize(part_path) if isfile(part_path) else 0
+
+    request = Request(down_url)
+    if offset > 0:
+        request.add_header("Range", "bytes=%d-" % (offset))
+    try:
+        response = urlopen(request)
+    except HTTPError as e:
+        if offset == 0 or e.code != 416:
+            raise
+        # the partial file is not valid for the server, start over
+        report("The server rejects the partial download, restart from "
+               "the beginning.", tracer)
+        os.remove(part_path)
+        offset = 0
+        response = urlopen(Request(down_url))
+
+    try:
+        if offset > 0 and response.getcode() != 206:
+            # the server does not support ranged request
+            report("The server cannot resume the download, restart from "
+                   "the beginning.", tracer)
+            offset = 0
+        elif offset > 0:
+            report("Resume the download at %d bytes." % (offset), tracer)
+
+        content_length = response.info().get("Content-Length")
+        total_size = offset+int(content_length) \
+            if content_length is not None else None
+
+        with open(part_path, mode="ab" if offset > 0 else "wb") as f:
+            while True:
+                block = response.read(block_size)
+                if not block:
+                    break
+                f.write(block)
+                if tracer is not None:
+                    tracer.count("bytes_downloaded", len(block))
+    finally:
+        response.close()
+
+    if total_size is not None and os.path.getsize(part_path) != total_size:
+        raise IOError("The download of %s is incomplete, got %d of %d bytes."
+                      % (down_url, os.path.getsize(part_path), total_size))
+
+    file_sha = manifest.file_hash(part_path, algorithm="sha256")
+    if sha256 is not None and file_sha != sha256:
+        os.remove(part_path)
+        raise IOError("The checksum of %s is %s, expected %s."
+                      % (down_url, file_sha, sha256))
+
+    os.rename(part_path, file_path)
+
+    return file_sha
+
+
+def is_cached(file_path, sha256=None):
+    """Check if a cached file is complete.
+
+    A cached file is valid when it matches the checksum recorded at
+    file_path.sha256 by get_conda, and the expected checksum if given.
+    """
+    sha_path = file_path+".sha256"
+    if not isfile(file_path) or not isfile(sha_path):
+        return False
+
+    with open(sha_path, mode="r") as f:
+        sha_record = f.read().split()
+    recorded_sha = sha_record[0] if sha_record else None
+    file_sha = manifest.file_hash(file_path, algorithm="sha256")
+
+    return file_sha == recorded_sha and sha256 in (None, file_sha)
+
+
+def get_conda(target_path=pysealer.PYSEALER_RES_PATH,
+              platform="osx", pyver=2, arch=64, base_url=None, sha256=None,
+              tracer=None, artifact_store=None):
+    """Get lastest miniconda by given platform.
+
+    The installer is cached at the target path with its checksum, a cached
+    installer that fails the verification is downloaded again.
+
+    WARNING: ONLY DEAL WITH LINUX PLATFORM RIGHT NOW!
+
+    Parameters
+    ----------
+    target_path : string
+        The miniconda save path, raise IO error if it's not a valid folder.
+    platform : string
+        "osx", "linux", or "windows"
+    pyver : int
+        Python 2 : 2
+        Python 3 : 3
+    arch : int
+        32bit : 32
+        64bit : 64
+    base_url : string
+        the miniconda mirror, use CONDA_URL if None.
+    sha256 : string
+        the expected SHA-256 checksum of the installer, not checked if None.
+    tracer : instrument.Tracer
+        records the download as a span and reports the messages if given.
+    artifact_store : store.ArtifactStore
+        the installer is linked from the store by its url if it's stored,
+        and stored after the download.
+
+    Returns
+    -------
+    A miniconda copy and saved to target path
+    """
+    if not isdir(target_path):
+        raise IOError("The target path %s is not existed!" % (target_path))
+
+    down_url, sub_path = get_conda_url(platform=platform, pyver=pyver,
+                                       arch=arch, base_url=base_url)
+    target_path = join(target_path, sub_path)
 
     if not isdir(target_path):
         os.makedirs(target_path)
 
-    print ("[MESSAGE] Downloading Miniconda from %s..." % (down_url))
+    conda_path = join(target_path, "miniconda.sh")
+    if not isfile(conda_path) and artifact_store is not None:
+        digest = artifact_store.find(down_url)
+        if digest is not None and artifact_store.get(digest, conda_path):
+            with open(conda_path+".sha256", mode="w") as f:
+                f.write("%s  miniconda.sh\n" % (digest))
+            report("The miniconda is linked from the artifact store.",
+                   tracer)
+    if is_cached(conda_path, sha256):
+        report("The cached miniconda at %s is verified." % (target_path),
+               tracer)
+        if artifact_store is not None:
+            artifact_store.put(conda_path, "installer", ref=down_url)
+        return down_url, conda_path
+
+    report("Downloading Miniconda from %s..." % (down_url), tracer)
+
+    if tracer is not None:
+        with tracer.span("download", cat="download", url=down_url):
+            file_sha = download(down_url, conda_path, sha256=sha256,
+                                tracer=tracer)
+    else:
+        file_sha = download(down_url, conda_path, sha256=sha256)
+    with open(conda_path+".sha256", mode="w") as f:
+        f.write("%s  miniconda.sh\n" % (file_sha))
+    if artifact_store is not None:
+        artifact_store.put(conda_path, "installer", ref=down_url)
+
+    report("The miniconda downloaded and saved at %s." % (target_path),
+           tracer)
+
+    return down_url, conda_path
+
+
+def get_condas(conda_specs, tracer=None, artifact_store=None):
+    """Get several miniconda installers concurrently.
+
+    Parameters
+    ----------
+    conda_specs : list
+        keyword arguments of get_conda for each installer, identical
+        installers are only downloaded once.
+    tracer : instrument.Tracer
+        records the downloads if given.
+    artifact_store : store.ArtifactStore
+        shares the installers with other builds if given.
+
+    Returns
+    -------
+    A list of the get_conda results in the order of conda_specs.
+    """
+    spec_keys = [tuple(sorted(spec.items())) for spec in conda_specs]
+    results = {}
+    errors = []
+
+    def fetch(spec_key):
+        try:
+            results[spec_key] = get_conda(
+                tracer=tracer, artifact_store=artifact_store,
+                **dict(spec_key))
+        except Exception as e:
+            errors.append(e)
 
-    if not isfile(join(target_path, "miniconda.sh")):
-        urllib.urlretrieve(down_url,
-                           filename=join(target_path, "miniconda.sh"))
+    threads = [threading.Thread(target=fetch, args=(spec_key,))
+               for spec_key in set(spec_keys)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
 
-    print ("[MESSAGE] The miniconda downloaded "
-           "and saved at %s." % (target_path))
+    if errors:
+        raise errors[0]
 
-    return down_url, join(target_path, "miniconda.sh")
+    return [results[spec_key] for spec_key in spec_keys]
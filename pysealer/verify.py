@@ -0,0 +1,195 @@
+"""Smoke test and startup benchmark of an installed app.
+
+Every script of app_list is run several times in a scratch install of the
+sealed app. The first run after the install is the cold start, nothing is
+cached yet, e.g., no zygote is running. The following runs are warm
+starts. The wall time, the peak RSS of the largest process of the run
+and the exit code of every run are recorded, and checked against the budgets
+of the verify section of .pysealer_config.yml:
+
+    verify:
+      runs: 5                 # runs per script, the first one is cold
+      timeout: 120            # seconds per run
+      commands:
+        main: --version       # the arguments of a script, none by default
+      budgets:
+        cold_start: 3.0       # seconds
+        warm_start: 0.5       # seconds, the median of the warm runs
+        peak_rss: 300M        # bytes, the maximum of all runs
+        imports: 400          # modules imported by a run
+        main:                 # the budgets of a script override the above
+          cold_start: 5.0
+
+The peak RSS of the zygote launcher is the one of the calling process.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+from __future__ import print_function
+import os
+import sys
+import json
+
+try:
+    import subprocess32 as sp
+except ImportError:
+    import subprocess as sp
+
+from pysealer import store
+
+DEFAULT_RUNS = 5
+DEFAULT_TIMEOUT = 120
+# the metrics that have a budget
+METRICS = ["cold_start", "warm_start", "peak_rss", "imports"]
+
+
+# forks and measures a command: python -c MEASURE_SCRIPT <timeout> <cmd>
+# the peak RSS of a child includes the memory of the process that forked
+# it, so the command is forked by this small interpreter, not the sealer
+MEASURE_SCRIPT = """
+import os, sys, time, signal
+timeout, command = float(sys.argv[1]), sys.argv[2:]
+timed_out = []
+start_time = time.time()
+pid = os.fork()
+if pid == 0:
+    os.setsid()
+    os.dup2(2, 1)
+    try:
+        os.execvp(command[0], command)
+    finally:
+        os._exit(127)
+def kill(signum, frame):
+    timed_out.append(True)
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        pass
+if timeout > 0:
+    signal.signal(signal.SIGALRM, kill)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+while True:
+    try:
+        _, status, rusage = os.wait4(pid, 0)
+        break
+    except OSError:
+        pass
+wall_time = time.time()-start_time
+import json
+print(json.dumps({"wall_time": wall_time, "maxrss": rusage.ru_maxrss,
+                  "exit_code": -os.WTERMSIG(status)
+                  if os.WIFSIGNALED(status) else os.WEXITSTATUS(status),
+                  "timed_out": bool(timed_out)}))
+"""
+
+
+def run_measured(command, cwd, env=None, timeout=None, log_file=None):
+    """Run a command and measure it.
+
+    The command runs in a new session, so that the whole process tree is
+    killed when it times out.
+
+    Parameters
+    ----------
+    command : list
+        the command and its arguments.
+    cwd : string
+        the working folder.
+    env : dict
+        the environment, the one of this process if None.
+    timeout : float
+        kill the command after the seconds, no limit if None.
+    log_file : file
+        receives stdout and stderr of the command, discarded if None.
+
+    Returns
+    -------
+    A dictionary of the wall time in seconds, the peak RSS of the largest
+    process in bytes, the exit code and if the command timed out.
+    """
+    devnull = open(os.devnull, mode="r+b")
+    try:
+        proc = sp.Popen([sys.executable, "-E", "-S", "-c", MEASURE_SCRIPT,
+                         str(timeout or 0)]+list(command),
+                        cwd=cwd, env=env, stdin=devnull, stdout=sp.PIPE,
+                        stderr=log_file or devnull)
+        out, _ = proc.communicate()
+    finally:
+        devnull.close()
+    if proc.returncode != 0:
+        raise sp.CalledProcessError(proc.returncode, command[0])
+
+    result = json.loads(out.decode("utf-8"))
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    unit = 1 if sys.platform == "darwin" else 1024
+    return {"wall_time": result["wall_time"],
+            "peak_rss": result["maxrss"]*unit,
+            "exit_code": result["exit_code"],
+            "timed_out": result["timed_out"]}
+
+
+def median(values):
+    """The median of a list of numbers, None if it's empty."""
+    if not values:
+        return None
+    values = sorted(values)
+    middle = len(values)//2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle-1]+values[middle])/2.
+
+
+def summarize(runs):
+    """Summarize the runs of a script, the first run is the cold start."""
+    return {"runs": len(runs),
+            "cold_start": runs[0]["wall_time"],
+            "warm_start": median([run["wall_time"] for run in runs[1:]]),
+            "warm_max": max([run["wall_time"] for run in runs[1:]] or
+                            [None]),
+            "peak_rss": max(run["peak_rss"] for run in runs),
+            "failed_runs": sum(1 for run in runs
+                               if run["exit_code"] != 0 or
+                               run["timed_out"])}
+
+
+def script_budgets(budgets, script):
+    """The budgets of a script, the metric values are parsed."""
+    budgets = budgets or {}
+    merged = dict((metric, budgets[metric]) for metric in METRICS
+                  if metric in budgets)
+    merged.update(budgets.get(script) or {})
+    for metric in merged:
+        if metric not in METRICS:
+            raise ValueError("The budget %s is not supported." % (metric))
+    if "peak_rss" in merged:
+        merged["peak_rss"] = store.parse_size(merged["peak_rss"])
+    return merged
+
+
+def check_budgets(summary, budgets):
+    """Compare the summary of a script against its budgets.
+
+    Returns
+    -------
+    A list of the exceeded budgets as messages.
+    """
+    violations = []
+    for metric in METRICS:
+        if metric not in budgets or summary.get(metric) is None:
+            continue
+        if summary[metric] > budgets[metric]:
+            violations.append("%s is %s, the budget is %s"
+                              % (metric, format_metric(metric,
+                                                       summary[metric]),
+                                 format_metric(metric, budgets[metric])))
+    return violations
+
+
+def format_metric(metric, value):
+    """Format the value of a metric for messages."""
+    if metric in ["cold_start", "warm_start"]:
+        return "%.3fs" % (value)
+    if metric == "peak_rss":
+        return "%.1fMB" % (value/float(1 << 20))
+    return str(value)
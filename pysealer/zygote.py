@@ -0,0 +1,562 @@
+"""Warm interpreter (zygote) launcher of sealed app scripts.
+
+The first run of an app script starts a zygote process per user and app,
+which imports the preload modules of the app once and listens on a UNIX
+socket. Every run then forks a child of the zygote, which gets the
+arguments, the standard streams, the working folder and the environment
+of the caller and runs the compiled script, the exit code is sent back:
+
+    python -I -S -B zygote.py [--archive] <app_path> <script.pyc> [args...]
+
+The zygote exits after it's idle for the timeout of pysealer_zygote.json,
+or when the installed app is changed, e.g., by a delta update. The next
+run starts a new one. PYSEALER_ZYGOTE=0 runs a script without the zygote:
+
+    python zygote.py --stop <app_path>        stop the zygote of an app
+
+The environment is read by the interpreter at startup, so the variables
+that configure python itself (e.g., PYTHONHASHSEED) keep the values of
+the zygote. The module search path is frozen by the fast launcher.
+
+This module only depends on the standard library so that it can be
+shipped with a sealed app and executed by the target interpreter. It
+needs python 3 on a POSIX system and falls back to the fast launcher.
+
+Author: Yuhuang Hu
+Email : duguyue100@gmail.com
+"""
+
+from __future__ import print_function
+import os
+from os.path import isfile, join
+import sys
+import time
+import errno
+import array
+import signal
+import socket
+import struct
+import marshal
+import hashlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# isolated mode doesn't add the folder of the script to sys.path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+try:
+    import pysealer_launcher as launcher
+except ImportError:
+    from pysealer import launcher
+finally:
+    del sys.path[0]
+
+# {"preload": [module names], "timeout": idle seconds}
+ZYGOTE_CONFIG_NAME = "pysealer_zygote.json"
+DEFAULT_TIMEOUT = 600
+# a change of these files in the installed app stops the zygote, the
+# release manifest is the one of delta.RELEASE_NAME
+STAMP_FILES = ["pysealer_release.json", launcher.LAUNCH_CONFIG_NAME,
+               ZYGOTE_CONFIG_NAME, "modules.pysa"]
+# the seconds between the checks of the zygote when it's idle
+TICK = 1.0
+
+
+def supported():
+    """Check if the running interpreter can pass file descriptors."""
+    return hasattr(socket, "AF_UNIX") and \
+        hasattr(socket.socket, "sendmsg") and \
+        fcntl is not None
+
+
+def socket_path(app_path):
+    """The socket of the zygote of an app for the current user.
+
+    The folder is private to the user, None if it's owned by another
+    user.
+    """
+    runtime_path = os.environ.get("XDG_RUNTIME_DIR") or \
+        os.environ.get("TMPDIR") or "/tmp"
+    zygote_path = join(runtime_path, "pysealer-%d" % (os.getuid()))
+    try:
+        os.mkdir(zygote_path, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            return None
+    stat = os.lstat(zygote_path)
+    if stat.st_uid != os.getuid() or stat.st_mode & 0o077:
+        return None
+    # the path of a UNIX socket is limited to about 100 characters
+    return join(zygote_path, hashlib.sha1(
+        os.path.abspath(app_path).encode("utf-8")).hexdigest()[:16]+".sock")
+
+
+def app_stamp(app_path):
+    """The identity of the installed files that the zygote depends on."""
+    stamp = []
+    for name in STAMP_FILES:
+        try:
+            stat = os.stat(join(app_path, name))
+        except OSError:
+            stamp.append(None)
+            continue
+        stamp.append((stat.st_ino, stat.st_size, stat.st_mtime))
+    return stamp
+
+
+def recv_exact(conn, size):
+    """Receive a number of bytes, None if the connection is closed."""
+    data = b""
+    while len(data) < size:
+        block = conn.recv(size-len(data))
+        if not block:
+            return None
+        data += block
+    return data
+
+
+def connect(path):
+    """Connect to a zygote, None if it's not running."""
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(path)
+    except socket.error:
+        conn.close()
+        return None
+    return conn
+
+
+def exit_code(code):
+    """The process exit code of a SystemExit code."""
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code & 0xff
+    print (code, file=sys.stderr)
+    return 1
+
+
+class Zygote(object):
+    """The zygote of an installed app."""
+
+    def __init__(self, app_path, archive=False):
+        """Init the zygote, nothing is imported yet."""
+        self.app_path = os.path.abspath(app_path)
+        self.archive = archive
+        self.path = socket_path(self.app_path)
+        self.config = {"preload": [], "timeout": DEFAULT_TIMEOUT}
+        if isfile(join(self.app_path, ZYGOTE_CONFIG_NAME)):
+            import json
+            with open(join(self.app_path, ZYGOTE_CONFIG_NAME),
+                      mode="r") as f:
+                self.config.update(json.load(f))
+        self.stamp = app_stamp(self.app_path)
+        self.listener = None
+        self.lock_file = None
+        # child pid to the connection that waits for its exit code
+        self.children = {}
+
+    def preload(self):
+        """Import the preload modules, failures are reported."""
+        sys.path[:] = [join(self.app_path, "src")] + \
+            launcher.load_path(self.app_path)
+        for name in self.config["preload"]:
+            start_time = time.time()
+            try:
+                __import__(name)
+            except Exception as e:
+                print ("[MESSAGE] Failed to preload %s: %s" % (name, e))
+                continue
+            print ("[MESSAGE] %s is preloaded in %.3fs"
+                   % (name, time.time()-start_time))
+        sys.stdout.flush()
+
+    def listen(self):
+        """Take the lock of the socket and listen on it.
+
+        Returns
+        -------
+        False if another zygote of the app holds the lock.
+        """
+        self.lock_file = open(self.path+".lock", mode="a")
+        try:
+            fcntl.flock(self.lock_file.fileno(),
+                        fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError:
+            self.lock_file.close()
+            return False
+
+        # a socket that is left by a killed zygote
+        if os.path.lexists(self.path):
+            os.remove(self.path)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.path)
+        self.listener.listen(64)
+        return True
+
+    def stop_listening(self):
+        """Release the socket, so that a new zygote can start."""
+        if self.listener is None:
+            return
+        os.remove(self.path)
+        self.listener.close()
+        self.listener = None
+        self.lock_file.close()
+
+    def reap(self):
+        """Send the exit codes of the finished children."""
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError:
+                break
+            if pid == 0:
+                break
+            conn = self.children.pop(pid, None)
+            if conn is None:
+                continue
+            code = 128+os.WTERMSIG(status) if os.WIFSIGNALED(status) \
+                else os.WEXITSTATUS(status)
+            try:
+                conn.sendall(struct.pack("!i", code))
+            except socket.error:
+                pass
+            conn.close()
+
+    def serve(self, ready_fd=None):
+        """Serve the runs of the app until the zygote is idle or stale.
+
+        The runs that connect while the modules are preloaded wait in the
+        backlog of the socket.
+        """
+        if not self.listen():
+            return
+        self.preload()
+        if ready_fd is not None:
+            os.write(ready_fd, b"1")
+            os.close(ready_fd)
+        print ("[MESSAGE] The zygote of %s is listening at %s"
+               % (self.app_path, self.path))
+        sys.stdout.flush()
+
+        # SIGCHLD wakes up the select
+        import select
+        wakeup_r, wakeup_w = os.pipe()
+        for fd in [wakeup_r, wakeup_w]:
+            fcntl.fcntl(fd, fcntl.F_SETFL,
+                        fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+        signal.set_wakeup_fd(wakeup_w)
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+        last_used = time.time()
+        while self.listener is not None or self.children:
+            fds = [wakeup_r]+([self.listener] if self.listener else [])
+            readable = select.select(fds, [], [], TICK)[0]
+            if wakeup_r in readable:
+                try:
+                    os.read(wakeup_r, 1024)
+                except OSError:
+                    pass
+            self.reap()
+            if self.children:
+                last_used = time.time()
+
+            if self.listener is not None and self.listener in readable:
+                conn = self.listener.accept()[0]
+                last_used = time.time()
+                self.handle(conn, (wakeup_r, wakeup_w))
+            elif self.listener is not None and (
+                    time.time()-last_used > self.config["timeout"] or
+                    app_stamp(self.app_path) != self.stamp):
+                self.stop_listening()
+
+        print ("[MESSAGE] The zygote of %s is stopped." % (self.app_path))
+
+    def handle(self, conn, wakeup_fds):
+        """Receive a run and fork a child for it."""
+        fds = array.array("i")
+        try:
+            msg, ancdata, _, _ = conn.recvmsg(
+                4, socket.CMSG_LEN(3*fds.itemsize))
+            for level, kind, data in ancdata:
+                if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+                    fds.frombytes(data[:len(data)-len(data) % fds.itemsize])
+            payload = recv_exact(conn, struct.unpack("!I", msg)[0]) \
+                if len(msg) == 4 else None
+        except (socket.error, struct.error):
+            payload = None
+        if payload is None or len(fds) != 3:
+            for fd in fds:
+                os.close(fd)
+            conn.close()
+            return
+
+        request = marshal.loads(payload)
+        if request.get("stop") or app_stamp(self.app_path) != self.stamp:
+            # the caller starts a new zygote
+            self.stop_listening()
+            for fd in fds:
+                os.close(fd)
+            conn.sendall(struct.pack("!q", -1))
+            conn.close()
+            return
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            for other_conn in [conn]+list(self.children.values()):
+                other_conn.close()
+            self.listener.close()
+            signal.set_wakeup_fd(-1)
+            for fd in wakeup_fds:
+                os.close(fd)
+            run_child(self.app_path, request, fds, self.archive)
+        for fd in fds:
+            os.close(fd)
+        try:
+            conn.sendall(struct.pack("!q", pid))
+        except socket.error:
+            pass
+        self.children[pid] = conn
+
+
+def reopen_stdio():
+    """Open the standard streams on the file descriptors of the caller."""
+    import io
+    for fd, name, mode in [(0, "stdin", "r"), (1, "stdout", "w"),
+                           (2, "stderr", "w")]:
+        stream = getattr(sys, name)
+        setattr(sys, name, io.TextIOWrapper(
+            io.open(fd, mode=mode+"b", closefd=False),
+            encoding=stream.encoding, errors=stream.errors,
+            line_buffering=fd == 2 or os.isatty(fd)))
+    sys.__stdin__, sys.__stdout__, sys.__stderr__ = \
+        sys.stdin, sys.stdout, sys.stderr
+
+
+def reseed():
+    """Reseed the random generators, forked children share the state."""
+    if "random" in sys.modules:
+        sys.modules["random"].seed()
+    if "numpy.random" in sys.modules:
+        sys.modules["numpy.random"].seed()
+
+
+def run_child(app_path, request, fds, archive):
+    """Run a script in a forked child of the zygote, it never returns."""
+    for signum in [signal.SIGCHLD, signal.SIGTERM, signal.SIGHUP]:
+        signal.signal(signum, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    for target_fd, fd in enumerate(fds):
+        os.dup2(fd, target_fd)
+        os.close(fd)
+    reopen_stdio()
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["env"])
+    reseed()
+
+    code = 0
+    try:
+        sys.argv = [request["script"]]+request["argv"]
+        launcher.run(app_path, request["script"], archive)
+    except SystemExit as e:
+        code = exit_code(e.code)
+    except KeyboardInterrupt:
+        import traceback
+        traceback.print_exc()
+        code = 128+signal.SIGINT
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+        code = 1
+
+    # what the interpreter does at exit
+    if "threading" in sys.modules:
+        threading = sys.modules["threading"]
+        for thread in threading.enumerate():
+            if thread is not threading.current_thread() and \
+                    not thread.daemon:
+                thread.join()
+    try:
+        import atexit
+        atexit._run_exitfuncs()
+    except Exception:
+        pass
+    for stream in [sys.stdout, sys.stderr]:
+        try:
+            stream.flush()
+        except Exception:
+            pass
+    os._exit(code)
+
+
+def start_zygote(app_path, archive):
+    """Start a zygote in a new session.
+
+    Returns
+    -------
+    True if the zygote is listening, False if it failed or another zygote
+    of the app is starting.
+    """
+    ready_r, ready_w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(ready_r)
+        os.setsid()
+        if os.fork() != 0:
+            os._exit(0)
+        log_fd = os.open(socket_path(app_path)+".log",
+                         os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        null_fd = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(null_fd, 0)
+        os.dup2(log_fd, 1)
+        os.dup2(log_fd, 2)
+        os.set_inheritable(ready_w, True)
+        try:
+            os.execv(sys.executable, [
+                sys.executable, "-I", "-S", "-B",
+                os.path.abspath(__file__), "--serve", str(ready_w)] +
+                (["--archive"] if archive else [])+[app_path])
+        finally:
+            os._exit(1)
+    os.close(ready_w)
+    os.waitpid(pid, 0)
+    with os.fdopen(ready_r, "rb") as f:
+        return f.read(1) == b"1"
+
+
+def wait_zygote(path, timeout=60.):
+    """Wait for a zygote that another run is starting.
+
+    Returns
+    -------
+    The connection, None if no zygote holds the lock or it's timed out.
+    """
+    end_time = time.time()+timeout
+    while time.time() < end_time:
+        conn = connect(path)
+        if conn is not None:
+            return conn
+        with open(path+".lock", mode="a") as lock_file:
+            try:
+                fcntl.flock(lock_file.fileno(),
+                            fcntl.LOCK_SH | fcntl.LOCK_NB)
+                return None
+            except IOError:
+                pass
+        time.sleep(0.05)
+    return None
+
+
+def send_request(conn, request):
+    """Send a request with the standard streams of this process."""
+    payload = marshal.dumps(request)
+    conn.sendmsg([struct.pack("!I", len(payload))],
+                 [(socket.SOL_SOCKET, socket.SCM_RIGHTS,
+                   array.array("i", [0, 1, 2]))])
+    conn.sendall(payload)
+
+
+def request_run(conn, script_path, args):
+    """Run a script in a child of the zygote.
+
+    Returns
+    -------
+    The exit code of the script, None if the zygote is stale.
+    """
+    send_request(conn, {"script": script_path, "argv": args,
+                        "cwd": os.getcwd(), "env": dict(os.environ)})
+    msg = recv_exact(conn, 8)
+    if msg is None:
+        return None
+    pid = struct.unpack("!q", msg)[0]
+    if pid < 0:
+        return None
+
+    def forward(signum, frame):
+        try:
+            os.kill(pid, signum)
+        except OSError:
+            pass
+
+    for signum in [signal.SIGINT, signal.SIGTERM, signal.SIGHUP,
+                   signal.SIGQUIT]:
+        signal.signal(signum, forward)
+    msg = recv_exact(conn, 4)
+    if msg is None:
+        print ("[MESSAGE] The zygote is lost.", file=sys.stderr)
+        return 1
+    return struct.unpack("!i", msg)[0]
+
+
+def stop(app_path):
+    """Stop the zygote of an app, it finishes the running scripts."""
+    path = socket_path(os.path.abspath(app_path))
+    conn = connect(path) if path is not None else None
+    if conn is None:
+        print ("[MESSAGE] No zygote of %s is running." % (app_path))
+        return
+    send_request(conn, {"stop": True})
+    recv_exact(conn, 8)
+    conn.close()
+    print ("[MESSAGE] The zygote of %s is stopped." % (app_path))
+
+
+def run(app_path, script_path, args, archive=False):
+    """Run a script by the zygote of the app, start it if needed.
+
+    The script runs in this process by the fast launcher if the zygote
+    is not supported, disabled or fails to start.
+
+    Returns
+    -------
+    The exit code of the script.
+    """
+    app_path = os.path.abspath(app_path)
+    path = socket_path(app_path) if supported() and \
+        os.environ.get("PYSEALER_ZYGOTE", "1") != "0" else None
+
+    # a stale zygote stops listening and is replaced once
+    for _ in range(2):
+        if path is None:
+            break
+        conn = connect(path)
+        if conn is None:
+            if start_zygote(app_path, archive):
+                conn = connect(path)
+            else:
+                conn = wait_zygote(path)
+        if conn is None:
+            break
+        try:
+            code = request_run(conn, script_path, args)
+        finally:
+            conn.close()
+        if code is not None:
+            return code
+
+    sys.argv = [script_path]+args
+    launcher.run(app_path, script_path, archive)
+    return 0
+
+
+def main():
+    """Entry of the zygote launcher in the target interpreter."""
+    if sys.argv[1] == "--serve":
+        archive = sys.argv[3] == "--archive"
+        Zygote(sys.argv[-1], archive).serve(int(sys.argv[2]))
+    elif sys.argv[1] == "--stop":
+        stop(sys.argv[2])
+    else:
+        archive = sys.argv[1] == "--archive"
+        if archive:
+            del sys.argv[1]
+        sys.exit(run(sys.argv[1], sys.argv[2], sys.argv[3:], archive))
+
+
+if __name__ == "__main__":
+    main()